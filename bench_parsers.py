@@ -0,0 +1,668 @@
+"""
+抽出・集計処理のマイクロベンチマーク
+
+fixtures/ の匿名化済みページ（apolloの week.php・monthly.php、tomatoの monthly.php）を使い、
+main.py の各集計処理（ページごとの集計と、更新ループ・バックフィルの1周期分の集計）の
+所要時間と処理量を計測して JSON で出力します。
+
+    python bench_parsers.py                        # Pythonのみの処理を計測
+    python bench_parsers.py --browser              # 置き換え前の関数と load_page_selenium（Selenium経由の取得）も計測
+    python bench_parsers.py --output bench.json    # 結果を保存
+    python bench_parsers.py --baseline bench.json  # 保存した結果と比べ、遅くなった項目があれば終了コード1
+    python bench_parsers.py generate               # フィクスチャを作り直す
+
+集計結果は fixtures/manifest.json の期待値と照合し、一致しない場合は ok=false になります。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+import main
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+MANIFEST_FILE = os.path.join(FIXTURE_DIR, "manifest.json")
+
+# フィクスチャの対象月と週（3/3-9 の週）
+FIXTURE_YEAR = 2025
+FIXTURE_MONTH = 3
+FIXTURE_MONDAY = datetime(2025, 3, 3)
+
+# 規模ごとの生成条件
+#   per_day:       tomato 1日あたりの予約件数
+#   clinic_rows:   apollo week.php のクリニック行数
+#   extra_clinics: apollo monthly.php の対象外クリニック数
+FIXTURE_SIZES = {
+    "quiet": {"per_day": 4, "clinic_rows": 10, "extra_clinics": 2},
+    "realistic": {"per_day": 35, "clinic_rows": 30, "extra_clinics": 10},
+    "stress": {"per_day": 150, "clinic_rows": 120, "extra_clinics": 60},
+}
+
+# 予約テキストの区分（キーワード, 実質大口か, 術検・EDのみか）
+RESERVATION_KINDS = [
+    ("包", True, False),
+    ("大", True, False),
+    ("長", True, False),
+    ("非長", True, False),
+    ("陰大", True, False),
+    ("術検", False, True),
+    ("ED", False, True),
+    ("一般", False, False),
+    ("再診", False, False),
+]
+
+# 平均計測時間がこの割合以上遅くなった場合を劣化とみなす
+REGRESSION_THRESHOLD = 0.2
+
+# -------------------------------
+# フィクスチャの生成（匿名の予約データで実ページと同じ構造を再現）
+# -------------------------------
+
+def _page(body):
+    return f'<html>\n<head><meta charset="UTF-8"><title>CAL</title></head>\n<body>\n{body}\n</body>\n</html>\n'
+
+def _jitsu_spans(rng, scale):
+    planned = rng.randint(0, scale)
+    actual = rng.randint(0, planned) if planned else 0
+    return f"<span>[予]{planned}</span><span>[実]{actual}</span>", actual
+
+def generate_apollo_week(rng, size):
+    """
+    apolloの week.php 相当のページと、合計行の [実] の合計を返します。
+    """
+    dates = [FIXTURE_MONDAY + timedelta(days=day) for day in range(7)]
+    head = "".join(f'<th class="sticky">{d.month}/{d.day}</th>' for d in dates)
+    rows = []
+    for row in range(size["clinic_rows"]):
+        cells = "".join(
+            f'<td><a href="detail.php?clinic={row}&amp;d={d:%Y%m%d}">{_jitsu_spans(rng, 20)[0]}</a></td>'
+            for d in dates
+        )
+        rows.append(f'<tr><td class="name">クリニック{row:03d}</td>{cells}</tr>')
+    expected = 0
+    total_cells = []
+    for _ in dates:
+        spans, actual = _jitsu_spans(rng, 200)
+        expected += actual
+        total_cells.append(f'<td class="total sticky">{spans}</td>')
+    rows.append(f'<tr><td class="total">合計</td>{"".join(total_cells)}<td class="total">-</td></tr>')
+    body = f'<table>\n<thead><tr><th>院</th>{head}</tr></thead>\n<tbody>\n' + "\n".join(rows) + '\n</tbody></table>'
+    return _page(body), {"total_week": expected}
+
+def generate_apollo_month(rng, size):
+    """
+    apolloの monthly.php 相当のページと、対象クリニックの [実] の合計を返します。
+    """
+    names = list(main.TARGET_CLINICS) + [f"対象外クリニック{i:02d}" for i in range(size["extra_clinics"])]
+    rng.shuffle(names)
+    expected = 0
+    rows = []
+    for index, name in enumerate(names):
+        spans, actual = _jitsu_spans(rng, 400)
+        if name in main.TARGET_CLINICS:
+            expected += actual
+        days = "".join(f"<td>{_jitsu_spans(rng, 15)[0]}</td>" for _ in range(31))
+        rows.append(f'<tr><td class="clinic"><a href="clinic.php?id={index}">{name}</a>{spans}</td>{days}</tr>')
+    body = "<table>\n" + "\n".join(rows) + "\n</table>"
+    return _page(body), {"total_month": expected}
+
+def _reservation(rng, serial, counts, in_week):
+    keyword, is_oguchi, is_skip = rng.choice(RESERVATION_KINDS)
+    is_wifi = rng.random() < 0.15
+    is_mikei = is_oguchi and rng.random() < 0.1
+    text = f"{10 + serial % 9}:{serial % 2 * 30:02d} {keyword} 患者{serial:05d}"
+    if is_mikei:
+        text += " 大[残未計]"
+    icon = '<i class="fa fa-wifi"></i>' if is_wifi else ""
+    if is_wifi or is_mikei:
+        counts["anchor_excludes"] += 1
+    if in_week and not is_skip:
+        counts["week_oguchi"] += 1 if (is_oguchi or is_mikei) else 0
+        counts["week_exclude"] += 1 if is_wifi else 0
+    return f'<p class="rest{serial % 3}"><a href="reserve.php?id={serial}">{icon}{text}</a></p>'
+
+def generate_tomato_month(rng, size):
+    """
+    tomatoの monthly.php 相当のカレンダーと、週間・月間の期待値を返します。
+    前後の月の日（カレンダーの端）にも予約を入れます。
+    """
+    first = datetime(FIXTURE_YEAR, FIXTURE_MONTH, 1)
+    start = first - timedelta(days=first.weekday())
+    week_end = FIXTURE_MONDAY + timedelta(days=6)
+    counts = {"week_oguchi": 0, "week_exclude": 0, "anchor_excludes": 0}
+    big_count = rng.randint(size["per_day"] * 10, size["per_day"] * 20)
+    serial = 0
+    rows = []
+    day = start
+    while day.month <= FIXTURE_MONTH or day.weekday() != 0:
+        cells = []
+        for _ in range(7):
+            reservations = []
+            for _ in range(rng.randint(size["per_day"] // 2, size["per_day"] * 3 // 2)):
+                serial += 1
+                reservations.append(_reservation(rng, serial, counts, FIXTURE_MONDAY <= day <= week_end))
+            cells.append(
+                f'<td><a href="monthly.php?clinic_id=0&amp;date={day:%Y-%m-%d}">{day.day}</a>'
+                + "".join(reservations) + "</td>"
+            )
+            day += timedelta(days=1)
+        rows.append("<tr>" + "".join(cells) + "</tr>")
+    body = (
+        f'<div class="summary"><span>[大]{big_count}</span> <span>[小]{serial - big_count}</span></div>\n'
+        + "<table>\n" + "\n".join(rows) + "\n</table>"
+    )
+    expected = {
+        "oguchi_week": [counts["week_oguchi"], counts["week_exclude"], counts["week_oguchi"] - counts["week_exclude"]],
+        "oguchi_month": [big_count, counts["anchor_excludes"], big_count - counts["anchor_excludes"]],
+    }
+    return _page(body), expected, serial
+
+def generate_fixtures():
+    """
+    全規模のフィクスチャと期待値（manifest.json）を作成します。乱数の種は固定です。
+    """
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    manifest = {}
+    for size_name, size in FIXTURE_SIZES.items():
+        rng = random.Random(f"weekgoal-{size_name}")
+        pages = {
+            "apollo_week": generate_apollo_week(rng, size) + (7,),
+            "apollo_month": generate_apollo_month(rng, size) + (len(main.TARGET_CLINICS) + size["extra_clinics"],),
+            "tomato_month": generate_tomato_month(rng, size),
+        }
+        for kind, (page, expected, items) in pages.items():
+            filename = f"{kind}_{size_name}.html"
+            with open(os.path.join(FIXTURE_DIR, filename), "w", encoding="utf-8") as file:
+                file.write(page)
+            manifest[filename] = {"kind": kind, "size": size_name, "items": items, "expected": expected}
+    with open(MANIFEST_FILE, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1)
+    print(f"{len(manifest)}件のフィクスチャを作成しました: {FIXTURE_DIR}")
+
+# -------------------------------
+# 計測対象
+# -------------------------------
+# 各実装は (計測する関数の名前, 引数なしの関数) で、呼び出すたびに1ページ分の集計を行い結果を返します。
+
+# -------------------------------
+# 置き換え前の関数（要素ごとに WebDriver で取得していた版）の写し
+# -------------------------------
+# 元の main.py の recalc_total_week・recalc_total_month・get_oguchi_value・get_oguchi_value_month と
+# 同じ手順（要素ごとの find_element・get_attribute）で集計します。--browser の比較の基準です。
+# 元の関数との違いは次の点だけです。
+#   - グローバルの extraction_driver の代わりに driver を受け取る
+#   - 読み込み待ちの time.sleep(2) を除く（固定の待ち時間が計測結果のほとんどを占めるため）
+#   - 週の月曜日を現在日時ではなくフィクスチャの週（monday）にする
+#   - 例外を print せずに送出する（計測では失敗を結果の不一致として扱う）
+
+LEGACY_TARGET_CLINICS = [
+    "札幌院", "仙台院", "宇都宮", "高崎院", "大宮院", "柏院", "船橋院",
+    "新宿院", "新橋院", "神田院", "立川院", "横浜院", "静岡院", "名古屋院", "梅田院",
+    "心斎橋", "なんば院", "神戸院", "高松", "広島院", "博多", "天神"
+]
+
+def recalc_total_week(driver):
+    total = 0
+    # ヘッダー行から日付を取得
+    WebDriverWait(driver, 10).until(
+        EC.presence_of_all_elements_located((By.XPATH, "//thead//th[contains(@class, 'sticky')]"))
+    )
+    # 合計行を取得
+    totals_row = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.XPATH, "//tr[td[@class='total']]"))
+    )
+    # 合計行のセルを取得（最初と最後のセルを除く）
+    total_cells = totals_row.find_elements(By.XPATH, ".//td[@class='total sticky']")
+    # 各日の [実] の値を合計
+    for cell in total_cells:
+        spans = cell.find_elements(By.TAG_NAME, "span")
+        for span in spans:
+            match = re.search(r"\[実\](\d+)", span.text)
+            if match:
+                total += int(match.group(1))
+                break
+    return total
+
+def recalc_total_month(driver):
+    total = 0
+    WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CLASS_NAME, "clinic")))
+    clinic_cells = driver.find_elements(By.CLASS_NAME, "clinic")
+    for cell in clinic_cells:
+        try:
+            clinic_name = cell.find_element(By.TAG_NAME, "a").text.strip()
+        except NoSuchElementException:
+            continue
+        if clinic_name in LEGACY_TARGET_CLINICS:
+            spans = cell.find_elements(By.TAG_NAME, "span")
+            for span in spans:
+                match = re.search(r"\[実\](\d+)", span.text)
+                if match:
+                    total += int(match.group(1))
+                    break
+    return total
+
+def get_oguchi_value(driver, page_url, monday):
+    driver.get(page_url)
+    total_oguchi = 0
+    exclude_count = 0
+    for day in range(7):  # 月曜から日曜まで
+        date_str = (monday + timedelta(days=day)).strftime('%Y-%m-%d')
+        # その日付のセルを取得
+        cell_xpath = f"//td[.//a[contains(@href, '{date_str}')]]"
+        try:
+            cell = driver.find_element(By.XPATH, cell_xpath)
+            # 予約を取得（class="rest"で始まるp要素内のaタグ）
+            reservation_links = cell.find_elements(By.CSS_SELECTOR, 'p[class^="rest"] > a')
+            for a in reservation_links:
+                text = a.get_attribute("innerText")
+                outer_html = a.get_attribute("outerHTML")
+                # 術検のみの場合はスキップ
+                if "術検" in text and not any(k in text for k in ["包", "大", "長", "非長", "陰大"]):
+                    continue
+                # EDのみの場合はスキップ
+                if "ED" in text and not any(k in text for k in ["包", "大", "長", "非長", "陰大"]):
+                    continue
+                # 実質大口のカウント
+                if any(keyword in text for keyword in ["包", "大", "長", "非長", "陰大"]):
+                    total_oguchi += 1
+                # 除外カウント（wifi）
+                if "fa fa-wifi" in outer_html:
+                    exclude_count += 1
+        except NoSuchElementException:
+            continue
+    net_value = total_oguchi - exclude_count
+    return total_oguchi, exclude_count, net_value
+
+def get_oguchi_value_month(driver, page_url):
+    driver.get(page_url)
+    page_source = driver.page_source
+    big_match = re.search(r"\[大\](\d+)", page_source)
+    if big_match:
+        big_count = int(big_match.group(1))
+    else:
+        big_count = 0
+    exclude_count = 0
+    anchors = driver.find_elements(By.TAG_NAME, "a")
+    for a in anchors:
+        outer_html = a.get_attribute("outerHTML")
+        if ("fa fa-wifi" in outer_html) or ("大[残未計]" in outer_html):
+            exclude_count += 1
+    net_value = big_count - exclude_count
+    return big_count, exclude_count, net_value
+
+# 集計名ごとの置き換え前の関数（関数の名前, driver と URL を受け取る関数）
+# apolloの2つは表示中のページを読むため、更新ループと同じく先に driver.get で読み込む
+LEGACY_BROWSER_FUNCTIONS = {
+    "total_week": ("recalc_total_week", lambda driver, url: (driver.get(url), recalc_total_week(driver))[1]),
+    "total_month": ("recalc_total_month", lambda driver, url: (driver.get(url), recalc_total_month(driver))[1]),
+    "oguchi_week": ("get_oguchi_value", lambda driver, url: list(get_oguchi_value(driver, url, FIXTURE_MONDAY))),
+    "oguchi_month": ("get_oguchi_value_month", lambda driver, url: list(get_oguchi_value_month(driver, url))),
+}
+
+def legacy_counts(snapshot, name):
+    """
+    置き換え前の関数の集計規則（要素ごとの正規表現・キーワード走査）を、解析済みのスナップショットに適用します。
+    ブラウザを使わない計測の比較の基準です（要素ごとの WebDriver の呼び出しは含みません。--browser を参照）。
+    """
+    if name == "total_week":
+        return sum(main.first_jitsu_value(spans) for spans in snapshot["total_cells"])
+    if name == "total_month":
+        return sum(main.first_jitsu_value(spans) for clinic, spans in snapshot["clinics"] if clinic in main.TARGET_CLINICS)
+    if name == "oguchi_week":
+        total_oguchi = exclude_count = 0
+        for day in range(7):
+            for text, is_wifi in snapshot["days"].get((FIXTURE_MONDAY + timedelta(days=day)).strftime('%Y-%m-%d'), []):
+                if "術検" in text and not any(keyword in text for keyword in main.OGUCHI_KEYWORDS):
+                    continue
+                if "ED" in text and not any(keyword in text for keyword in main.OGUCHI_KEYWORDS):
+                    continue
+                if any(keyword in text for keyword in main.OGUCHI_KEYWORDS):
+                    total_oguchi += 1
+                if is_wifi:
+                    exclude_count += 1
+        return [total_oguchi, exclude_count, total_oguchi - exclude_count]
+    exclude_count = sum(1 for is_wifi, is_mikei in snapshot["anchors"] if is_wifi or is_mikei)
+    return [snapshot["big_count"], exclude_count, snapshot["big_count"] - exclude_count]
+
+# ページ単位の集計（更新ループ・バックフィルと同じ main.py の日別・ページ別の集計関数で数える）
+
+def count_total_week(snapshot):
+    """
+    合計行の [実] を合計します。
+    """
+    return sum(main.first_jitsu_value(spans) for spans in snapshot["total_cells"])
+
+def count_total_month(snapshot):
+    """
+    対象クリニックの [実] を合計します。
+    """
+    return sum(main.first_jitsu_value(spans) for name, spans in snapshot["clinics"] if name in main.TARGET_CLINICS)
+
+def count_oguchi_week(snapshot, monday):
+    """
+    monday から7日間の [total_oguchi, exclude_count, net_value] を数えます。
+    """
+    total_oguchi = exclude_count = 0
+    for day in range(7):
+        reservations = snapshot["days"].get((monday + timedelta(days=day)).strftime('%Y-%m-%d'), [])
+        oguchi, exclude = main.count_day_reservations(reservations)
+        total_oguchi += oguchi
+        exclude_count += exclude
+    return [total_oguchi, exclude_count, total_oguchi - exclude_count]
+
+def count_oguchi_month(snapshot):
+    """
+    [big_count, exclude_count, net_value] を数えます。
+    """
+    net_value, = main.count_month_oguchi((snapshot["big_count"], snapshot["anchors"]))
+    return [snapshot["big_count"], snapshot["big_count"] - net_value, net_value]
+
+# フィクスチャの種類ごとの集計名と、スナップショットを集計する関数（名前, 関数）
+AGGREGATES = {
+    "apollo_week": [("total_week", "count_total_week", count_total_week)],
+    "apollo_month": [("total_month", "count_total_month", count_total_month)],
+    "tomato_month": [
+        ("oguchi_week", "count_oguchi_week", lambda snapshot: count_oguchi_week(snapshot, FIXTURE_MONDAY)),
+        ("oguchi_month", "count_oguchi_month", count_oguchi_month),
+    ],
+}
+
+# 比較の基準にする実装（置き換え前の手順）。Selenium経由の実装は置き換え前の関数そのものと比べる
+BASELINE_IMPLEMENTATION = "legacy_scan"
+BROWSER_BASELINE_IMPLEMENTATION = "legacy_selenium"
+
+def baseline_of(implementation):
+    """
+    実装の比較の基準にする実装名を返します（基準の実装自身は None）。
+    """
+    if implementation in (BASELINE_IMPLEMENTATION, BROWSER_BASELINE_IMPLEMENTATION):
+        return None
+    if implementation.startswith("selenium"):
+        return BROWSER_BASELINE_IMPLEMENTATION
+    return BASELINE_IMPLEMENTATION
+
+def python_implementations(name, function_name, count, source, snapshot):
+    """
+    ブラウザを使わない実装を {実装名: (関数の名前, 関数)} で返します。
+    """
+    return {
+        # HTMLの解析とスナップショット作成（HTTPバックエンドの抽出処理）
+        "parse_snapshot": ("build_page_snapshot", lambda: main.build_page_snapshot(main.parse_html(source), source)),
+        # 解析済みスナップショットを置き換え前の手順で集計（比較の基準）
+        BASELINE_IMPLEMENTATION: ("legacy_counts", lambda: legacy_counts(snapshot, name)),
+        # 解析済みスナップショットを main.py の集計関数で集計
+        "day_counts": (function_name, lambda: count(snapshot)),
+    }
+
+def cycle_implementations(plan, snapshots):
+    """
+    1周期分（週間・月間のA残込・K残込）の集計を {実装名: 関数} で返します。
+    戻り値はいずれも (week_a_total, month_a_total, week_k_total, month_k_total) です。
+    """
+    warm_cache = main.DayCountCache()
+    main.aggregate_cycle_incremental(plan, snapshots, warm_cache)
+
+    def period():
+        week_a, week_k = main.aggregate_period("week", plan, snapshots)
+        month_a, month_k = main.aggregate_period("month", plan, snapshots)
+        return week_a, month_a, week_k, month_k
+    return {
+        # 更新ループの初回（日別キャッシュが空）
+        "incremental_cold": lambda: main.aggregate_cycle_incremental(plan, snapshots, main.DayCountCache()),
+        # 更新ループの2回目以降（内容の変わらない日は再集計しない）
+        "incremental_warm": lambda: main.aggregate_cycle_incremental(plan, snapshots, warm_cache),
+        # バックフィルの集計（期間ごとに新しい日別キャッシュで、週・月を別々に集計）
+        "period": period,
+    }
+
+def cycle_fixture(manifest, size, snapshots_by_file):
+    """
+    規模 size のフィクスチャを plan_cycle_fetches の計画のURLに割り当て、(計画, スナップショット, 期待値) を返します。
+    tomatoはすべてのクリニックに同じページを割り当てます。
+    """
+    plan = main.plan_cycle_fetches(FIXTURE_MONDAY)
+    files = {info["kind"]: filename for filename, info in manifest.items() if info["size"] == size}
+    snapshots = {
+        plan["apollo_week"]: snapshots_by_file[files["apollo_week"]],
+        plan["apollo_month"]: snapshots_by_file[files["apollo_month"]],
+    }
+    for url in plan["tomato_urls"]:
+        snapshots[url] = snapshots_by_file[files["tomato_month"]]
+    tomato = manifest[files["tomato_month"]]["expected"]
+    clinics = len(plan["tomato_month"])
+    expected = (
+        manifest[files["apollo_week"]]["expected"]["total_week"],
+        manifest[files["apollo_month"]]["expected"]["total_month"],
+        tomato["oguchi_week"][2] * clinics,
+        tomato["oguchi_month"][2] * clinics,
+    )
+    return plan, snapshots, expected, files
+
+def create_benchmark_driver(profile_dir):
+    """
+    計測用のヘッドレスChromeを起動します（表示中の端末のプロファイルとは別の一時プロファイル）。
+    """
+    options = main.webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    return main.webdriver.Chrome(service=main.Service(main.get_chrome_driver_path()), options=options)
+
+# フィクスチャの種類ごとの読み込み完了を判定する要素（更新ループの取得と同じ）
+PAGE_LOCATORS = {
+    "apollo_week": main.APOLLO_TOTALS_ROW,
+    "apollo_month": main.APOLLO_CLINIC_CELLS,
+    "tomato_month": main.TOMATO_DAY_LINKS,
+}
+
+def browser_implementations(driver, path, kind, name, count):
+    """
+    置き換え前の関数（要素ごとの取得）と、main.load_page_selenium での読み込み・抽出と集計を
+    ページソースの解析（element）とスクリプト1回の一括取得（bulk）で {実装名: (関数の名前, 関数)} として返します。
+    """
+    url = "file:///" + path.replace(os.sep, "/")
+    legacy_name, legacy = LEGACY_BROWSER_FUNCTIONS[name]
+
+    def run(mode):
+        def call():
+            main.CONFIG["selenium_extraction"] = mode
+            return count(main.load_page_selenium(driver, url, PAGE_LOCATORS[kind], "bench"))
+        return call
+    return {
+        BROWSER_BASELINE_IMPLEMENTATION: (legacy_name, lambda: legacy(driver, url)),
+        "selenium_element": ("load_page_selenium", run("element")),
+        "selenium_bulk": ("load_page_selenium", run("bulk")),
+    }
+
+# -------------------------------
+# 計測と比較
+# -------------------------------
+
+def time_call(func, min_time, min_runs):
+    """
+    func() を min_time 秒以上かつ min_runs 回以上実行し、(最後の結果, 1回ごとの所要時間) を返します。
+    """
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_runs or time.perf_counter() - started < min_time:
+        begin = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - begin)
+    return result, timings
+
+def run_benchmarks(args):
+    with open(MANIFEST_FILE, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+
+    driver = profile_dir = None
+    if args.browser:
+        profile_dir = tempfile.mkdtemp(prefix="bench_profile_")
+        driver = create_benchmark_driver(profile_dir)
+
+    results = []
+
+    def measure(benchmark, function_name, implementation, fixture, size, items, size_bytes, func, ok, browser=False):
+        result, timings = time_call(func, min_time=args.min_time, min_runs=1 if browser else args.min_runs)
+        median = statistics.median(timings)
+        entry = {
+            "benchmark": benchmark,
+            "function": function_name,
+            "implementation": implementation,
+            "fixture": fixture,
+            "size": size,
+            "items": items,
+            "bytes": size_bytes,
+            "runs": len(timings),
+            "median_ms": round(median * 1000, 4),
+            "min_ms": round(min(timings) * 1000, 4),
+            "items_per_s": round(items / median, 1) if median else None,
+            "ok": ok(result),
+        }
+        results.append(entry)
+        print(
+            f"{benchmark:<13}{implementation:<18}{size:<10}"
+            f"{entry['median_ms']:>10.3f} ms{'' if entry['ok'] else '  結果不一致'}",
+            file=sys.stderr,
+        )
+
+    try:
+        snapshots_by_file, bytes_by_file = {}, {}
+        for filename, info in manifest.items():
+            if args.size and info["size"] not in args.size:
+                continue
+            path = os.path.join(FIXTURE_DIR, filename)
+            with open(path, "r", encoding="utf-8") as file:
+                source = file.read()
+            size_bytes = bytes_by_file[filename] = len(source.encode("utf-8"))
+            snapshot = snapshots_by_file[filename] = main.build_page_snapshot(main.parse_html(source), source)
+            for name, function_name, count in AGGREGATES[info["kind"]]:
+                implementations = python_implementations(name, function_name, count, source, snapshot)
+                if driver is not None:
+                    implementations.update(browser_implementations(driver, path, info["kind"], name, count))
+                for implementation, (measured_name, func) in implementations.items():
+                    if implementation == "parse_snapshot":
+                        if name != AGGREGATES[info["kind"]][0][0]:
+                            continue  # 解析は同じページで1回だけ計測
+                        measure("parse", measured_name, implementation, filename, info["size"],
+                                info["items"], size_bytes, func, lambda result: True)
+                        continue
+                    measure(name, measured_name, implementation, filename, info["size"], info["items"], size_bytes,
+                            func, lambda result: result == info["expected"][name],
+                            implementation.startswith("selenium") or implementation == BROWSER_BASELINE_IMPLEMENTATION)
+
+        # 1周期分の集計（更新ループとバックフィル）
+        for size in FIXTURE_SIZES:
+            if args.size and size not in args.size:
+                continue
+            plan, snapshots, expected, files = cycle_fixture(manifest, size, snapshots_by_file)
+            items = sum(manifest[filename]["items"] for filename in files.values())
+            size_bytes = sum(bytes_by_file[filename] for filename in files.values())
+            for implementation, func in cycle_implementations(plan, snapshots).items():
+                measure("cycle", "aggregate_cycle_incremental" if implementation.startswith("incremental")
+                        else "aggregate_period", implementation, f"cycle_{size}", size, items, size_bytes,
+                        func, lambda result: tuple(result) == expected)
+    finally:
+        if driver is not None:
+            driver.quit()
+            shutil.rmtree(profile_dir, ignore_errors=True)
+    compare_with_baseline(results)
+    return results
+
+def compare_with_baseline(results):
+    """
+    同じ集計・フィクスチャの置き換え前の手順と比べた速度の倍率を speedup に記録します。
+    Selenium経由の実装は置き換え前の関数（legacy_selenium）、それ以外は legacy_scan と比べます。
+    """
+    key = lambda entry: (entry["benchmark"], entry["fixture"], entry["implementation"])
+    baselines = {key(entry): entry for entry in results}
+    for entry in results:
+        baseline_name = baseline_of(entry["implementation"])
+        baseline = baselines.get((entry["benchmark"], entry["fixture"], baseline_name))
+        if baseline is None or entry is baseline or not entry["median_ms"]:
+            continue
+        entry["baseline"] = baseline_name
+        entry["speedup"] = round(baseline["median_ms"] / entry["median_ms"], 2)
+        print(
+            f"{entry['benchmark']:<13}{entry['implementation']:<18}{entry['size']:<10}"
+            f"{baseline_name}の{entry['speedup']:.2f}倍",
+            file=sys.stderr,
+        )
+
+def find_regressions(results, baseline, threshold):
+    """
+    基準の結果より threshold の割合以上遅くなった項目を返します。
+    """
+    key = lambda entry: (entry["benchmark"], entry["implementation"], entry["fixture"])
+    previous = {key(entry): entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        before = previous.get(key(entry))
+        if before and before["median_ms"] and entry["median_ms"] > before["median_ms"] * (1 + threshold):
+            regressions.append({
+                "benchmark": entry["benchmark"],
+                "implementation": entry["implementation"],
+                "fixture": entry["fixture"],
+                "baseline_ms": before["median_ms"],
+                "median_ms": entry["median_ms"],
+                "ratio": round(entry["median_ms"] / before["median_ms"], 3),
+            })
+    return regressions
+
+def parse_command_line(argv=None):
+    parser = argparse.ArgumentParser(description="抽出・集計処理のベンチマーク")
+    parser.add_argument("command", nargs="?", choices=["run", "generate"], default="run")
+    parser.add_argument("--size", action="append", choices=list(FIXTURE_SIZES), help="計測する規模（複数指定可）")
+    parser.add_argument("--browser", action="store_true", help="Selenium経由の関数も計測する（Chromeが必要）")
+    parser.add_argument("--min-time", type=float, default=0.5, help="1項目あたりの最短計測時間（秒）")
+    parser.add_argument("--min-runs", type=int, default=5, help="1項目あたりの最少実行回数")
+    parser.add_argument("--output", help="結果のJSONを書き出すファイル（省略時は標準出力）")
+    parser.add_argument("--baseline", help="比較する過去の結果のJSON")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="劣化とみなす遅延の割合")
+    return parser.parse_args(argv)
+
+def main_bench(argv=None):
+    args = parse_command_line(argv)
+    if args.command == "generate":
+        generate_fixtures()
+        return 0
+
+    results = run_benchmarks(args)
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            report["regressions"] = find_regressions(results, json.load(file), args.threshold)
+
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if not all(entry["ok"] for entry in results):
+        return 2
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
@@ -0,0 +1,298 @@
+"""
+代替サーバーを相手に main.py の更新処理を繰り返し実行する負荷試験
+
+    python load_simulator.py --cycles 30 --tomato-clinics 20 --per-day 80 --latency 200 --jitter 150
+    python load_simulator.py --backend selenium --cycles 10 --fail-rate 0.02 --output load.json
+    python load_simulator.py --backend selenium --watch --schedule --cycles 20 --churn 30
+
+standin_server.py を同じプロセス内で起動し（--server で既存のサーバーも指定可）、
+取得・集計・時系列の記録・表示内容の作成までの1周期（main.py の更新ループと同じ collect_scheduled）を
+--cycles 回実行して、
+周期の所要時間の分位点、エラー件数、メモリ使用量、ブラウザのプロセス数を JSON で出力します。
+本番の設定・Cookie・履歴には触れないよう、一時ディレクトリの設定ファイルで main.py を読み込みます。
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import main
+import standin_server
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, ratio):
+    """
+    最近傍順位法による分位点を返します。
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(ratio * len(ordered) + 0.5) - 1))]
+
+# -------------------------------
+# プロセスのメモリ・ブラウザ数
+# -------------------------------
+
+def _proc_table():
+    """
+    /proc から {pid: (親pid, コマンド名, RSSバイト)} を作成します（Linuxのみ）。
+    """
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as file:
+                stat = file.read()
+            with open(f"/proc/{entry}/statm", "r") as file:
+                rss_pages = int(file.read().split()[1])
+        except OSError:
+            continue
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        parent = int(stat[stat.rindex(")") + 2:].split()[1])
+        table[int(entry)] = (parent, name, rss_pages * page_size)
+    return table
+
+def process_stats():
+    """
+    このプロセスのRSSと、子孫のブラウザ（chrome / chromedriver）のプロセス数・RSS合計を返します。
+    psutil がない場合は /proc を読みます。どちらも使えない場合は None を返します。
+    """
+    if psutil is not None:
+        me = psutil.Process()
+        browsers = [p for p in me.children(recursive=True) if "chrom" in p.name().lower()]
+        return {
+            "python_rss_mb": me.memory_info().rss / 2**20,
+            "browser_processes": len(browsers),
+            "browser_rss_mb": sum(p.memory_info().rss for p in browsers) / 2**20,
+        }
+    if not os.path.isdir("/proc"):
+        return None
+    table = _proc_table()
+    descendants, frontier = set(), {os.getpid()}
+    while frontier:
+        frontier = {pid for pid, (parent, _, _) in table.items() if parent in frontier} - descendants
+        descendants |= frontier
+    browsers = [pid for pid in descendants if "chrom" in table[pid][1].lower()]
+    return {
+        "python_rss_mb": table[os.getpid()][2] / 2**20,
+        "browser_processes": len(browsers),
+        "browser_rss_mb": sum(table[pid][2] for pid in browsers) / 2**20,
+    }
+
+# -------------------------------
+# main.py の準備と1周期の実行
+# -------------------------------
+
+def load_main(args, base_url, workdir):
+    """
+    代替サーバーを向いた一時設定ファイルを作成し、それを読み込み直した main モジュールを返します。
+    """
+    config = {
+        "extraction_backend": args.backend,
+        "apollo_base_url": f"{base_url}/apollo",
+        "tomato_base_url": f"{base_url}/tomato",
+        "login_account": "loadtest",
+        "login_password": "loadtest",
+        "session_dir": os.path.join(workdir, "sessions"),
+        "history_db": os.path.join(workdir, "history.sqlite3"),
+        "driver_cache_dir": os.path.join(APP_DIR, "drivers"),
+        "display_mode": "server",
+        "metrics_file": os.path.join(workdir, "weekgoal.prom"),
+        "clinics": standin_server.standin_clinics(args.apollo_clinics, args.tomato_clinics),
+    }
+    if args.fetch_workers:
+        config["fetch_workers"] = args.fetch_workers
+    if args.site_max_parallel:
+        config["site_max_parallel"] = args.site_max_parallel
+    if args.watch:
+        config["selenium_watch"] = True
+    config_path = os.path.join(workdir, "weekgoal_config.json")
+    with open(config_path, "w", encoding="utf-8") as file:
+        json.dump(config, file, ensure_ascii=False)
+    os.environ["WEEKGOAL_CONFIG"] = config_path
+    for name in ("WEEKGOAL_BACKEND", "WEEKGOAL_APOLLO_URL", "WEEKGOAL_TOMATO_URL", "WEEKGOAL_ACCOUNT", "WEEKGOAL_PASSWORD"):
+        os.environ.pop(name, None)
+    for filename in ("week_target_values.txt", "month_target_values.txt"):
+        if os.path.exists(os.path.join(APP_DIR, filename)):
+            shutil.copy(os.path.join(APP_DIR, filename), workdir)
+    # 設定はモジュールの読み込み時に確定するため、設定ファイルを差し替えて読み込み直す
+    # 結果HTMLも一時ディレクトリに出力する
+    os.chdir(workdir)
+    return importlib.reload(main)
+
+def login_sites(main, backend):
+    """
+    main.py の起動処理と同じ手順でapollo・tomatoにログインし、(apollo_site, tomato_site, browser) を返します。
+    """
+    browser = None
+    if backend == "http":
+        apollo_site = main.SiteSession("apollo", main.create_http_session(), main.auto_login_apollo_http, main.get_week_url)
+        tomato_site = main.SiteSession("tomato", main.create_http_session(), main.auto_login_tomato_http, main.get_tomato_check_url)
+    else:
+        browser = main.SharedHeadlessBrowser(main.get_chrome_driver_path())
+        apollo_site = main.SiteSession("apollo", browser.driver("apollo"), main.auto_login_apollo, main.get_week_url)
+        tomato_site = main.SiteSession("tomato", browser.driver("tomato"), main.auto_login_tomato, main.get_tomato_check_url)
+    for site in (apollo_site, tomato_site):
+        if not site.ensure_login():
+            raise RuntimeError(f"{site.name}へのログインに失敗しました")
+    return apollo_site, tomato_site, browser
+
+def run_cycle(main, loop, schedule=False):
+    """
+    更新ループ1回分（取得・集計・記録・表示内容の作成と配信）を main.py と同じ RefreshLoop.run_cycle で実行します。
+    schedule が False の場合はすべての取得元を取得時刻にして、毎回すべてのページを取得します。
+    取り込んだ結果がなかった場合は None を返します。
+    """
+    if not schedule:
+        loop.scheduler.next_run.clear()
+    # run_cycle のコンソール表示は標準出力に出るため、結果のJSONと混ざらないよう標準エラー出力へ回す
+    with contextlib.redirect_stdout(sys.stderr):
+        return loop.run_cycle(wait=None if schedule else main.CONFIG["task_timeout"])
+
+def stage_summary(main):
+    """
+    main.py のメトリクスから、処理段階ごとの平均所要時間（ミリ秒）と回数を返します。
+    """
+    summary = {}
+    for (name, labels), value in main.metrics.values.items():
+        if name == "weekgoal_stage_seconds" and value[-1]:
+            label = "/".join(str(v) for k, v in labels if k != "stage")
+            stage = dict(labels)["stage"] + (f"[{label}]" if label else "")
+            summary[stage] = {"mean_ms": round(value[-2] / value[-1] * 1000, 3), "count": value[-1]}
+    return dict(sorted(summary.items()))
+
+def run_simulation(args):
+    server = None
+    if args.server:
+        base_url = args.server.rstrip("/")
+    else:
+        server = standin_server.create_standin_server(args)
+        threading.Thread(target=server.serve_forever, name="standin", daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    workdir = tempfile.mkdtemp(prefix="weekgoal_load_")
+    main = load_main(args, base_url, workdir)
+    started = time.perf_counter()
+    apollo_site, tomato_site, browser = login_sites(main, args.backend)
+    login_seconds = time.perf_counter() - started
+
+    store = main.TimeSeriesStore()
+    loop = main.RefreshLoop(apollo_site, tomato_site, args.backend == "http", store, main.DashboardState())
+    durations, errors, samples = [], {}, []
+    idle = 0
+    try:
+        for cycle in range(args.cycles):
+            if args.schedule:
+                time.sleep(loop.scheduler.seconds_until_next())
+            cycle_started = time.perf_counter()
+            try:
+                totals = run_cycle(main, loop, args.schedule)
+                if totals is None:
+                    idle += 1
+                else:
+                    durations.append(time.perf_counter() - cycle_started)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            sample = process_stats()
+            if sample:
+                samples.append(sample)
+            elapsed = time.perf_counter() - cycle_started
+            print(f"周期 {cycle + 1}/{args.cycles}: {elapsed * 1000:.0f} ms", file=sys.stderr)
+            if args.interval > elapsed:
+                time.sleep(args.interval - elapsed)
+    finally:
+        store.close()
+        if browser is not None:
+            browser.quit()
+
+    server_stats = None
+    if server is not None:
+        server_stats = dict(server.RequestHandlerClass.site.stats)
+        server.shutdown()
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "cycles": args.cycles,
+        "succeeded": len(durations),
+        "idle": idle,
+        "errors": errors,
+        "stale_sources": sorted(loop.cache.errors),
+        "login_s": round(login_seconds, 3),
+        "cycle_s": {
+            "p50": percentile(durations, 0.5),
+            "p90": percentile(durations, 0.9),
+            "p95": percentile(durations, 0.95),
+            "p99": percentile(durations, 0.99),
+            "max": max(durations) if durations else None,
+            "mean": statistics.fmean(durations) if durations else None,
+        },
+        "memory": {
+            "python_rss_mb_max": max((s["python_rss_mb"] for s in samples), default=None),
+            "browser_rss_mb_max": max((s["browser_rss_mb"] for s in samples), default=None),
+            "browser_processes_max": max((s["browser_processes"] for s in samples), default=None),
+            "samples": samples if args.keep_samples else len(samples),
+        },
+        "stages": stage_summary(main),
+        "server": server_stats,
+        "workdir": workdir,
+        "settings": {
+            "tomato_clinics": len(main.CLINIC_REGISTRY["tomato"]),
+            "apollo_clinics": len(main.CLINIC_REGISTRY["apollo"]),
+            "per_day": args.per_day,
+            "latency_ms": args.latency,
+            "jitter_ms": args.jitter,
+            "fail_rate": args.fail_rate,
+            "fetch_workers": main.CONFIG["fetch_workers"],
+            "site_max_parallel": main.CONFIG["site_max_parallel"],
+            "selenium_watch": main.use_watch_mode(),
+        },
+    }
+    return report
+
+def parse_command_line(argv=None):
+    parser = argparse.ArgumentParser(description="代替サーバーを使った更新処理の負荷試験")
+    standin_server.add_standin_arguments(parser)
+    parser.set_defaults(port=0)  # 空いているポートで起動
+    parser.add_argument("--server", help="既に起動している代替サーバーのURL（例: http://127.0.0.1:8900）")
+    parser.add_argument("--backend", choices=["http", "selenium"], default="http")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0, help="周期の開始間隔（秒、0は連続実行）")
+    parser.add_argument("--schedule", action="store_true",
+                        help="取得元ごとの取得間隔（refresh_intervals）に従う（省略時は毎周期すべてのページを取得）")
+    parser.add_argument("--watch", action="store_true",
+                        help="Seleniumバックエンドで監視モード（selenium_watch）を使う")
+    parser.add_argument("--fetch-workers", type=int, help="同時に実行する取得タスクの上限")
+    parser.add_argument("--site-max-parallel", type=int, help="1サイトあたりの同時取得数の上限")
+    parser.add_argument("--keep-samples", action="store_true", help="周期ごとのメモリ計測値も出力する")
+    parser.add_argument("--output", help="結果のJSONを書き出すファイル（省略時は標準出力）")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_command_line()
+    output = os.path.abspath(args.output) if args.output else None
+    report = run_simulation(args)
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            file.write(text)
+    else:
+        print(text)
@@ -5,7 +5,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service as ChromeService
 import keyboard
@@ -16,7 +16,37 @@ from datetime import datetime, timedelta
 import sys
 import logging
 import shutil
+import subprocess
+import socket
 import tempfile
+import string
+import threading
+import signal
+import cProfile
+import pstats
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as wait_futures
+import json
+import hashlib
+import random
+import sqlite3
+import csv
+import argparse
+from bisect import bisect_left
+import html
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import webbrowser
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import psutil  # ブラウザのメモリ使用量の監視に使用（ない場合はページ数・起動時間だけで判定）
+except ImportError:
+    psutil = None
 
 # ログ設定
 log_file = 'weekgoal_error.log'
@@ -26,471 +56,2568 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def calculate_week_number():
+# 集計対象のクリニック（設定ファイルの "clinics" で置き換え可能）
+# id: サイト上のID（apolloは院名）, name: 表示名, site: "apollo" または "tomato",
+# group: 集計区分（"A": A残込, "K": K残込。省略時は site から apollo は "A"、tomato は "K"）
+#        クリニック別の値（apollo月間、tomato週間・月間）を group ごとに合計します。
+#        週間のapolloは合計行（サイト全体）の値のため、apolloの既定の区分（"A"）に数えます。
+DEFAULT_CLINICS = [
+    {"id": 13, "name": "上野", "site": "tomato", "group": "K"},
+    {"id": 10, "name": "京都", "site": "tomato", "group": "K"},
+] + [
+    {"id": name, "name": name, "site": "apollo", "group": "A"}
+    for name in [
+        "札幌院", "仙台院", "宇都宮", "高崎院", "大宮院", "柏院", "船橋院",
+        "新宿院", "新橋院", "神田院", "立川院", "横浜院", "静岡院", "名古屋院", "梅田院",
+        "心斎橋", "なんば院", "神戸院", "高松", "広島院", "博多", "天神"
+    ]
+]
+
+# 設定ファイル（存在しない場合は既定値を使用、WEEKGOAL_CONFIG で別のファイルを指定可能）
+# ログイン情報を含むためリポジトリには含めない（weekgoal_config.example.json をコピーして作成）
+CONFIG_FILE = os.environ.get("WEEKGOAL_CONFIG") or "weekgoal_config.json"
+DEFAULT_CONFIG = {
+    "extraction_backend": "selenium",  # "selenium" または "http"
+    "apollo_base_url": "https://apollo-scedure77.net",
+    "tomato_base_url": "https://tomato-systemprograms1455.com",
+    "http_timeout": 10,
+    "fetch_workers": 6,  # 同時に実行する取得タスクの上限
+    "task_timeout": 90,  # 取得タスク1件あたりのタイムアウト（秒）
+    "page_ready_timeout": 10,  # ページ読み込み完了を待つ上限（秒）
+    "selenium_extraction": "bulk",  # "bulk"（スクリプト1回で一括取得）または "element"（ページソースを解析）
+    "display_mode": "file",  # "file"（HTMLファイル + 表示用ブラウザ）または "server"（ライブ更新ダッシュボード）
+    "dashboard_port": 8765,
+    "driver_cache_dir": "drivers",  # ChromeDriverのキャッシュ先（アプリのディレクトリからの相対パス）
+    "login_account": "",  # ログイン情報（apollo_account / tomato_account などでサイト別に指定も可）
+    "login_password": "",
+    "session_dir": "sessions",  # ログイン後のCookieの保存先
+    "relogin_backoff": 30,  # 再ログイン失敗時の待機時間（秒、失敗のたびに倍）
+    "relogin_backoff_max": 900,
+    "site_max_parallel": 4,  # 1サイトあたりの同時取得数の上限（HTTPバックエンドのみ。Seleniumはサイトごとに1タブで順番に取得）
+    "history_db": "history.sqlite3",  # 集計値の時系列の保存先（空文字で記録しない）
+    "metrics_file": "metrics.prom",  # メトリクスの書き出し先（空文字で書き出さない）
+    # 取得元ごとの取得間隔（秒）。tomato はクリニックごとに適用
+    "refresh_intervals": {"apollo_week": 60, "apollo_month": 300, "tomato": 60},
+    "refresh_backoff_max": 900,  # 取得に失敗した取得元の再試行間隔の上限（秒）
+    "cycle_wait": 20,  # 1周期で取得の完了を待つ上限（秒、残りはバックグラウンドで続行）
+    # 抽出用ブラウザで読み込まないリソース（image / font / media / stylesheet）とURLのパターン
+    "blocked_resource_types": ["image", "font", "media"],
+    "blocked_url_patterns": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*facebook.net*",
+    ],
+    # 遮断・転送したリソースをパフォーマンスログで数える（ログの記録に負荷がかかるため計測時だけ有効にする）
+    "measure_blocked_resources": False,
+    # 遮断したリソース1件あたりの推定サイズ（バイト）。遮断した要求は転送されないため、節約できた量はこの値で見積もる
+    # （other は blocked_url_patterns で遮断したスクリプトなど）
+    "blocked_resource_estimated_bytes": {"image": 30000, "font": 50000, "media": 500000, "stylesheet": 20000, "other": 20000},
+    "headless_profile_dir": "",  # 抽出用ブラウザのプロファイル（空文字で起動ごとの一時プロファイル）
+    "headless_profile_max_mb": 200,  # 固定プロファイルがこれを超えたら起動時に作り直す
+    "selenium_watch": False,  # 監視モード（ページを開いたままタブ内で取り直し、変化だけを受け取る）
+    "watch_prefetch": 10,  # 監視モードで、次の取得の何秒前にタブ内のページを取り直しておくか
+    "headless_disk_cache_mb": 16,  # 抽出用ブラウザのディスクキャッシュの上限
+    # ブラウザを新しいものに入れ替える条件（Chrome全体のRSS、読み込んだページ数、起動からの時間）
+    "browser_max_rss_mb": 1500,
+    "browser_max_pages": 5000,
+    "browser_max_age_hours": 24,
+    "profile_cycles": 0,  # 起動直後からプロファイルする周期数（--profile でも指定可）
+    "profile_signal_cycles": 3,  # シグナルを受けたときにプロファイルする周期数
+    "profile_dir": "profiles",  # プロファイル（pstats）の書き出し先
+    "profile_keep": 20,  # 保存しておくプロファイルの数
+    "clinics": DEFAULT_CLINICS,
+}
+# 環境変数による上書き（ローカルの代替サーバーで検証する場合など）
+CONFIG_ENV_OVERRIDES = {
+    "WEEKGOAL_BACKEND": "extraction_backend",
+    "WEEKGOAL_APOLLO_URL": "apollo_base_url",
+    "WEEKGOAL_TOMATO_URL": "tomato_base_url",
+    "WEEKGOAL_DISPLAY": "display_mode",
+    "WEEKGOAL_ACCOUNT": "login_account",
+    "WEEKGOAL_PASSWORD": "login_password",
+    "WEEKGOAL_PROFILE": "profile_cycles",
+}
+
+def load_config():
+    """
+    設定ファイルと環境変数から設定を読み込みます。
+    ファイルが存在しない場合は既定値を使用します。
+    """
+    config = dict(DEFAULT_CONFIG)
+    try:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as file:
+            config.update(json.load(file))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"設定ファイルの読み込みエラー: {e}")
+    for env_name, key in CONFIG_ENV_OVERRIDES.items():
+        if os.environ.get(env_name):
+            config[key] = os.environ[env_name]
+    return config
+
+CONFIG = load_config()
+APOLLO_BASE_URL = CONFIG["apollo_base_url"].rstrip("/")
+TOMATO_BASE_URL = CONFIG["tomato_base_url"].rstrip("/")
+
+# サイトごとの既定の集計区分
+SITE_GROUPS = {"apollo": "A", "tomato": "K"}
+
+def build_clinic_registry(clinics):
+    """
+    クリニック一覧から、サイトごとの索引 {サイト: {ID: クリニック}} を作成します。
+    apolloのIDは院名なので、セルの院名で直接引けます。
+    group を省略したクリニックにはサイトの既定の集計区分を補います。
+    group が "A"・"K" 以外の場合は ValueError を送出します。
+    """
+    registry = {"apollo": {}, "tomato": {}}
+    for clinic in clinics:
+        clinic = dict(clinic)
+        clinic.setdefault("group", SITE_GROUPS.get(clinic["site"]))
+        if clinic["group"] not in SITE_GROUPS.values():
+            raise ValueError(f"クリニック {clinic['name']} の集計区分 {clinic['group']!r} は \"A\" か \"K\" を指定してください")
+        registry.setdefault(clinic["site"], {})[clinic["id"]] = clinic
+    return registry
+
+CLINIC_REGISTRY = build_clinic_registry(CONFIG["clinics"])
+
+# tomatoサイトのクリニックID
+TOMATO_CLINICS = tuple(CLINIC_REGISTRY["tomato"])
+
+# 実質大口と判定するキーワード
+OGUCHI_KEYWORDS = ["包", "大", "長", "非長", "陰大"]
+
+# apolloサイトで月間A残込の対象とするクリニック（院名 -> クリニック）
+TARGET_CLINICS = CLINIC_REGISTRY["apollo"]
+
+def calculate_week_number(current_date=None):
     """
-    2024年12月30日を1週目として、現在の週数を計算します。
+    2024年12月30日を1週目として、現在（または current_date）の週数を計算します。
     """
     start_date = datetime(2024, 12, 30)  # 1週目の開始日
-    current_date = datetime.now()
+    current_date = current_date or datetime.now()
     days_diff = (current_date - start_date).days
     week_number = (days_diff // 7) + 1
     return week_number
 
 
-def recalc_total_week():
+# -------------------------------
+# 計測（処理段階ごとの所要時間とメトリクス、Prometheusのテキスト形式で出力）
+# -------------------------------
+
+# 所要時間のヒストグラムの区切り（秒）
+METRIC_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# メトリクス名 -> (種類, 説明)
+METRIC_TYPES = {
+    "weekgoal_stage_seconds": ("histogram", "処理段階ごとの所要時間"),
+    "weekgoal_stage_failures_total": ("counter", "例外で終わった処理段階の回数"),
+    "weekgoal_pages_total": ("counter", "取得したページ数"),
+    "weekgoal_logins_total": ("counter", "ログインの試行回数"),
+    "weekgoal_retries_total": ("counter", "セッション切れによる取得のやり直し回数"),
+    "weekgoal_cycle_errors_total": ("counter", "失敗した更新周期の回数"),
+    "weekgoal_reservations": ("gauge", "直近の周期で読み取ったtomatoの予約件数"),
+    "weekgoal_changed_days": ("gauge", "直近の周期で内容が変わった日数"),
+    "weekgoal_total": ("gauge", "直近の周期の集計値"),
+    "weekgoal_last_success_timestamp_seconds": ("gauge", "最後に成功した時刻（UNIX時間）"),
+    "weekgoal_source_failing": ("gauge", "前回の結果で表示している取得元（1: 失敗中）"),
+    "weekgoal_blocked_requests_total": ("counter", "抽出用ブラウザで遮断したリソースの件数"),
+    "weekgoal_watch_drains_total": ("counter", "監視モードで変化を受け取った回数（changed: 変化があったか）"),
+    "weekgoal_browser_rss_bytes": ("gauge", "ブラウザ（Chrome全体）のRSS"),
+    "weekgoal_browser_recycles_total": ("counter", "ブラウザを入れ替えた回数"),
+    "weekgoal_page_bytes_total": ("counter", "抽出用ブラウザの転送バイト数（transferred）と遮断で節約した推定バイト数（blocked_estimated）"),
+    "weekgoal_cycle_page_bytes": ("gauge", "直近の周期の抽出用ブラウザの転送バイト数と遮断で節約した推定バイト数（kind 別）"),
+}
+
+class Metrics:
     """
-    apolloサイトの指定された週の [実] を合計して返します。
+    カウンタ・ゲージ・ヒストグラムを保持します。複数スレッドから更新できます。
     """
-    total = 0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}  # (名前, ラベル) -> 値（ヒストグラムは [区切りごとの件数..., 合計, 件数]）
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = [0] * (len(METRIC_BUCKETS) + 2)
+            index = bisect_left(METRIC_BUCKETS, value)
+            if index < len(METRIC_BUCKETS):
+                histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def render(self):
+        """
+        Prometheusのテキスト形式（text/plain; version=0.0.4）で返します。
+        """
+        with self.lock:
+            items = sorted((key, list(value) if isinstance(value, list) else value) for key, value in self.values.items())
+        lines = []
+        described = set()
+        for (name, labels), value in items:
+            if name not in described:
+                metric_type, description = METRIC_TYPES.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                described.add(name)
+            if isinstance(value, list):
+                cumulative = 0
+                for bound, count in zip(METRIC_BUCKETS, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                lines.append(f"{name}_sum{format_labels(labels)} {value[-2]:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {value[-1]}")
+            else:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+@contextmanager
+def timed_stage(stage, **labels):
+    """
+    with ブロックの所要時間を weekgoal_stage_seconds に記録します。例外の場合は失敗回数も数えます。
+    """
+    started = time.perf_counter()
     try:
-        # ヘッダー行から日付を取得
-        date_headers = WebDriverWait(extraction_driver, 10).until(
-            EC.presence_of_all_elements_located((By.XPATH, "//thead//th[contains(@class, 'sticky')]"))
-        )
-        
-        # 合計行を取得
-        totals_row = WebDriverWait(extraction_driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//tr[td[@class='total']]"))
-        )
-        
-        # 合計行のセルを取得（最初と最後のセルを除く）
-        total_cells = totals_row.find_elements(By.XPATH, ".//td[@class='total sticky']")
-        
-        # 各日の [実] の値を合計
-        for cell in total_cells:
-            spans = cell.find_elements(By.TAG_NAME, "span")
-            for span in spans:
-                match = re.search(r"\[実\](\d+)", span.text)
-                if match:
-                    total += int(match.group(1))
-                    break
-    except Exception as e:
-        print(f"データ取得エラー (apollo): {e}")
-    return total
+        yield
+    except Exception:
+        metrics.inc("weekgoal_stage_failures_total", stage=stage, **labels)
+        raise
+    finally:
+        metrics.observe("weekgoal_stage_seconds", time.perf_counter() - started, stage=stage, **labels)
 
-def recalc_total_month():
+def write_metrics_file():
     """
-    apolloサイトの22クリニックの [実] を合計して返します。（A残込）
+    メトリクスを metrics_file に書き出します（node_exporter のテキストファイル収集用）。
     """
-    total = 0
-    target_clinics = [
-        "札幌院", "仙台院", "宇都宮", "高崎院", "大宮院", "柏院", "船橋院",
-        "新宿院", "新橋院", "神田院", "立川院", "横浜院", "静岡院", "名古屋院", "梅田院",
-        "心斎橋", "なんば院", "神戸院", "高松", "広島院", "博多", "天神"
-    ]
+    if not CONFIG["metrics_file"]:
+        return
     try:
-        WebDriverWait(extraction_driver, 10).until(EC.presence_of_all_elements_located((By.CLASS_NAME, "clinic")))
-        clinic_cells = extraction_driver.find_elements(By.CLASS_NAME, "clinic")
-        for cell in clinic_cells:
-            try:
-                clinic_name = cell.find_element(By.TAG_NAME, "a").text.strip()
-            except NoSuchElementException:
-                continue
-            if clinic_name in target_clinics:
-                spans = cell.find_elements(By.TAG_NAME, "span")
-                for span in spans:
-                    match = re.search(r"\[実\](\d+)", span.text)
-                    if match:
-                        total += int(match.group(1))
-                        break
-    except Exception as e:
-        print(f"データ取得エラー (apollo): {e}")
-    return total
+        write_text_atomic(os.path.join(get_app_dir(), CONFIG["metrics_file"]), metrics.render())
+    except OSError as e:
+        logging.error(f"メトリクスの書き出しでエラー発生: {e}")
+
+
+metrics = Metrics()
+
+# -------------------------------
+# プロファイル（指定した回数の更新周期だけ cProfile で計測）
+# -------------------------------
 
-def get_oguchi_value(driver, page_url):
+class CycleProfiler:
     """
-    tomatoサイトの指定ページにアクセスし、
-    ① 3/3-9の範囲で実質大口をカウント
-    ② <a>タグをすべて調べ、outerHTMLに "fa fa-wifi" が含まれる場合は除外
-    戻り値は (total_oguchi, exclude_count, net_value) です。
+    request(n) の後、次の n 周期を cProfile で計測し、周期ごとに pstats ファイルを書き出します。
+    取得タスク（別スレッド）も計測し、周期の結果にまとめます。
+    要求がない間は周期ごとの回数の確認だけで、計測のための処理は行いません。
+    Python 3.12 以降の cProfile は sys.monitoring を使い、周期のプロファイラ1つで全スレッドを計測します。
+    このとき別スレッドで2つ目のプロファイラを有効にすると ValueError になるため、
+    スレッドごとのプロファイラは 3.11 以前でだけ使います。
     """
-    driver.get(page_url)
-    time.sleep(2)  # ページ読み込み待ち
 
-    total_oguchi = 0
-    exclude_count = 0
+    def __init__(self, per_thread=None):
+        self.remaining = 0
+        self.per_thread = sys.version_info < (3, 12) if per_thread is None else per_thread
+        self.thread_profiles = None  # 計測中の周期の取得タスクのプロファイル
+        self.lock = threading.Lock()
 
-    try:
-        # 現在の週の月曜日と日曜日を取得
-        monday, sunday = get_current_week_range()
-        
-        # 日付範囲内のセルを取得
-        for day in range(7):  # 月曜から日曜まで
-            target_date = monday + timedelta(days=day)
-            date_str = target_date.strftime('%Y-%m-%d')
-            
-            # その日付のセルを取得
-            cell_xpath = f"//td[.//a[contains(@href, '{date_str}')]]"
+    def request(self, cycles):
+        self.remaining = max(0, int(cycles))
+        if self.remaining:
+            logging.info(f"次の{self.remaining}周期をプロファイルします")
+
+    def wrap(self, task):
+        """
+        計測中の周期であれば task を別スレッド用のプロファイラで包んで返します。
+        周期のプロファイラが全スレッドを計測する場合（3.12以降）は task をそのまま返します。
+        """
+        if self.thread_profiles is None or not self.per_thread:
+            return task
+
+        def profiled_task():
+            profile = cProfile.Profile()
             try:
-                cell = driver.find_element(By.XPATH, cell_xpath)
-                
-                # 予約を取得（class="rest"で始まるp要素内のaタグ）
-                reservation_links = cell.find_elements(By.CSS_SELECTOR, 'p[class^="rest"] > a')
-                for a in reservation_links:
-                    text = a.get_attribute("innerText")
-                    outer_html = a.get_attribute("outerHTML")
-                    
-                    # 術検のみの場合はスキップ
-                    if "術検" in text and not any(k in text for k in ["包", "大", "長", "非長", "陰大"]):
-                        continue
-                        
-                    # EDのみの場合はスキップ
-                    if "ED" in text and not any(k in text for k in ["包", "大", "長", "非長", "陰大"]):
-                        continue
-                    
-                    # 実質大口のカウント
-                    if any(keyword in text for keyword in ["包", "大", "長", "非長", "陰大"]):
-                        total_oguchi += 1
-                    
-                    # 除外カウント（wifi）
-                    if "fa fa-wifi" in outer_html:
-                        exclude_count += 1
-                        
-            except NoSuchElementException:
-                continue
+                return profile.runcall(task)
+            finally:
+                with self.lock:
+                    if self.thread_profiles is not None:
+                        self.thread_profiles.append(profile)
+        return profiled_task
 
-    except Exception as e:
-        print(f"データ取得エラー (tomato): {e}")
+    @contextmanager
+    def cycle(self):
+        """
+        with ブロック（1周期）を計測します。要求がなければ何もしません。
+        """
+        if not self.remaining:
+            yield
+            return
+        profile = cProfile.Profile()
+        self.thread_profiles = []
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                thread_profiles, self.thread_profiles = self.thread_profiles, None
+            self.remaining -= 1
+            self._write(profile, thread_profiles)
+
+    def _write(self, profile, thread_profiles):
+        directory = os.path.join(get_app_dir(), CONFIG["profile_dir"])
+        try:
+            os.makedirs(directory, exist_ok=True)
+            stats = pstats.Stats(profile)
+            for thread_profile in thread_profiles:
+                stats.add(thread_profile)
+            path = os.path.join(directory, f"cycle_{datetime.now():%Y%m%d_%H%M%S_%f}.pstats")
+            stats.dump_stats(path)
+            logging.info(f"プロファイルを書き出しました: {path}（残り{self.remaining}周期）")
 
-    net_value = total_oguchi - exclude_count
-    return total_oguchi, exclude_count, net_value
+            # 古いものから削除して保存数を制限
+            files = sorted(f for f in os.listdir(directory) if f.startswith("cycle_") and f.endswith(".pstats"))
+            for name in files[:max(0, len(files) - CONFIG["profile_keep"])]:
+                os.remove(os.path.join(directory, name))
+        except OSError as e:
+            logging.error(f"プロファイルの書き出しでエラー発生: {e}")
 
-def get_oguchi_value_month(driver, page_url):
+def install_profile_signal(profiler):
     """
-    tomatoサイトの指定ページにアクセスし、
-      ① ページ全体から "[大]XX" のXX（大口件数）を取得
-      ② ページ内の<a>タグをすべて調べ、outerHTMLに "fa fa-wifi" または "大[残未計]" が含まれる場合は除外カウントを加算
-      ③ 大口件数から除外カウントを引いたネット値を返す
-    戻り値は (big_count, exclude_count, net_value) です。
+    シグナル（SIGUSR1、WindowsではCtrl+BreakのSIGBREAK）で次の profile_signal_cycles 周期を計測します。
     """
-    driver.get(page_url)
-    time.sleep(2)  # ページ読み込み待ち
-    page_source = driver.page_source
-    big_match = re.search(r"\[大\](\d+)", page_source)
-    if big_match:
-        big_count = int(big_match.group(1))
-    else:
-        big_count = 0
+    signal_number = getattr(signal, "SIGUSR1", None) or getattr(signal, "SIGBREAK", None)
+    if signal_number is None:
+        return
+    signal.signal(signal_number, lambda signum, frame: profiler.request(CONFIG["profile_signal_cycles"]))
 
-    exclude_count = 0
-    anchors = driver.find_elements(By.TAG_NAME, "a")
-    for a in anchors:
-        outer_html = a.get_attribute("outerHTML")
-        if ("fa fa-wifi" in outer_html) or ("大[残未計]" in outer_html):
-            exclude_count += 1
 
-    net_value = big_count - exclude_count
-    return big_count, exclude_count, net_value
+cycle_profiler = CycleProfiler()
 
-def read_target_values():
+# ページの読み込み完了を判定する要素
+APOLLO_TOTALS_ROW = (By.XPATH, "//tr[td[@class='total']]")
+APOLLO_CLINIC_CELLS = (By.CLASS_NAME, "clinic")
+TOMATO_DAY_LINKS = (By.CSS_SELECTOR, "td a[href]")
+
+def wait_for_page_ready(driver, locator=None, label="page", timeout=None, required=False):
     """
-    目標値をテキストファイルから読み取ります。
-    ファイルが存在しない場合はデフォルト値を使用します。
+    document.readyState が complete になり、locator の要素が現れるまで待機します。
+    固定時間のsleepの代わりに使い、実際に待った時間を weekgoal_stage_seconds（stage="wait"）に記録します。
+    タイムアウトした場合、required が False なら例外は出さずその時点のページで処理を続けます。
+    required が True（集計に使うページ）なら TimeoutException を送出し、
+    読み込み途中のページを取得成功として扱わないようにします。
     """
+    timeout = CONFIG["page_ready_timeout"] if timeout is None else timeout
+    started = time.monotonic()
+
+    def is_ready(d):
+        if d.execute_script("return document.readyState") != "complete":
+            return False
+        return locator is None or bool(d.find_elements(*locator))
+
+    timed_out = False
     try:
-        with open("week_target_values.txt", "r", encoding="utf-8") as file:
-            lines = file.readlines()
-            a_target = int(lines[0].strip())
-            k_target = int(lines[1].strip())
-            return a_target, k_target
-    except Exception as e:
-        print(f"目標値ファイルの読み込みエラー: {e}")
-        # デフォルト値を返す
-        return 0, 0
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(is_ready)
+    except TimeoutException:
+        logging.warning(f"ページ読み込み待ちがタイムアウトしました: {label}")
+        timed_out = True
+    elapsed = time.monotonic() - started
+    metrics.observe("weekgoal_stage_seconds", elapsed, stage="wait", site=label)
+    logging.debug(f"ページ読み込み待ち {label}: {elapsed:.2f}秒")
+    if timed_out and required:
+        raise TimeoutException(f"ページの読み込みが{timeout}秒以内に完了しませんでした: {label}")
+    return elapsed
 
-def read_month_target_values():
+def classify_reservation(text, is_wifi):
     """
-    月間目標値をテキストファイルから読み取ります。
-    ファイルが存在しない場合はデフォルト値を使用します。
+    予約1件を判定し、(実質大口カウント, 除外カウント) を返します。
+    is_wifi: 予約の outerHTML に "fa fa-wifi" が含まれるかどうか
+    術検のみ・EDのみの予約はどちらにも数えません。
     """
-    try:
-        with open("month_target_values.txt", "r", encoding="utf-8") as file:
-            lines = file.readlines()
-            a_target = int(lines[0].strip())
-            k_target = int(lines[1].strip())
-            return a_target, k_target
-    except Exception as e:
-        print(f"月間目標値ファイルの読み込みエラー: {e}")
-        # デフォルト値を返す
+    flags = reservation_flags(text, is_wifi)
+
+    # 術検のみ・EDのみの場合はスキップ
+    if flags & RES_SKIP:
         return 0, 0
 
-def create_html_content(a_total, k_total, is_week=True):
+    # 実質大口のカウント / 除外カウント（wifi）
+    return (1 if flags & RES_OGUCHI else 0), (1 if flags & RES_WIFI else 0)
+
+def parse_big_count(page_source):
     """
-    HTMLコンテンツを生成します。
-    is_week: Trueの場合はweek_result.html用、Falseの場合はmonth_result.html用
+    ページ全体から "[大]XX" のXX（大口件数）を取得します。見つからない場合は0です。
     """
-    # 目標値を読み取り（週間/月間で分ける）
-    if is_week:
-        a_target, k_target = read_target_values()
-    else:
-        a_target, k_target = read_month_target_values()
-    
-    ak_total = a_total + k_total
-    remainder_a = a_target - a_total
-    remainder_k = k_target - k_total
-    
-    # 現在の週番号または月を取得
-    current_date = datetime.now()
-    current_month = current_date.month
-    week_number = calculate_week_number()
-    
-    # 画像の相対パスを使用
-    achievement_img_path = "achievement.png"
+    big_match = re.search(r"\[大\](\d+)", page_source)
+    return int(big_match.group(1)) if big_match else 0
 
-    if remainder_a <= 0:
-        display_a = f'<span style="white-space: nowrap;">★{abs(remainder_a)}件<img src="{achievement_img_path}" style="width:8vh; height:8vh; vertical-align: middle;"></span>'
-    else:
-        display_a = f"{remainder_a}件"
-        
-    if remainder_k <= 0:
-        display_k = f'<span style="white-space: nowrap;">★{abs(remainder_k)}件<img src="{achievement_img_path}" style="width:8vh; height:8vh; vertical-align: middle;"></span>'
-    else:
-        display_k = f"{remainder_k}件"
-    
-    # 右下セクションの内容を条件分岐
-    if is_week:
-        target_section = f"""
-        <div style="height: 100%; display: flex; flex-direction: column; justify-content: center; padding: 1vh; box-sizing: border-box;">
-            <div style="text-align: center; margin: 0.5vh 0;">
-                <div style="font-size: 9vh; white-space: nowrap;">{a_target}件まで: <span class="important" style="font-size: 10vh;">{display_a}</span></div>
-            </div>
-            <div style="text-align: center; margin: 0.5vh 0;">
-                <div style="font-size: 9vh; white-space: nowrap;">{k_target}件まで: <span class="important" style="font-size: 10vh;">{display_k}</span></div>
-            </div>
-        </div>"""
-    else:
-        target_section = f"""
-        <div style="height: 100%; display: flex; flex-direction: column; justify-content: center; padding: 1vh; box-sizing: border-box;">
-            <div style="text-align: center; margin: 0.5vh 0;">
-                <div style="font-size: 9vh; white-space: nowrap;">{a_target}件まで: <span class="important" style="font-size: 10vh;">{display_a}</span></div>
-            </div>
-            <div style="text-align: center; margin: 0.5vh 0;">
-                <div style="font-size: 9vh; white-space: nowrap;">{k_target}件まで: <span class="important" style="font-size: 10vh;">{display_k}</span></div>
-            </div>
-        </div>"""
+# -------------------------------
+# ページスナップショット（1回の取得でページ全体を集計用データに変換）
+# -------------------------------
+# スナップショットの形式（Selenium・HTTPの両バックエンドで共通）:
+#   total_cells: 合計行の "total sticky" セルごとの span テキスト一覧
+#   clinics:     [クリニック名, span テキスト一覧] の一覧
+#   days:        {"YYYY-MM-DD": [[予約テキスト, wifiフラグ], ...]}
+#   anchors:     除外対象の<a>タグごとの [wifiフラグ, 大[残未計]フラグ]
+#   big_count:   ページ内で最初の "[大]XX" のXX
 
-    # タイムスタンプを追加（キャッシュ回避用）
-    timestamp = int(time.time())
-    
-    return f"""<html>
-<head>
-  <meta charset="UTF-8">
-  <meta http-equiv="refresh" content="60">
-  <meta http-equiv="Cache-Control" content="no-cache, no-store, must-revalidate">
-  <meta http-equiv="Pragma" content="no-cache">
-  <meta http-equiv="Expires" content="0">
-  <title>{'{}w目標！'.format(week_number) if is_week else '{}月目標！'.format(current_month)}</title>
-  <style>
-    html, body {{
-      margin: 0;
-      padding: 0;
-      width: 100vw;
-      height: 100vh;
-      font-family: 'Arial', sans-serif;
-      background: linear-gradient(to bottom right, #f8f9fa, #e9ecef);
-      display: flex;
-      flex-direction: column;
-      align-items: center;
-      justify-content: flex-start;
-      overflow: hidden;
-      box-sizing: border-box;
-    }}
-    h1 {{
-      font-size: 12vh;
-      margin: 1vh 0;
-      text-shadow: 2px 2px 4px #bdc3c7;
-      white-space: nowrap;
-    }}
-    .container {{
-      display: grid;
-      grid-template-columns: 1fr 1fr;
-      grid-template-rows: 1fr 1fr;
-      gap: 1vh;
-      width: 98%;
-      height: 80%;
-      margin-bottom: 1vh;
-      box-sizing: border-box;
-    }}
-    .section {{
-      display: flex;
-      flex-direction: column;
-      align-items: center;
-      justify-content: center;
-      border: 0.4vh solid #3498db;
-      border-radius: 2vh;
-      background-color: #ffffff;
-      box-shadow: 0 0.5vh 1vh rgba(0,0,0,0.1);
-      padding: 1vh;
-      box-sizing: border-box;
-      overflow: hidden;
-    }}
-    .section p {{
-      font-size: 10vh;
-      margin: 0.5vh 0;
-      text-align: center;
-      line-height: 1.2;
-      white-space: nowrap;
-    }}
-    .important {{
-      color: #e74c3c;
-      font-weight: bold;
-      font-size: 12vh;
-      white-space: nowrap;
-    }}
-    .small {{
-      padding: 0.5vh;
-    }}
-    img {{
-      width: 8vh;
-      height: 8vh;
-      margin-left: 0.5vh;
-      vertical-align: middle;
-    }}
-    .timestamp {{
-      display: none;
-    }}
-  </style>
-</head>
-<body>
-  <h1>{'{}w目標！'.format(week_number) if is_week else '{}月目標！'.format(current_month)}</h1>
-  <div class="container">
-    <div class="section">
-      <p>A残込　<span class="important">{a_total}</span> 件</p>
-    </div>
-    <div class="section">
-      <p>K残込　<span class="important">{k_total}</span> 件</p>
-    </div>
-    <div class="section">
-      <p>AK残込　<span class="important">{ak_total}</span> 件</p>
-    </div>
-    <div class="section small">
-      {target_section}
-    </div>
-  </div>
-  <div class="timestamp">{timestamp}</div>
-</body>
-</html>"""
+# ページ内で1回だけ実行し、スナップショットをJSONで返すスクリプト
+# テキストは textContent で読むため、HTTPバックエンド・監視モードと同じ値になります
+# （innerText はCSSによる表示・改行の影響を受けます）。
+BULK_EXTRACT_SCRIPT = r"""
+var spanTexts = function (el) {
+  return Array.prototype.map.call(el.getElementsByTagName('span'), function (s) { return s.textContent; });
+};
+var result = {total_cells: [], clinics: [], days: {}, anchors: [], big_count: 0};
 
-def auto_login_apollo(driver):
+var totalsRow = document.evaluate("//tr[td[@class='total']]", document, null,
+  XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (totalsRow) {
+  totalsRow.querySelectorAll('td').forEach(function (td) {
+    if (td.getAttribute('class') === 'total sticky') { result.total_cells.push(spanTexts(td)); }
+  });
+}
+
+Array.prototype.forEach.call(document.getElementsByClassName('clinic'), function (cell) {
+  var link = cell.getElementsByTagName('a')[0];
+  if (link) { result.clinics.push([link.textContent.trim(), spanTexts(cell)]); }
+});
+
+document.querySelectorAll('td').forEach(function (td) {
+  var dates = [];
+  td.querySelectorAll('a[href]').forEach(function (a) {
+    (a.getAttribute('href').match(/\d{4}-\d{2}-\d{2}/g) || []).forEach(function (d) {
+      if (!(d in result.days) && dates.indexOf(d) === -1) { dates.push(d); }
+    });
+  });
+  if (!dates.length) { return; }
+  var reservations = [];
+  td.querySelectorAll('p[class^="rest"] > a').forEach(function (a) {
+    reservations.push([a.textContent, a.outerHTML.indexOf('fa fa-wifi') !== -1]);
+  });
+  dates.forEach(function (d) { result.days[d] = reservations; });
+});
+
+Array.prototype.forEach.call(document.getElementsByTagName('a'), function (a) {
+  var outer = a.outerHTML;
+  var wifi = outer.indexOf('fa fa-wifi') !== -1;
+  var mikei = outer.indexOf('大[残未計]') !== -1;
+  if (wifi || mikei) { result.anchors.push([wifi, mikei]); }
+});
+
+var big = document.documentElement.outerHTML.match(/\[大\](\d+)/);
+result.big_count = big ? parseInt(big[1], 10) : 0;
+return result;
+"""
+
+def extract_page_snapshot(driver):
     """
-    Apolloサイトへの自動ログイン
+    表示中のページのスナップショットを execute_script 1回で取得します。
     """
-    try:
-        driver.get("https://apollo-scedure77.net/LOGIN/")
-        time.sleep(2)
+    return driver.execute_script(BULK_EXTRACT_SCRIPT)
 
-        # ログインフォーム要素の取得と入力
-        account_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.NAME, "account"))
-        )
-        pass_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.NAME, "pass"))
-        )
+def use_bulk_extraction():
+    """
+    Seleniumバックエンドでスナップショット一括取得を使うかどうかを返します。
+    """
+    return CONFIG["selenium_extraction"] == "bulk"
 
-        account_input.send_keys("imurayap33")
-        pass_input.send_keys("imimp0633")
+def first_jitsu_value(span_texts):
+    """
+    span テキストの中で最初に見つかった [実] の値を返します。見つからない場合は0です。
+    """
+    for text in span_texts:
+        match = re.search(r"\[実\](\d+)", text)
+        if match:
+            return int(match.group(1))
+    return 0
 
-        # ログインボタンをクリック
-        login_button = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'p.login > input[name="Submit"]'))
-        )
-        login_button.click()
-        time.sleep(5)
-        return True
-    except TimeoutException:
-        print("Apolloログインでエラーが発生しました。")
-        return False
+# -------------------------------
+# 予約の判定
+# -------------------------------
 
-def auto_login_tomato(driver):
+# 予約フラグ（ビット）
+RES_OGUCHI = 1  # 実質大口キーワードを含む
+RES_SKIP = 2  # 術検のみ・EDのみ（集計対象外）
+RES_WIFI = 4  # outerHTML に "fa fa-wifi" を含む
+
+def reservation_flags(text, is_wifi):
     """
-    Tomatoサイトへの自動ログイン
+    予約1件のテキストとwifi有無から、区分・除外のフラグを作成します。
     """
-    try:
-        driver.get("https://tomato-systemprograms1455.com/LOGIN/")
-        time.sleep(2)
+    flags = 0
+    if any(keyword in text for keyword in OGUCHI_KEYWORDS):
+        flags |= RES_OGUCHI
+    elif "術検" in text or "ED" in text:
+        flags |= RES_SKIP
+    if is_wifi:
+        flags |= RES_WIFI
+    return flags
 
-        # ログインフォーム要素の取得と入力
-        account_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.NAME, "account"))
-        )
-        pass_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.NAME, "pass"))
-        )
+# -------------------------------
+# 日別キャッシュ（変化した日だけを再集計）
+# -------------------------------
+
+class DayCountCache:
+    """
+    (取得元, クリニック, 日付) ごとに、集計値と内容のハッシュを保持します。
+    ページを再取得しても、内容が変わった日だけを再集計し、変化した日を記録します。
+    内容のハッシュは blake2b のため、プロセスをまたいでも同じ値になります。
+    1回の更新は begin で始め、update しなかった集計値（ページから消えたセル・日、
+    週・月が替わって取得計画の対象外になった日）は drop_unseen で捨てます。
+    """
 
-        account_input.send_keys("imurayap33")
-        pass_input.send_keys("imimp0633")
+    def __init__(self):
+        self.entries = {}  # (取得元, クリニック, 日付または "YYYY-MM") -> (ハッシュ, 集計値)
+        self.last_changes = []  # 直近の更新で変化した [(キー, 旧集計値, 新集計値)]（捨てた場合の新集計値は None）
+        self.seen = set()  # 今回の更新で update したキー
+        self.last_clinic_results = {}  # 直近の更新のクリニック別結果
+        self.last_plan = None  # 直近の更新の取得計画
 
-        # ログインボタンをクリック
-        login_button = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'p.login > input[type="image"]'))
-        )
-        login_button.click()
-        time.sleep(5)
+    def begin(self):
+        """
+        1回分の更新を始めます。
+        """
+        self.last_changes = []
+        self.seen = set()
+
+    def update(self, source, clinic, date_str, content, compute):
+        """
+        content（文字列・数値・真偽値からなるタプル）が前回と異なる場合のみ compute(content) で再集計します。
+        変化した場合は True を返します。
+        """
+        key = (source, clinic, date_str)
+        self.seen.add(key)
+        digest = hashlib.blake2b(repr(content).encode("utf-8"), digest_size=16).digest()
+        cached = self.entries.get(key)
+        if cached is not None and cached[0] == digest:
+            return False
+        old_counts = cached[1] if cached is not None else None
+        new_counts = compute(content)
+        self.entries[key] = (digest, new_counts)
+        if old_counts == new_counts:
+            return False
+        self.last_changes.append((key, old_counts, new_counts))
         return True
-    except TimeoutException:
-        print("Tomatoログインでエラーが発生しました。")
-        return False
 
-def create_headless_options():
+    def drop_unseen(self):
+        """
+        begin の後に update しなかった集計値を捨て、変化として記録します。
+        """
+        for key in [key for key in self.entries if key not in self.seen]:
+            self.last_changes.append((key, self.entries.pop(key)[1], None))
+
+    def get(self, source, clinic, date_str, default=(0,)):
+        """
+        集計値を返します。begin の後に update していない値（drop_unseen で捨てる値）は default です。
+        """
+        key = (source, clinic, date_str)
+        if key not in self.seen:
+            return default
+        return self.entries[key][1]
+
+    def sum_days(self, source, clinic, date_strs, width=1):
+        """
+        指定した日の集計値を合計します。
+        """
+        totals = [0] * width
+        for date_str in date_strs:
+            for i, value in enumerate(self.get(source, clinic, date_str, (0,) * width)):
+                totals[i] += value
+        return tuple(totals)
+
+
+def count_day_reservations(reservations):
     """
-    ヘッドレスモード用のChromeオプションを作成
+    1日分の予約 ((テキスト, wifi), ...) から (total_oguchi, exclude_count) を数えます。
+    """
+    total_oguchi = exclude_count = 0
+    for text, is_wifi in reservations:
+        oguchi, exclude = classify_reservation(text, is_wifi)
+        total_oguchi += oguchi
+        exclude_count += exclude
+    return total_oguchi, exclude_count
+
+def count_month_oguchi(content):
+    """
+    tomato月間ページの (大口件数, 除外<a>タグの (wifi, 大[残未計]) 一覧) から (net_value,) を数えます。
+    """
+    big_count, anchors = content
+    return (big_count - sum(1 for is_wifi, is_mikei in anchors if is_wifi or is_mikei),)
+
+def week_date_strs(plan):
+    """
+    計画の週の7日を "YYYY-MM-DD" で返します。
+    """
+    return [(plan["monday"] + timedelta(days=day)).strftime('%Y-%m-%d') for day in range(7)]
+
+# 更新ループ（aggregate_cycle_incremental）とバックフィル（aggregate_period）は、
+# どちらも以下の関数で DayCountCache を更新してから合計します。
+# 各関数はその集計に必要な部分だけをスナップショットから読みます（月間の集計は予約を走査しません）。
+
+def update_apollo_week(cache, plan, snapshots):
+    """
+    週間のapolloページの合計行を日ごとに cache へ反映し、週間A残込を返します。
+    合計行が7セル（月曜日から日曜日）でない場合は ValueError を送出します。
+    """
+    week_dates = week_date_strs(plan)
+    # 合計行のセルは月曜日から順に並ぶ
+    total_cells = snapshots[plan["apollo_week"]]["total_cells"]
+    if len(total_cells) != len(week_dates):
+        raise ValueError(
+            f"週間ページの合計行のセルが{len(total_cells)}個です（月曜日から日曜日の{len(week_dates)}個を想定）"
+        )
+    for date_str, spans in zip(week_dates, total_cells):
+        cache.update("apollo_week", None, date_str, tuple(spans), lambda c: (first_jitsu_value(c),))
+    return cache.sum_days("apollo_week", None, week_dates)[0]
+
+def update_apollo_month(cache, plan, snapshots):
+    """
+    月間のapolloページの登録済みクリニックの [実] を cache へ反映し、{院名: 値} を返します。
+    """
+    month_str = plan["month"]
+    for name, spans in snapshots[plan["apollo_month"]]["clinics"]:
+        if name in TARGET_CLINICS:
+            cache.update("apollo_month", name, month_str, tuple(spans), lambda c: (first_jitsu_value(c),))
+    return {name: cache.get("apollo_month", name, month_str)[0] for name in TARGET_CLINICS}
+
+def update_tomato_days(cache, plan, snapshots, dates=None):
+    """
+    tomatoページの各日の予約を cache へ反映し、{クリニックID: 週間の net_value} を返します。
+    各日はその日を含む月のページだけを正とします。dates を指定した場合はその日だけを読みます。
+    """
+    for url, (clinic_id, page_month) in plan["tomato_pages"].items():
+        for date_str, reservations in snapshots[url]["days"].items():
+            if date_str.startswith(page_month) and (dates is None or date_str in dates):
+                content = tuple((text, bool(is_wifi)) for text, is_wifi in reservations)
+                cache.update("tomato", clinic_id, date_str, content, count_day_reservations)
+    week_dates = week_date_strs(plan)
+    results = {}
+    for clinic_id in plan["tomato_week"]:
+        oguchi, exclude = cache.sum_days("tomato", clinic_id, week_dates, width=2)
+        results[clinic_id] = oguchi - exclude
+    return results
+
+def update_tomato_month(cache, plan, snapshots):
+    """
+    tomato月間ページの大口件数と除外<a>タグ数（ページ単位）を cache へ反映し、{クリニックID: net_value} を返します。
+    """
+    month_str = plan["month"]
+    for clinic_id, url in plan["tomato_month"].items():
+        snapshot = snapshots[url]
+        content = (snapshot["big_count"], tuple(map(tuple, snapshot["anchors"])))
+        cache.update("tomato_month", clinic_id, month_str, content, count_month_oguchi)
+    return {clinic_id: cache.get("tomato_month", clinic_id, month_str)[0] for clinic_id in plan["tomato_month"]}
+
+
+def sum_by_group(site_values, site_totals=None):
+    """
+    クリニック別の値 {サイト: {クリニックID: 値}} をクリニックの集計区分（group）ごとに合計し、
+    {"A": 合計, "K": 合計} を返します。
+    site_totals {サイト: 値} はクリニックに分けられないサイト全体の値で、サイトの既定の区分に数えます。
+    """
+    totals = dict.fromkeys(SITE_GROUPS.values(), 0)
+    for site, value in (site_totals or {}).items():
+        totals[SITE_GROUPS[site]] += value
+    for site, values in site_values.items():
+        for clinic_id, value in values.items():
+            totals[CLINIC_REGISTRY[site][clinic_id]["group"]] += value
+    return totals
+
+
+def aggregate_cycle_incremental(plan, snapshots, cache):
+    """
+    取得済みスナップショットで cache を更新し、変化した日だけを再集計して合計を返します。
+    戻り値は (week_a_total, month_a_total, week_k_total, month_k_total) です。
+    変化した日は cache.last_changes に記録されます。
+    今回のスナップショットにない日・クリニックの集計値は捨てます（前回の値を引き継ぎません）。
+    週間のapolloページの合計行が7セル（月曜日から日曜日）でない場合は ValueError を送出します。
+    """
+    cache.begin()
+    apollo_week = update_apollo_week(cache, plan, snapshots)
+    apollo_results = update_apollo_month(cache, plan, snapshots)
+    # 日別の値は時系列の記録にも使うため、ページの月のすべての日を読む
+    tomato_week = update_tomato_days(cache, plan, snapshots)
+    tomato_month = update_tomato_month(cache, plan, snapshots)
+    cache.drop_unseen()
+
+    tomato_results = {
+        clinic_id: {"week": tomato_week[clinic_id], "month": tomato_month[clinic_id]}
+        for clinic_id in plan["tomato_month"]
+    }
+
+    # クリニック別の結果を集計区分ごとの合計に反映
+    week_totals = sum_by_group({"tomato": tomato_week}, {"apollo": apollo_week})
+    month_totals = sum_by_group({"apollo": apollo_results, "tomato": tomato_month})
+    week_a_total, week_k_total = week_totals["A"], week_totals["K"]
+    month_a_total, month_k_total = month_totals["A"], month_totals["K"]
+    cache.last_clinic_results = {"apollo": apollo_results, "tomato": tomato_results}
+    cache.last_plan = plan
+
+    if cache.last_changes:
+        logging.debug(f"変化した日: {[key for key, _, _ in cache.last_changes]}")
+    metrics.set("weekgoal_changed_days", len(cache.last_changes))
+    metrics.set("weekgoal_reservations", sum(
+        len(reservations) for url in plan["tomato_pages"] for reservations in snapshots[url]["days"].values()
+    ))
+    for period, group, value in (
+        ("week", "A", week_a_total), ("month", "A", month_a_total),
+        ("week", "K", week_k_total), ("month", "K", month_k_total),
+    ):
+        metrics.set("weekgoal_total", value, period=period, group=group)
+    return week_a_total, month_a_total, week_k_total, month_k_total
+
+
+# 更新ループで共有する日別キャッシュ
+day_count_cache = DayCountCache()
+
+# -------------------------------
+# HTTP抽出バックエンド（ブラウザ不使用）
+# -------------------------------
+
+# 終了タグを持たない要素
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr"
+}
+# タグが開かれたときに暗黙に閉じる要素（閉じタグ省略への対応）
+# 開いている要素のうち該当するもっとも外側まで閉じます（<tr> は開いている td/th とその行を閉じる）
+IMPLICIT_CLOSE = {
+    "p": {"p"},
+    "li": {"li"},
+    "option": {"option"},
+    "td": {"td", "th"},
+    "th": {"td", "th"},
+    "tr": {"tr", "td", "th"},
+}
+# 暗黙の閉じ処理を打ち切る要素
+IMPLICIT_CLOSE_BOUNDARY = {"table", "tbody", "thead", "tfoot", "ul", "ol", "select", "div"}
+
+
+class HtmlNode:
+    """
+    HTMLParserで構築する軽量なDOMノードです。
+    children には子要素（HtmlNode）とテキスト（str）が順番に入ります。
+    """
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children = []
+        self.parent = parent
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def has_class(self, class_name):
+        return class_name in (self.attrs.get("class") or "").split()
+
+    def iter(self, tag=None):
+        """
+        子孫要素を文書順に返します（自分自身は含みません）。
+        """
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                continue
+            if tag is None or node.tag == tag:
+                yield node
+            stack.extend(reversed(node.children))
+
+    def find(self, tag):
+        return next(self.iter(tag), None)
+
+    def element_children(self):
+        return [child for child in self.children if not isinstance(child, str)]
+
+    def text_content(self):
+        parts = []
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return "".join(parts)
+
+    def outer_html(self):
+        """
+        ブラウザの outerHTML と同じ形式で要素を直列化します。
+        """
+        parts = []
+        self._serialize(parts)
+        return "".join(parts)
+
+    def _serialize(self, parts):
+        attrs = "".join(
+            f' {name}="{html.escape(value or "", quote=True)}"' for name, value in self.attrs.items()
+        )
+        parts.append(f"<{self.tag}{attrs}>")
+        if self.tag in VOID_ELEMENTS:
+            return
+        for child in self.children:
+            if isinstance(child, str):
+                parts.append(html.escape(child, quote=False))
+            else:
+                child._serialize(parts)
+        parts.append(f"</{self.tag}>")
+
+
+class _TreeBuilder(HTMLParser):
+    """
+    HTMLテキストから HtmlNode のツリーを構築します。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = HtmlNode("#document")
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        closes = IMPLICIT_CLOSE.get(tag)
+        if closes:
+            closed = None
+            node = self.current
+            while node is not self.root and node.tag not in IMPLICIT_CLOSE_BOUNDARY:
+                if node.tag in closes:
+                    closed = node
+                node = node.parent
+            if closed is not None:
+                self.current = closed.parent
+        node = HtmlNode(tag, dict(attrs), self.current)
+        self.current.children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(HtmlNode(tag, dict(attrs), self.current))
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root:
+            if node.tag == tag:
+                self.current = node.parent
+                return
+            node = node.parent
+        # 対応する開始タグがない閉じタグは無視
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(page_source):
+    """
+    HTMLテキストを解析し、ルートの HtmlNode を返します。
+    """
+    builder = _TreeBuilder()
+    builder.feed(page_source)
+    builder.close()
+    return builder.root
+
+
+def build_page_snapshot(doc, page_source):
+    """
+    解析済みDOMから、BULK_EXTRACT_SCRIPT と同じ形式のスナップショットを作成します。
+    """
+    snapshot = {"total_cells": [], "clinics": [], "days": {}, "anchors": [], "big_count": 0}
+    span_texts = lambda el: [span.text_content() for span in el.iter("span")]
+
+    for row in doc.iter("tr"):
+        if any(td.tag == "td" and td.get("class") == "total" for td in row.element_children()):
+            snapshot["total_cells"] = [
+                span_texts(td) for td in row.iter("td") if td.get("class") == "total sticky"
+            ]
+            break
+
+    for node in doc.iter():
+        if node.has_class("clinic"):
+            link = node.find("a")
+            if link is not None:
+                snapshot["clinics"].append([link.text_content().strip(), span_texts(node)])
+
+    days = snapshot["days"]
+    for td in doc.iter("td"):
+        dates = []
+        for a in td.iter("a"):
+            for date_str in re.findall(r"\d{4}-\d{2}-\d{2}", a.get("href") or ""):
+                if date_str not in days and date_str not in dates:
+                    dates.append(date_str)
+        if not dates:
+            continue
+        reservations = [
+            [a.text_content(), "fa fa-wifi" in a.outer_html()]
+            for p in td.iter("p") if (p.get("class") or "").startswith("rest")
+            for a in p.element_children() if a.tag == "a"
+        ]
+        for date_str in dates:
+            days[date_str] = reservations
+
+    for a in doc.iter("a"):
+        outer_html = a.outer_html()
+        is_wifi = "fa fa-wifi" in outer_html
+        is_mikei = "大[残未計]" in outer_html
+        if is_wifi or is_mikei:
+            snapshot["anchors"].append([is_wifi, is_mikei])
+
+    snapshot["big_count"] = parse_big_count(page_source)
+    return snapshot
+
+def create_http_session():
+    """
+    Keep-Aliveで接続を再利用するHTTPセッションを作成します。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": "Mozilla/5.0 (weekgoal)"})
+    return session
+
+
+def http_login(session, site, login_url, submit_selector):
+    """
+    ログインフォームを取得し、ブラウザと同じ内容でPOSTします。
+    submit_selector は "name" または "image"（送信ボタンの種類）です。
+    """
+    timeout = CONFIG["http_timeout"]
+    response = session.get(login_url, timeout=timeout)
+    response.raise_for_status()
+    doc = parse_html(response.text)
+
+    form = next(
+        (f for f in doc.iter("form") if any(i.get("name") == "account" for i in f.iter("input"))),
+        None
+    )
+    if form is None:
+        return False
+
+    data = {}
+    for field in form.iter("input"):
+        name = field.get("name")
+        field_type = (field.get("type") or "text").lower()
+        if not name or field_type in ("submit", "image", "button", "checkbox", "radio"):
+            continue
+        data[name] = field.get("value") or ""
+    data["account"], data["pass"] = get_credentials(site)
+
+    # 送信ボタンの値もブラウザと同様に付与
+    for field in form.iter("input"):
+        field_type = (field.get("type") or "").lower()
+        if submit_selector == "name" and field.get("name") == "Submit":
+            data["Submit"] = field.get("value") or ""
+            break
+        if submit_selector == "image" and field_type == "image":
+            prefix = f"{field.get('name')}." if field.get("name") else ""
+            data[f"{prefix}x"] = "1"
+            data[f"{prefix}y"] = "1"
+            break
+
+    action_url = urljoin(response.url, form.get("action") or response.url)
+    method = (form.get("method") or "post").lower()
+    if method == "get":
+        result = session.get(action_url, params=data, timeout=timeout)
+    else:
+        result = session.post(action_url, data=data, timeout=timeout)
+    result.raise_for_status()
+    # ログインフォームが再表示されていなければ成功
+    return 'name="pass"' not in result.text
+
+
+def is_login_page(url, page_source):
+    """
+    ログイン画面に戻されたかどうかを判定します。
+    """
+    return "/LOGIN/" in url or 'name="pass"' in page_source
+
+
+def auto_login_apollo_http(session):
+    """
+    ApolloサイトへのHTTPログイン
+    """
+    try:
+        return http_login(session, "apollo", f"{APOLLO_BASE_URL}/LOGIN/", "name")
+    except requests.RequestException as e:
+        print(f"Apolloログインでエラーが発生しました: {e}")
+        return False
+
+
+def auto_login_tomato_http(session):
+    """
+    TomatoサイトへのHTTPログイン
+    """
+    try:
+        return http_login(session, "tomato", f"{TOMATO_BASE_URL}/LOGIN/", "image")
+    except requests.RequestException as e:
+        print(f"Tomatoログインでエラーが発生しました: {e}")
+        return False
+
+
+def fetch_page_http(session, page_url):
+    """
+    ページを取得し、スナップショットを返します。
+    ログイン画面に戻された場合は SessionExpiredError を送出します。
+    """
+    site = "apollo" if page_url.startswith(APOLLO_BASE_URL) else "tomato"
+    with timed_stage("fetch", site=site):
+        response = session.get(page_url, timeout=CONFIG["http_timeout"])
+        response.raise_for_status()
+    if is_login_page(response.url, response.text):
+        raise SessionExpiredError(page_url)
+    with timed_stage("extract", site=site):
+        snapshot = build_page_snapshot(parse_html(response.text), response.text)
+    metrics.inc("weekgoal_pages_total", site=site)
+    metrics.set("weekgoal_last_success_timestamp_seconds", time.time(), source=site)
+    return snapshot
+
+
+# 目標値ファイルの読み込み結果（ファイル名 -> (更新時刻, 目標値)）
+target_value_cache = {}
+
+def read_target_file(filename, error_message):
+    """
+    目標値ファイル（1行目: A目標, 2行目: K目標）を読み取ります。
+    前回読み込んだときから更新時刻が変わっていなければ、ファイルを開かずに前回の値を返します。
+    """
+    try:
+        mtime = os.stat(filename).st_mtime_ns
+        cached = target_value_cache.get(filename)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(filename, "r", encoding="utf-8") as file:
+            lines = file.readlines()
+            a_target = int(lines[0].strip())
+            k_target = int(lines[1].strip())
+        target_value_cache[filename] = (mtime, (a_target, k_target))
+        return a_target, k_target
+    except Exception as e:
+        print(f"{error_message}: {e}")
+        # デフォルト値を返す
+        return 0, 0
+
+def read_target_values():
+    """
+    目標値をテキストファイルから読み取ります。
+    ファイルが存在しない場合はデフォルト値を使用します。
+    """
+    return read_target_file("week_target_values.txt", "目標値ファイルの読み込みエラー")
+
+def read_month_target_values():
+    """
+    月間目標値をテキストファイルから読み取ります。
+    ファイルが存在しない場合はデフォルト値を使用します。
+    """
+    return read_target_file("month_target_values.txt", "月間目標値ファイルの読み込みエラー")
+
+def write_text_atomic(filename, content, mode=None):
+    """
+    同じディレクトリの一時ファイルに書き出してから置き換えます。
+    表示側が書きかけのファイルを読み込むことはありません。
+    パーミッションは mode を指定した場合はその値、省略時は既存のファイルに合わせます（新規の場合は 0o644）。
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(content)
+        # mkstemp の一時ファイルは 0o600 のため、そのまま置き換えると他のユーザーから読めなくなる
+        if mode is None:
+            try:
+                mode = os.stat(filename).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o644
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, filename)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def compile_template(template, **constants):
+    """
+    str.format 形式のテンプレートを、(固定文字列, 差し込み名) の並びに一度だけ分解します。
+    constants で指定した差し込みは固定文字列に埋め込みます。
+    """
+    compiled = []
+    literal = ""
+    for text, field, _, _ in string.Formatter().parse(template):
+        literal += text
+        if field is None:
+            continue
+        if field in constants:
+            literal += str(constants[field])
+            continue
+        compiled.append((literal, field))
+        literal = ""
+    compiled.append((literal, None))
+    return compiled
+
+def render_template(compiled, values):
+    """
+    compile_template で分解したテンプレートに値を差し込みます。
+    """
+    return "".join(
+        literal if field is None else literal + str(values[field]) for literal, field in compiled
+    )
+
+# 結果ページ共通のスタイル
+RESULT_PAGE_CSS = """    html, body {
+      margin: 0;
+      padding: 0;
+      width: 100vw;
+      height: 100vh;
+      font-family: 'Arial', sans-serif;
+      background: linear-gradient(to bottom right, #f8f9fa, #e9ecef);
+      display: flex;
+      flex-direction: column;
+      align-items: center;
+      justify-content: flex-start;
+      overflow: hidden;
+      box-sizing: border-box;
+    }
+    h1 {
+      font-size: 12vh;
+      margin: 1vh 0;
+      text-shadow: 2px 2px 4px #bdc3c7;
+      white-space: nowrap;
+    }
+    .container {
+      display: grid;
+      grid-template-columns: 1fr 1fr;
+      grid-template-rows: 1fr 1fr;
+      gap: 1vh;
+      width: 98%;
+      height: 80%;
+      margin-bottom: 1vh;
+      box-sizing: border-box;
+    }
+    .section {
+      display: flex;
+      flex-direction: column;
+      align-items: center;
+      justify-content: center;
+      border: 0.4vh solid #3498db;
+      border-radius: 2vh;
+      background-color: #ffffff;
+      box-shadow: 0 0.5vh 1vh rgba(0,0,0,0.1);
+      padding: 1vh;
+      box-sizing: border-box;
+      overflow: hidden;
+    }
+    .section p {
+      font-size: 10vh;
+      margin: 0.5vh 0;
+      text-align: center;
+      line-height: 1.2;
+      white-space: nowrap;
+    }
+    .important {
+      color: #e74c3c;
+      font-weight: bold;
+      font-size: 12vh;
+      white-space: nowrap;
+    }
+    .small {
+      padding: 0.5vh;
+    }
+    img {
+      width: 8vh;
+      height: 8vh;
+      margin-left: 0.5vh;
+      vertical-align: middle;
+    }
+    .timestamp {
+      display: none;
+    }
+    .section.stale {
+      border-color: #95a5a6;
+      border-style: dashed;
+    }
+    .section.stale .important {
+      color: #7f8c8d;
+    }
+    .stale-badge {
+      font-size: 3.5vh;
+      color: #7f8c8d;
+      white-space: nowrap;
+    }
+"""
+
+# 達成時の表示（残り件数が0以下）
+ACHIEVEMENT_TEMPLATE = compile_template(
+    '<span style="white-space: nowrap;">★{count}件<img src="{img}" style="width:8vh; height:8vh; vertical-align: middle;"></span>',
+    img="achievement.png"  # 画像の相対パスを使用
+)
+
+# 右下セクション（目標までの残り件数）
+TARGET_SECTION_TEMPLATE = compile_template("""
+        <div style="height: 100%; display: flex; flex-direction: column; justify-content: center; padding: 1vh; box-sizing: border-box;">
+            <div style="text-align: center; margin: 0.5vh 0;">
+                <div style="font-size: 9vh; white-space: nowrap;">{a_target}件まで: <span class="important" style="font-size: 10vh;">{display_a}</span></div>
+            </div>
+            <div style="text-align: center; margin: 0.5vh 0;">
+                <div style="font-size: 9vh; white-space: nowrap;">{k_target}件まで: <span class="important" style="font-size: 10vh;">{display_k}</span></div>
+            </div>
+        </div>""")
+
+# 表示用ブラウザが操作しているタブ（URLに ?managed を付けて開く）はドライバが再読み込みするため、
+# ページ内の確認は行わない
+DISPLAY_MANAGED_QUERY = "managed"
+
+# 古い区画の注記（"N分前の値"）の経過時間はページ内で更新し、毎分HTMLを書き出し直さない
+# 表示用ブラウザが操作していないタブの更新:
+# 60秒ごとに同じファイルを非表示のiframeで読み込み、表示内容のハッシュが変わっていた場合だけ再読み込みする
+# （file:// のページからは他のファイルを読めないため、iframe側のページが postMessage でハッシュを返す）
+RESULT_PAGE_SCRIPT = """    (function () {
+      var state = document.querySelector('meta[name="weekgoal-state"]').content;
+      if (window.parent !== window) {
+        window.parent.postMessage({weekgoalState: state}, "*");
+        return;
+      }
+      setInterval(function () {
+        Array.prototype.forEach.call(document.querySelectorAll(".stale-badge[data-since]"), function (badge) {
+          var since = badge.getAttribute("data-since");
+          if (!since || !isFinite(Number(since))) { return; }
+          var seconds = Date.now() / 1000 - Number(since);
+          badge.textContent = Math.max(1, Math.floor(seconds / 60)) + "分前の値";
+        });
+      }, 30000);
+      if (/[?&]__MANAGED__(&|=|$)/.test(location.search)) { return; }
+      window.addEventListener("message", function (event) {
+        if (event.data && event.data.weekgoalState && event.data.weekgoalState !== state) {
+          location.reload();
+        }
+      });
+      setInterval(function () {
+        var probe = document.getElementById("weekgoal-probe");
+        if (probe) { probe.remove(); }
+        probe = document.createElement("iframe");
+        probe.id = "weekgoal-probe";
+        probe.style.display = "none";
+        probe.src = location.href.split("?")[0] + "?probe=" + Date.now();
+        document.body.appendChild(probe);
+      }, 60000);
+    })();
+""".replace("__MANAGED__", DISPLAY_MANAGED_QUERY)
+
+# 結果ページ全体（スタイル・スクリプトは固定文字列として埋め込み済み）
+RESULT_PAGE_TEMPLATE = compile_template("""<html>
+<head>
+  <meta charset="UTF-8">
+  <meta name="weekgoal-state" content="{state}">
+  <meta http-equiv="Cache-Control" content="no-cache, no-store, must-revalidate">
+  <meta http-equiv="Pragma" content="no-cache">
+  <meta http-equiv="Expires" content="0">
+  <title>{title}</title>
+  <style>
+{css}  </style>
+</head>
+<body>
+  <h1>{title}</h1>
+  <div class="container">
+    <div class="section{a_class}">
+      <p>A残込　<span class="important">{a_total}</span> 件</p>{a_badge}
+    </div>
+    <div class="section{k_class}">
+      <p>K残込　<span class="important">{k_total}</span> 件</p>{k_badge}
+    </div>
+    <div class="section{ak_class}">
+      <p>AK残込　<span class="important">{ak_total}</span> 件</p>{ak_badge}
+    </div>
+    <div class="section small{target_class}">
+      {target_section}{target_badge}
+    </div>
+  </div>
+  <div class="timestamp">{timestamp}</div>
+  <script>
+{script}  </script>
+</body>
+</html>""", css=RESULT_PAGE_CSS, script=RESULT_PAGE_SCRIPT)
+
+# 古い値で表示している区画の注記（data-since: 最後に取得できた時刻。ページ内で経過時間を更新する）
+STALE_BADGE_TEMPLATE = compile_template('<div class="stale-badge" data-since="{since}">{label}</div>')
+# 一度も取得できていない区画の注記（経過時間がないため data-since を付けない）
+UNFETCHED_BADGE = '<div class="stale-badge">未取得</div>'
+
+def stale_tiles(staleness):
+    """
+    区画（A・K・AK・目標までの残り）ごとの注記（例: "3分前の値"、最新なら空文字）を返します。
+    staleness は {"a": 経過秒数または None, "k": ...}（SourceCache.tile_staleness の1期間分）です。
+    AK と目標までの残りは、A・Kの古いほうに合わせます。
+    """
+    staleness = staleness or {}
+    a_age, k_age = staleness.get("a"), staleness.get("k")
+    both = [age for age in (a_age, k_age) if age is not None]
+    combined = max(both) if both else None
+    badge = lambda age: "" if age is None else "未取得" if age == float("inf") else f"{format_staleness(age)}の値"
+    return {"a": badge(a_age), "k": badge(k_age), "ak": badge(combined), "target": badge(combined)}
+
+def stale_tile_marks(staleness, now):
+    """
+    区画ごとの古さを、None（最新）・"未取得"・最後に取得できた時刻（UNIX時間の整数）で返します。
+    staleness は stale_tiles と同じく経過秒数で、now はそれを計算したときの時刻です。
+    結果ページの表示内容の比較にはこれを使い、毎分変わる経過時間の文字列は含めません。
+    """
+    staleness = staleness or {}
+    a_age, k_age = staleness.get("a"), staleness.get("k")
+    both = [age for age in (a_age, k_age) if age is not None]
+    combined = max(both) if both else None
+    mark = lambda age: None if age is None else "未取得" if age == float("inf") else round(now - age)
+    return {"a": mark(a_age), "k": mark(k_age), "ak": mark(combined), "target": mark(combined)}
+
+def format_remainder(remainder):
+    """
+    目標までの残り件数を表示用に整形します。達成済みの場合は★と画像を付けます。
+    """
+    if remainder <= 0:
+        return render_template(ACHIEVEMENT_TEMPLATE, {"count": abs(remainder)})
+    return f"{remainder}件"
+
+def create_html_content(a_total, k_total, is_week=True, staleness=None, now=None):
+    """
+    HTMLコンテンツを生成します。
+    is_week: Trueの場合はweek_result.html用、Falseの場合はmonth_result.html用
+    staleness: 区画ごとの経過秒数（stale_tiles を参照）。古い区画は枠を点線にして経過時間を添えます
+    now: staleness を計算した時刻（省略時は現在時刻）
+    """
+    now = time.time() if now is None else now
+    # 目標値を読み取り（週間/月間で分ける。ファイルが更新されたときだけ再読み込み）
+    if is_week:
+        a_target, k_target = read_target_values()
+    else:
+        a_target, k_target = read_month_target_values()
+
+    target_section = render_template(TARGET_SECTION_TEMPLATE, {
+        "a_target": a_target,
+        "k_target": k_target,
+        "display_a": format_remainder(a_target - a_total),
+        "display_k": format_remainder(k_target - k_total),
+    })
+
+    # 現在の週番号または月を取得
+    if is_week:
+        title = f"{calculate_week_number()}w目標！"
+    else:
+        title = f"{datetime.now().month}月目標！"
+
+    values = {
+        "title": title,
+        "a_total": a_total,
+        "k_total": k_total,
+        "ak_total": a_total + k_total,
+        "target_section": target_section,
+        # タイムスタンプを追加（キャッシュ回避用）
+        "timestamp": int(time.time()),
+    }
+    marks = stale_tile_marks(staleness, now)
+    for tile, mark in marks.items():
+        values[f"{tile}_class"] = "" if mark is None else " stale"
+        if mark is None:
+            values[f"{tile}_badge"] = ""
+        elif mark == "未取得":
+            values[f"{tile}_badge"] = UNFETCHED_BADGE
+        else:
+            values[f"{tile}_badge"] = render_template(STALE_BADGE_TEMPLATE, {
+                "since": mark, "label": f"{format_staleness(now - mark)}の値",
+            })
+    # 表示内容のハッシュ（タイムスタンプと経過時間の文字列を除く）。開いているタブはこれが変わったときだけ再読み込みする
+    hashed = [(key, value) for key, value in values.items() if key != "timestamp" and not key.endswith("_badge")]
+    values["state"] = hashlib.sha1(
+        repr(sorted(hashed) + sorted(marks.items(), key=lambda item: item[0])).encode("utf-8")
+    ).hexdigest()[:16]
+    return render_template(RESULT_PAGE_TEMPLATE, values)
+
+# 直近に書き出した表示内容（ファイル名 -> get_render_state の戻り値）
+last_rendered_state = {}
+
+def get_render_state(a_total, k_total, is_week=True, staleness=None, now=None):
+    """
+    HTMLの表示内容を決める値（実績・目標・見出し・古い区画とその取得時刻）をまとめて返します。
+    経過時間の文字列はページ内で更新するため含めません。
+    """
+    a_target, k_target = read_target_values() if is_week else read_month_target_values()
+    label = calculate_week_number() if is_week else datetime.now().month
+    stale = tuple(stale_tile_marks(staleness, time.time() if now is None else now).values())
+    return a_total, k_total, a_target, k_target, is_week, label, stale
+
+def write_result_html(filename, a_total, k_total, is_week=True, staleness=None, now=None):
+    """
+    表示内容が前回書き出したときから変わっている場合だけHTMLファイルを書き出します。
+    now は staleness を計算した時刻です（SourceCache.tile_staleness に渡したものと同じ値）。
+    書き出した場合は True、変化がなく省略した場合は False を返します。
+    """
+    now = time.time() if now is None else now
+    state = get_render_state(a_total, k_total, is_week, staleness, now)
+    if last_rendered_state.get(filename) == state and os.path.exists(filename):
+        return False
+    write_text_atomic(filename, create_html_content(a_total, k_total, is_week=is_week, staleness=staleness, now=now))
+    last_rendered_state[filename] = state
+    return True
+
+# -------------------------------
+# 時系列の記録（SQLite、変化した値だけを1周期1トランザクションで追記）
+# -------------------------------
+# samples の各行は「時刻 ts に (source, clinic, period) の値が value になった」ことを表します。
+# 値が変わったときだけ記録するため、ある時点の値は「その時点以前の最新の行」です。
+#   source: week_a / week_k / month_a / month_k（合計、clinic は ""）
+#           apollo_month / tomato_week / tomato_month（クリニック別）
+#           apollo_day / tomato_day（日別、period は日付）
+#   period: 週は月曜日の日付、月は "YYYY-MM"、日別は "YYYY-MM-DD"
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    ts INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    clinic TEXT NOT NULL,
+    period TEXT NOT NULL,
+    value INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_series ON samples (source, clinic, ts);
+"""
+
+class TimeSeriesStore:
+    """
+    更新ループの集計値を時系列として保存し、推移の問い合わせに答えます。
+    """
+
+    def __init__(self, path=None):
+        path = path or os.path.join(get_app_dir(), CONFIG["history_db"])
+        self.connection = sqlite3.connect(path)
+        # WALモード: 追記中も読み取りを妨げず、コミットごとの同期書き込みも不要
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(HISTORY_SCHEMA)
+        self.last_values = {}  # (source, clinic, period) -> 最後に記録した値
+        for source, clinic, period, value, _ in self.connection.execute(
+            "SELECT source, clinic, period, value, MAX(ts) FROM samples GROUP BY source, clinic, period"
+        ):
+            self.last_values[(source, clinic, period)] = value
+
+    def append(self, values, ts=None):
+        """
+        {(source, clinic, period): 値} のうち、前回から変化したものだけを1回のトランザクションで追記します。
+        追記した行数を返します。
+        """
+        ts = int(ts if ts is not None else time.time())
+        rows = [
+            (ts, source, clinic, period, value)
+            for (source, clinic, period), value in values.items()
+            if self.last_values.get((source, clinic, period)) != value
+        ]
+        if rows:
+            with self.connection:
+                self.connection.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", rows)
+            for _, source, clinic, period, value in rows:
+                self.last_values[(source, clinic, period)] = value
+        return len(rows)
+
+    def values_at(self, source, ts, period=None):
+        """
+        時刻 ts の時点の source の値を、クリニックごとに {clinic: 値} で返します。
+        period を指定した場合はその期間の値に限ります。
+        """
+        query = "SELECT clinic, value, MAX(ts) FROM samples WHERE source = ? AND ts <= ?"
+        params = [source, int(ts)]
+        if period is not None:
+            query += " AND period = ?"
+            params.append(period)
+        return {clinic: value for clinic, value, _ in self.connection.execute(query + " GROUP BY clinic", params)}
+
+    def value_at(self, source, ts, period=None, clinic=""):
+        return self.values_at(source, ts, period).get(clinic)
+
+    def series(self, source, since, until=None, clinic=""):
+        """
+        source の値の変化を [(ts, period, 値)] で返します。
+        """
+        return self.connection.execute(
+            "SELECT ts, period, value FROM samples WHERE source = ? AND clinic = ? AND ts BETWEEN ? AND ?"
+            " ORDER BY ts",
+            (source, clinic, int(since), int(until if until is not None else time.time())),
+        ).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+def cycle_history_values(totals, cache):
+    """
+    直近の周期の合計・クリニック別・日別の値を {(source, clinic, period): 値} で返します。
+    totals は aggregate_cycle_incremental の戻り値、cache はそのとき使った DayCountCache です。
+    """
+    plan = cache.last_plan
+    week = plan["monday"].strftime('%Y-%m-%d')
+    month = plan["month"]
+    week_a_total, month_a_total, week_k_total, month_k_total = totals
+    values = {
+        ("week_a", "", week): week_a_total,
+        ("week_k", "", week): week_k_total,
+        ("month_a", "", month): month_a_total,
+        ("month_k", "", month): month_k_total,
+    }
+    for name, value in cache.last_clinic_results.get("apollo", {}).items():
+        values[("apollo_month", name, month)] = value
+    for clinic_id, result in cache.last_clinic_results.get("tomato", {}).items():
+        values[("tomato_week", clinic_id, week)] = result["week"]
+        values[("tomato_month", clinic_id, month)] = result["month"]
+    for (source, clinic, date_str), (_, counts) in cache.entries.items():
+        if source == "apollo_week":
+            values[("apollo_day", "", date_str)] = counts[0]
+        elif source == "tomato":
+            values[("tomato_day", clinic, date_str)] = counts[0] - counts[1]
+    return values
+
+def period_bounds(is_week, now=None):
+    """
+    now を含む週（月曜0時から）または月（1日0時から）の (開始, 終了) を返します。
+    """
+    now = now or datetime.now()
+    if is_week:
+        start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(days=7)
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+def period_trend(store, is_week, targets, now=None):
+    """
+    週間（または月間）の A・K について、本日の増加数・前週（前月）同時点比・目標へのペースを返します。
+    targets: (A目標, K目標)
+    戻り値: {"a": {...}, "k": {...}}。各値は value, day_delta, previous_delta, projected, per_day_needed です。
+    """
+    now = now or datetime.now()
+    start, end = period_bounds(is_week, now)
+    if is_week:
+        previous_start = start - timedelta(days=7)
+        previous_now = now - timedelta(days=7)
+        period, previous_period = start.strftime('%Y-%m-%d'), previous_start.strftime('%Y-%m-%d')
+    else:
+        previous_start, previous_end = period_bounds(False, start - timedelta(days=1))
+        previous_now = min(previous_start + (now - start), previous_end - timedelta(seconds=1))
+        period, previous_period = start.strftime('%Y-%m'), previous_start.strftime('%Y-%m')
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    kind = "week" if is_week else "month"
+
+    elapsed = (now - start) / (end - start)
+    remaining_days = max((end - now).total_seconds() / 86400, 1 / 24)
+    trend = {}
+    for key, target in zip(("a", "k"), targets):
+        source = f"{kind}_{key}"
+        value = store.value_at(source, now.timestamp(), period)
+        if value is None:
+            continue
+        day_value = store.value_at(source, day_start.timestamp() - 1, period)
+        previous = store.value_at(source, previous_now.timestamp(), previous_period)
+        trend[key] = {
+            "value": value,
+            "day_delta": value - day_value if day_value is not None else None,
+            "previous_delta": value - previous if previous is not None else None,
+            "projected": round(value / elapsed) if elapsed > 0 else value,
+            "per_day_needed": max(target - value, 0) / remaining_days,
+        }
+    return trend
+
+def record_cycle_history(store, totals):
+    """
+    直近の周期の値を記録します。記録に失敗しても更新ループは止めません。
+    """
+    if store is None:
+        return
+    try:
+        store.append(cycle_history_values(totals, day_count_cache))
+    except sqlite3.Error as e:
+        logging.error(f"時系列の記録でエラー発生: {e}")
+
+def cycle_trends(store):
+    """
+    週間・月間の推移を {"week": ..., "month": ...} で返します（記録しない設定の場合は None）。
+    """
+    if store is None:
+        return None
+    try:
+        return {
+            "week": period_trend(store, True, read_target_values()),
+            "month": period_trend(store, False, read_month_target_values()),
+        }
+    except sqlite3.Error as e:
+        logging.error(f"時系列の問い合わせでエラー発生: {e}")
+        return None
+
+def format_trend(trend):
+    """
+    period_trend の結果を1行の文字列にします。
+    """
+    parts = []
+    for key, label in (("a", "A"), ("k", "K")):
+        if key not in trend:
+            continue
+        item = trend[key]
+        text = f"{label}: 予測{item['projected']}件"
+        if item["day_delta"] is not None:
+            text += f" 本日{item['day_delta']:+d}"
+        if item["previous_delta"] is not None:
+            text += f" 前期同時点比{item['previous_delta']:+d}"
+        text += f" 必要{item['per_day_needed']:.1f}件/日"
+        parts.append(text)
+    return " / ".join(parts)
+
+
+# -------------------------------
+# ライブ更新ダッシュボード（ローカルサーバー + Server-Sent Events）
+# -------------------------------
+
+DASHBOARD_HTML = """<html>
+<head>
+  <meta charset="UTF-8">
+  <title>目標！</title>
+  <style>
+__CSS__
+  </style>
+</head>
+<body>
+  <h1 id="title">データ取得中...</h1>
+  <div class="container">
+    <div class="section" id="tile_a">
+      <p>A残込　<span class="important" id="a_total">-</span> 件</p>
+      <div class="stale-badge" id="stale_a"></div>
+    </div>
+    <div class="section" id="tile_k">
+      <p>K残込　<span class="important" id="k_total">-</span> 件</p>
+      <div class="stale-badge" id="stale_k"></div>
+    </div>
+    <div class="section" id="tile_ak">
+      <p>AK残込　<span class="important" id="ak_total">-</span> 件</p>
+      <div class="stale-badge" id="stale_ak"></div>
+    </div>
+    <div class="section small" id="tile_target">
+      <div style="height: 100%; display: flex; flex-direction: column; justify-content: center; padding: 1vh; box-sizing: border-box;">
+        <div style="text-align: center; margin: 0.5vh 0;">
+          <div style="font-size: 9vh; white-space: nowrap;"><span id="a_target">-</span>件まで: <span class="important" style="font-size: 10vh;" id="remainder_a">-</span></div>
+        </div>
+        <div style="text-align: center; margin: 0.5vh 0;">
+          <div style="font-size: 9vh; white-space: nowrap;"><span id="k_target">-</span>件まで: <span class="important" style="font-size: 10vh;" id="remainder_k">-</span></div>
+        </div>
+        <div class="stale-badge" id="stale_target" style="text-align: center;"></div>
+      </div>
+    </div>
+  </div>
+  <div id="trend" style="position: fixed; bottom: 0.5vh; right: 1vw; font-size: 3vh;"></div>
+  <script>
+    // 表示する期間（#week または #month、左右キーで切り替え）
+    var latest = null;
+    var shown = {};
+    var view = function () { return location.hash === "#month" ? "month" : "week"; };
+    var remainderHtml = function (remainder) {
+      if (remainder > 0) { return remainder + "件"; }
+      return '<span style="white-space: nowrap;">★' + Math.abs(remainder) +
+        '件<img src="achievement.png" style="width:8vh; height:8vh; vertical-align: middle;"></span>';
+    };
+    var render = function () {
+      if (!latest || !latest[view()]) { return; }
+      var values = latest[view()];
+      var fields = {
+        title: values.title, a_total: values.a_total, k_total: values.k_total, ak_total: values.ak_total,
+        a_target: values.a_target, k_target: values.k_target,
+        remainder_a: remainderHtml(values.remainder_a), remainder_k: remainderHtml(values.remainder_k),
+        trend: values.trend || ""
+      };
+      // 値が変わった要素だけを書き換える
+      Object.keys(fields).forEach(function (id) {
+        var value = String(fields[id]);
+        if (shown[id] === value) { return; }
+        shown[id] = value;
+        document.getElementById(id).innerHTML = value;
+      });
+      // 古い値で表示している区画は枠を点線にして経過時間を添える
+      var stale = values.stale || {};
+      ["a", "k", "ak", "target"].forEach(function (tile) {
+        var label = stale[tile] || "";
+        if (shown["stale_" + tile] === label) { return; }
+        shown["stale_" + tile] = label;
+        document.getElementById("stale_" + tile).textContent = label;
+        document.getElementById("tile_" + tile).classList.toggle("stale", label !== "");
+      });
+      document.title = values.title;
+    };
+    window.addEventListener("hashchange", render);
+    document.addEventListener("keydown", function (e) {
+      if (e.key === "ArrowLeft" || e.key === "ArrowRight") {
+        location.hash = view() === "week" ? "#month" : "#week";
+      }
+    });
+    new EventSource("events").onmessage = function (e) {
+      latest = JSON.parse(e.data);
+      render();
+    };
+  </script>
+</body>
+</html>""".replace("__CSS__", RESULT_PAGE_CSS)
+
+
+class DashboardState:
+    """
+    ダッシュボードに配信する最新の値を保持し、変化があれば待機中の接続に通知します。
+    """
+
+    def __init__(self):
+        self.payload = None
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def publish(self, payload):
+        """
+        値を更新します。前回と同じ内容の場合は通知せず False を返します。
+        """
+        with self.condition:
+            if payload == self.payload:
+                return False
+            self.payload = payload
+            self.version += 1
+            self.condition.notify_all()
+            return True
+
+    def wait_for_update(self, version, timeout):
+        """
+        version より新しい値が公開されるまで最大 timeout 秒待ち、(version, payload) を返します。
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.payload
+
+
+def build_dashboard_payload(week_a_total, week_k_total, month_a_total, month_k_total, trends=None, staleness=None):
+    """
+    ダッシュボードに配信する週間・月間の値を作成します。
+    trends を指定した場合は推移（cycle_trends の結果）も添えます。
+    staleness を指定した場合は古い区画の注記（SourceCache.tile_staleness の結果）も添えます。
+    """
+    payload = {}
+    for view, a_total, k_total, is_week in (
+        ("week", week_a_total, week_k_total, True),
+        ("month", month_a_total, month_k_total, False),
+    ):
+        _, _, a_target, k_target, _, label, _ = get_render_state(a_total, k_total, is_week)
+        payload[view] = {
+            "title": f"{label}w目標！" if is_week else f"{label}月目標！",
+            "a_total": a_total,
+            "k_total": k_total,
+            "ak_total": a_total + k_total,
+            "a_target": a_target,
+            "k_target": k_target,
+            "remainder_a": a_target - a_total,
+            "remainder_k": k_target - k_total,
+            "trend": format_trend(trends[view]) if trends else "",
+            "stale": stale_tiles(staleness[view] if staleness else None),
+        }
+    return payload
+
+
+class DashboardRequestHandler(BaseHTTPRequestHandler):
+    """
+    ダッシュボードページ・画像・更新イベント（/events）を返します。
+    """
+    state = None  # start_dashboard_server で設定
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/":
+            self._send(200, "text/html; charset=utf-8", DASHBOARD_HTML.encode("utf-8"))
+        elif path == "/achievement.png":
+            try:
+                with open("achievement.png", "rb") as file:
+                    self._send(200, "image/png", file.read())
+            except FileNotFoundError:
+                self._send(404, "text/plain", b"not found")
+        elif path == "/events":
+            self._stream_events()
+        elif path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4; charset=utf-8", metrics.render().encode("utf-8"))
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        version = 0
+        try:
+            while True:
+                new_version, payload = self.state.wait_for_update(version, timeout=15)
+                if new_version != version and payload is not None:
+                    message = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                else:
+                    message = ": keepalive\n\n"  # 接続維持用のコメント
+                version = new_version
+                self.wfile.write(message.encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        logging.debug(f"ダッシュボード: {format % args}")
+
+
+def start_dashboard_server(state, port=None):
+    """
+    ダッシュボードサーバーをバックグラウンドスレッドで起動し、サーバーを返します。
+    """
+    port = CONFIG["dashboard_port"] if port is None else port
+    handler = type("BoundDashboardRequestHandler", (DashboardRequestHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="dashboard", daemon=True).start()
+    logging.info(f"ダッシュボードサーバー起動: http://127.0.0.1:{port}/")
+    return server
+
+def auto_login_apollo(driver):
+    """
+    Apolloサイトへの自動ログイン
+    """
+    try:
+        driver.get(f"{APOLLO_BASE_URL}/LOGIN/")
+
+        # ログインフォーム要素の取得と入力
+        account_input = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.NAME, "account"))
+        )
+        pass_input = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.NAME, "pass"))
+        )
+
+        account, password = get_credentials("apollo")
+        account_input.send_keys(account)
+        pass_input.send_keys(password)
+
+        # ログインボタンをクリック
+        login_button = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'p.login > input[name="Submit"]'))
+        )
+        login_button.click()
+
+        # ログインフォームが画面遷移で破棄され、遷移先の読み込みが終わるまで待機
+        WebDriverWait(driver, 10).until(EC.staleness_of(login_button))
+        wait_for_page_ready(driver, label="login")
+        return not driver.find_elements(By.NAME, "pass")
+    except TimeoutException:
+        print("Apolloログインでエラーが発生しました。")
+        return False
+
+def auto_login_tomato(driver):
+    """
+    Tomatoサイトへの自動ログイン
+    """
+    try:
+        driver.get(f"{TOMATO_BASE_URL}/LOGIN/")
+
+        # ログインフォーム要素の取得と入力
+        account_input = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.NAME, "account"))
+        )
+        pass_input = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.NAME, "pass"))
+        )
+
+        account, password = get_credentials("tomato")
+        account_input.send_keys(account)
+        pass_input.send_keys(password)
+
+        # ログインボタンをクリック
+        login_button = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'p.login > input[type="image"]'))
+        )
+        login_button.click()
+
+        # ログインフォームが画面遷移で破棄され、遷移先の読み込みが終わるまで待機
+        WebDriverWait(driver, 10).until(EC.staleness_of(login_button))
+        wait_for_page_ready(driver, label="login")
+        return not driver.find_elements(By.NAME, "pass")
+    except TimeoutException:
+        print("Tomatoログインでエラーが発生しました。")
+        return False
+
+# -------------------------------
+# ログインセッション管理（Cookieの保存・復元とセッション切れ時の再ログイン）
+# -------------------------------
+
+class SessionExpiredError(Exception):
+    """
+    ページ取得中にログイン画面へ戻された（セッションが切れた）ことを表します。
+    """
+
+
+def get_credentials(site):
+    """
+    サイト（"apollo" または "tomato"）のログイン情報 (account, password) を返します。
+    サイト別の設定（apollo_account など）があればそれを優先します。
+    """
+    account = CONFIG.get(f"{site}_account") or CONFIG["login_account"]
+    password = CONFIG.get(f"{site}_password") or CONFIG["login_password"]
+    return account, password
+
+
+def driver_on_login_page(driver):
+    """
+    ドライバがログイン画面を表示しているかどうかを返します。
+    """
+    return "/LOGIN/" in driver.current_url or bool(driver.find_elements(By.NAME, "pass"))
+
+
+class SiteSession:
+    """
+    サイトごとのログイン状態を管理します。
+    client はSeleniumのドライバまたはrequestsのセッションです。
+    ログイン後のCookieをディスクに保存し、起動時に復元して再ログインを省略します。
+    取得中にセッション切れを検出した場合は、1回だけ再ログインしてやり直します。
+    再ログインに失敗した場合は、失敗回数に応じて次の再ログインまでの間隔を延ばします。
+    """
+
+    def __init__(self, name, client, login_func, check_url_func):
+        self.name = name
+        self.client = client
+        self.login_func = login_func
+        self.check_url_func = check_url_func
+        self.cookie_file = os.path.join(get_app_dir(), CONFIG["session_dir"], f"{name}_cookies.json")
+        self.lock = threading.Lock()
+        self.generation = 0  # ログインに成功するたびに増える
+        self.failures = 0
+        self.next_login_at = 0
+        # 同じサイトへの同時取得数を制限
+        self.semaphore = threading.BoundedSemaphore(CONFIG["site_max_parallel"])
+
+    def _is_http(self):
+        return isinstance(self.client, requests.Session)
+
+    def save_cookies(self):
+        if self._is_http():
+            cookies = [
+                {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+                for c in self.client.cookies
+            ]
+        else:
+            cookies = self.client.get_cookies()
+        os.makedirs(os.path.dirname(self.cookie_file), exist_ok=True)
+        # ログイン済みのセッションCookieのため、本人以外は読めないようにする
+        write_text_atomic(self.cookie_file, json.dumps(cookies, ensure_ascii=False), mode=0o600)
+
+    def restore(self):
+        """
+        保存済みのCookieを復元し、ログイン済みの状態で使えれば True を返します。
+        """
+        try:
+            with open(self.cookie_file, "r", encoding="utf-8") as file:
+                cookies = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return False
+
+        check_url = self.check_url_func()
+        if self._is_http():
+            for c in cookies:
+                self.client.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+            response = self.client.get(check_url, timeout=CONFIG["http_timeout"])
+            valid = response.ok and not is_login_page(response.url, response.text)
+        else:
+            # Cookieを設定するには対象ドメインのページを開いている必要がある
+            self.client.get(check_url)
+            for c in cookies:
+                c.pop("sameSite", None)
+                try:
+                    self.client.add_cookie(c)
+                except Exception as e:
+                    logging.debug(f"Cookieの復元に失敗: {c.get('name')}: {e}")
+            self.client.get(check_url)
+            wait_for_page_ready(self.client, label="session")
+            valid = not driver_on_login_page(self.client)
+
+        logging.info(f"{self.name}: 保存済みセッションの復元{'成功' if valid else '失敗'}")
+        return valid
+
+    def login(self):
+        """
+        ログインします。前回の失敗から待機時間が経っていない場合は試行せず False を返します。
+        """
+        if time.monotonic() < self.next_login_at:
+            logging.warning(f"{self.name}: 再ログインの待機中です")
+            return False
+        success = False
+        try:
+            with timed_stage("login", site=self.name):
+                success = self.login_func(self.client)
+        except Exception as e:
+            logging.error(f"{self.name}: ログインでエラー発生: {e}")
+        metrics.inc("weekgoal_logins_total", site=self.name, result="success" if success else "failure")
+        if success:
+            self.generation += 1
+            self.failures = 0
+            self.next_login_at = 0
+            try:
+                self.save_cookies()
+            except Exception as e:
+                logging.warning(f"{self.name}: Cookieの保存に失敗: {e}")
+        else:
+            self.failures += 1
+            delay = min(CONFIG["relogin_backoff"] * 2 ** (self.failures - 1), CONFIG["relogin_backoff_max"])
+            self.next_login_at = time.monotonic() + delay
+            logging.error(f"{self.name}: ログイン失敗（{self.failures}回目、{delay}秒後まで再試行しません）")
+        return success
+
+    def ensure_login(self):
+        """
+        保存済みセッションを復元し、使えない場合はログインします。
+        """
+        try:
+            if self.restore():
+                return True
+        except Exception as e:
+            logging.warning(f"{self.name}: セッションの復元でエラー発生: {e}")
+        return self.login()
+
+    def run(self, func):
+        """
+        func() を実行し、セッション切れの場合は再ログインしてもう1回だけ実行します。
+        """
+        with self.semaphore:
+            generation = self.generation
+            try:
+                return func()
+            except SessionExpiredError:
+                with self.lock:
+                    # 他のタスクがすでに再ログインしていればそのままやり直す
+                    if self.generation == generation:
+                        logging.warning(f"{self.name}: セッション切れを検出したため再ログインします")
+                        if not self.login():
+                            raise
+                metrics.inc("weekgoal_retries_total", site=self.name)
+                return func()
+
+# 遮断するリソースの種類と拡張子（Network.setBlockedURLs はURLのパターンで指定する）
+# 種類（resourceType）で絞れる Fetch.enable は、一致した要求ごとに Fetch.requestPaused へ応答する必要があり、
+# execute_cdp_cmd ではイベントを受け取れない（要求が止まったままになる）ため、種類は拡張子で近似する
+# テキストは textContent で読むため stylesheet を遮断しても抽出結果は変わらないが、既定では遮断しない
+BLOCKABLE_RESOURCE_EXTENSIONS = {
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "svg", "ico", "bmp"],
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "media": ["mp4", "webm", "mp3", "ogg", "wav"],
+    "stylesheet": ["css"],
+}
+
+def blocked_url_patterns():
+    """
+    設定の blocked_resource_types・blocked_url_patterns から Network.setBlockedURLs のパターンを作成します。
+    """
+    patterns = []
+    for resource_type in CONFIG["blocked_resource_types"]:
+        for extension in BLOCKABLE_RESOURCE_EXTENSIONS.get(resource_type, []):
+            patterns += [f"*.{extension}", f"*.{extension}?*"]
+    return patterns + list(CONFIG["blocked_url_patterns"])
+
+class ResourceBlocker:
+    """
+    抽出用ブラウザのタブで不要なリソースの読み込みをDevTools（CDP）で遮断します。
+    measure_blocked_resources が有効な場合は、遮断した件数（種類別）と実際に転送したバイト数を
+    パフォーマンスログ（CDPのネットワークイベント）から数え、遮断で節約したバイト数を
+    blocked_resource_estimated_bytes で見積もります。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}  # タブ -> このタブで始まった要求の requestId
+        self.cycle = {"blocked": 0, "transferred_bytes": 0, "saved_bytes": 0}
+
+    def apply(self, driver):
+        """
+        driver が操作中のタブでリソースの遮断を有効にします。
+        """
+        patterns = blocked_url_patterns()
+        if not patterns:
+            return
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+    def drain(self, driver, label):
+        """
+        driver のパフォーマンスログを読み出し、このタブの遮断件数・転送バイト数を集計します。
+        """
+        if not CONFIG["measure_blocked_resources"]:
+            return
+        try:
+            entries = driver.get_log("performance")
+            tab = driver.current_window_handle
+        except Exception as e:
+            logging.debug(f"パフォーマンスログを取得できません（{label}）: {e}")
+            return
+        # デバッグポート経由で接続したドライバのログには他のタブのイベントも含まれるため、
+        # メインフレームのID（= タブのID）で始まった要求だけを数える
+        pending = self.requests.setdefault(tab, set())
+        blocked, transferred = [], 0
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            method, params = message["method"], message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                if params.get("frameId") == tab:
+                    pending.add(params["requestId"])
+            elif method == "Network.loadingFinished":
+                if params.get("requestId") in pending:
+                    pending.discard(params["requestId"])
+                    transferred += int(params.get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed":
+                if params.get("requestId") in pending:
+                    pending.discard(params["requestId"])
+                    if params.get("blockedReason"):
+                        blocked.append(params.get("type", "Other"))
+        if len(pending) > 1000:
+            # 完了の記録がないまま残った要求（読み込み途中で移動したページなど）は捨てる
+            pending.clear()
+        estimates = CONFIG["blocked_resource_estimated_bytes"]
+        saved = 0
+        for resource_type in blocked:
+            metrics.inc("weekgoal_blocked_requests_total", site=label, type=resource_type)
+            saved += estimates.get(resource_type.lower(), estimates.get("other", 0))
+        metrics.inc("weekgoal_page_bytes_total", transferred, site=label, kind="transferred")
+        metrics.inc("weekgoal_page_bytes_total", saved, site=label, kind="blocked_estimated")
+        with self.lock:
+            self.cycle["blocked"] += len(blocked)
+            self.cycle["transferred_bytes"] += transferred
+            self.cycle["saved_bytes"] += saved
+
+    def take_cycle_summary(self):
+        """
+        前回呼び出してからの遮断件数・転送バイト数・節約した推定バイト数を返し、集計をリセットします。
+        """
+        with self.lock:
+            summary, self.cycle = self.cycle, dict.fromkeys(self.cycle, 0)
+        return summary
+
+resource_blocker = ResourceBlocker()
+
+def directory_size(path):
+    """
+    ディレクトリ以下のファイルの合計サイズ（バイト）を返します。
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def prepare_headless_profile(profile_slot=0):
+    """
+    抽出用ブラウザのプロファイルのディレクトリを返します。
+    headless_profile_dir が空の場合は起動ごとの一時ディレクトリ（終了時に削除）を作成します。
+    指定されている場合は、headless_profile_max_mb を超えていたら作り直します。
+    profile_slot が1の場合は入れ替え用の別のディレクトリ（末尾に _1）を使います。
+    戻り値は (ディレクトリ, 一時ディレクトリかどうか) です。
+    """
+    if not CONFIG["headless_profile_dir"]:
+        return tempfile.mkdtemp(prefix="weekgoal_chrome_"), True
+    user_data_dir = os.path.join(get_app_dir(), CONFIG["headless_profile_dir"])
+    if profile_slot:
+        user_data_dir += f"_{profile_slot}"
+    if os.path.isdir(user_data_dir):
+        size_mb = directory_size(user_data_dir) / 2**20
+        if size_mb > CONFIG["headless_profile_max_mb"]:
+            logging.info(f"抽出用プロファイルが{size_mb:.0f}MBのため作り直します: {user_data_dir}")
+            shutil.rmtree(user_data_dir, ignore_errors=True)
+    return user_data_dir, False
+
+def create_headless_options(debug_port=9222, user_data_dir=None):
+    """
+    ヘッドレスモード用のChromeオプションを作成
     """
     options = webdriver.ChromeOptions()
     options.add_argument("--headless=new")
     options.add_argument("--disable-gpu")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
-    options.add_argument('--remote-debugging-port=9222')
+    options.add_argument(f'--remote-debugging-port={debug_port}')
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
     options.add_argument("--disable-extensions")
     options.add_argument("--disable-notifications")
     options.add_argument("--disable-infobars")
+    # 抽出に不要なバックグラウンド通信・初回起動処理を止める
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--disable-component-update")
+    options.add_argument("--disable-sync")
+    options.add_argument("--disable-default-apps")
+    options.add_argument("--no-first-run")
+    options.add_argument("--mute-audio")
+    # 表示していないタブでも監視モードのタイマーを間引かせない
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-renderer-backgrounding")
+    options.add_argument(f"--disk-cache-size={CONFIG['headless_disk_cache_mb'] * 2**20}")
+    if CONFIG["measure_blocked_resources"]:
+        # 遮断したリソースを数えるためにネットワークのイベントを記録する
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    
+    # Chrome User Dataディレクトリの設定
+    if user_data_dir is None:
+        user_data_dir = os.path.join(os.getcwd(), "chrome_user_data")
+    options.add_argument(f"--user-data-dir={user_data_dir}")
+    return options
+
+def find_free_port():
+    """
+    ローカルで空いているTCPポート番号を返します。
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class SharedHeadlessBrowser:
+    """
+    ヘッドレスChromeを1プロセスだけ起動し、用途（apollo・tomato）ごとに別タブのドライバを渡します。
+    最初のドライバがChromeを起動し、2つ目以降はデバッグポート経由で同じChromeに接続して
+    自分専用のタブを開きます。各ドライバは自分のタブだけを操作するため、並列に使えます。
+    前提: すべてのタブは1つのプロファイル（Cookie・localStorage・キャッシュ）を共有します。
+    apolloとtomatoは別ドメインのため、Cookieはドメインごとに分かれ、ログイン状態は干渉しません。
+    同じドメイン（または共通の親ドメインにCookieを置くサイト）を追加する場合は、
+    ログインが上書きされるため、このクラスでは共有せずサイトごとに別のブラウザを起動してください。
+    各タブでは ResourceBlocker により画像・フォントなどの読み込みを遮断します。
+    """
+
+    def __init__(self, chromedriver_path, profile_slot=0):
+        self.chromedriver_path = chromedriver_path
+        self.profile_slot = profile_slot
+        self.debug_port = find_free_port()
+        self.owner = None
+        self.drivers = {}
+        self.user_data_dir = None
+        self.ephemeral_profile = False
+
+    def driver(self, name):
+        """
+        name 用のドライバ（専用タブ）を返します。初回はドライバを作成します。
+        """
+        if name in self.drivers:
+            return self.drivers[name]
+        if self.owner is None:
+            # Chromeを起動し、最初のタブをこの用途に割り当てる
+            self.user_data_dir, self.ephemeral_profile = prepare_headless_profile(self.profile_slot)
+            options = create_headless_options(self.debug_port, self.user_data_dir)
+            self.owner = webdriver.Chrome(service=ChromeService(self.chromedriver_path), options=options)
+            driver = self.owner
+        else:
+            # 起動済みのChromeに接続し、新しいタブを開く
+            options = webdriver.ChromeOptions()
+            options.debugger_address = f"127.0.0.1:{self.debug_port}"
+            if CONFIG["measure_blocked_resources"]:
+                options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            driver = webdriver.Chrome(service=ChromeService(self.chromedriver_path), options=options)
+            driver.switch_to.new_window("tab")
+        resource_blocker.apply(driver)
+        self.drivers[name] = driver
+        logging.info(f"共有ヘッドレスブラウザのタブを作成: {name}")
+        return driver
+
+    def quit(self):
+        """
+        接続中のドライバを終了し、最後にChrome本体を終了します。
+        """
+        for driver in self.drivers.values():
+            if driver is not self.owner:
+                try:
+                    driver.quit()
+                except Exception as e:
+                    logging.warning(f"ドライバ終了時のエラー: {e}")
+        if self.owner is not None:
+            self.owner.quit()
+        if self.ephemeral_profile:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+        self.drivers = {}
+        self.owner = None
+
+def create_display_options(profile_slot=0):
+    """
+    表示用ブラウザのオプションを設定
+    profile_slot: 入れ替え時に新旧のブラウザが同じプロファイルを使わないよう、1の場合は別のディレクトリを使う
+    """
+    options = webdriver.ChromeOptions()
+    options.add_argument("--start-maximized")  # 最大化して起動
+    options.add_argument("--disable-infobars")  # 情報バーを非表示
+    options.add_argument("--disable-extensions")  # 拡張機能を無効化
+    options.add_argument("--disable-popup-blocking")  # ポップアップブロックを無効化
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    
+    # キャッシュを無効化
+    options.add_argument("--disable-application-cache")
+    options.add_argument("--disable-cache")
+    options.add_argument("--disable-offline-load-stale-cache")
+    options.add_argument("--disk-cache-size=0")
     
     # Chrome User Dataディレクトリの設定
-    user_data_dir = os.path.join(os.getcwd(), "chrome_user_data")
+    user_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chrome_user_data_display")
+    if profile_slot:
+        user_data_dir += f"_{profile_slot}"
     options.add_argument(f"--user-data-dir={user_data_dir}")
+    
+    # プリファレンス設定
+    prefs = {
+        "profile.default_content_setting_values.notifications": 2,  # 通知を無効化
+        "profile.default_content_settings.popups": 0,  # ポップアップを許可
+        "download.default_directory": os.getcwd(),  # ダウンロードディレクトリを現在のディレクトリに設定
+        "browser.cache.disk.enable": False,  # ディスクキャッシュを無効化
+        "browser.cache.memory.enable": False,  # メモリキャッシュを無効化
+        "browser.cache.offline.enable": False,  # オフラインキャッシュを無効化
+        "network.http.use-cache": False  # HTTPキャッシュを無効化
+    }
+    options.add_experimental_option("prefs", prefs)
+    
     return options
 
-def create_display_options():
+# -------------------------------
+# ブラウザの入れ替え（長時間の稼働でメモリが増え続けないようにする）
+# -------------------------------
+
+# ドライバ（session_id）ごとの読み込んだページ数
+browser_page_counts = {}
+
+def count_browser_page(driver):
+    """
+    driver でページを1つ読み込んだことを記録します（入れ替えの判定に使用）。
+    """
+    browser_page_counts[driver.session_id] = browser_page_counts.get(driver.session_id, 0) + 1
+
+def process_tree_rss(pid):
+    """
+    pid のプロセスとその子孫のRSS合計（バイト）を返します。
+    psutil がない場合やプロセスが終了している場合は None を返します。
+    """
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for child in processes:
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+def browser_recycle_reason(name, drivers, started_at):
+    """
+    drivers（同じChromeを操作するドライバ）を入れ替えるべき理由を返します。不要な場合は None です。
+    ChromeDriverが応答しない、Chrome全体のRSS・読み込んだページ数・起動からの時間が上限を超えた、のいずれかです。
+    """
+    drivers = list(drivers)
+    if not drivers:
+        return None
+    owner = drivers[0]
+    if not owner.service.is_connectable():
+        return "ChromeDriverが応答しません"
+    rss = process_tree_rss(owner.service.process.pid)
+    if rss is not None:
+        metrics.set("weekgoal_browser_rss_bytes", rss, browser=name)
+        if rss > CONFIG["browser_max_rss_mb"] * 2**20:
+            return f"メモリ使用量 {rss / 2**20:.0f}MB"
+    pages = sum(browser_page_counts.get(driver.session_id, 0) for driver in drivers)
+    if pages >= CONFIG["browser_max_pages"]:
+        return f"読み込んだページ数 {pages}"
+    hours = (time.monotonic() - started_at) / 3600
+    if hours >= CONFIG["browser_max_age_hours"]:
+        return f"起動から{hours:.1f}時間"
+    return None
+
+def forget_browser_pages(drivers):
+    for driver in drivers:
+        browser_page_counts.pop(driver.session_id, None)
+
+def kill_browser_processes(drivers):
+    """
+    drivers のChromeDriverと、その子孫のプロセス（Chrome）を強制終了します。
+    応答しないドライバへの操作（ロックを持ったままのページ読み込みなど）は接続エラーで終わります。
+    quit と違い、ChromeDriverの応答を待ちません。
+    """
+    for driver in drivers:
+        process = getattr(driver.service, "process", None)
+        if process is None:
+            continue
+        if psutil is not None:
+            try:
+                for child in psutil.Process(process.pid).children(recursive=True):
+                    child.kill()
+            except psutil.Error:
+                pass
+        try:
+            process.kill()
+        except OSError as e:
+            logging.warning(f"ChromeDriverの強制終了でエラー発生: {e}")
+
+class ExtractionBrowserRecycler:
+    """
+    抽出用のヘッドレスブラウザ（SharedHeadlessBrowser）を定期的に新しいものへ入れ替えます。
+    入れ替えが必要になると、別スレッドで予備のブラウザを起動してログインしておき（ウォームスタンバイ）、
+    次の周期でドライバのロックを取って SiteSession の client を一度に差し替えてから古いブラウザを終了します。
+    予備の準備中も古いブラウザで取得を続けるため、取得が途切れることはありません。
+    """
+
+    def __init__(self, chromedriver_path, browser, sites):
+        self.chromedriver_path = chromedriver_path
+        self.browser = browser
+        self.sites = sites  # {"apollo": SiteSession, "tomato": SiteSession}
+        self.started_at = time.monotonic()
+        self.slot = 0  # 固定プロファイルを使う場合、新旧のブラウザで別のディレクトリを使う
+        self.standby = None
+        self.reason = None
+        self.warming = None
+        self.next_attempt_at = 0
+        self.aborted = None  # abort で強制終了したブラウザ
+
+    def check(self):
+        """
+        周期ごとに呼び出します。予備が準備できていれば入れ替え、入れ替えが必要なら予備の準備を始めます。
+        """
+        if self.standby is not None:
+            self.hand_over()
+            return
+        if self.warming is not None and self.warming.is_alive():
+            return
+        if time.monotonic() < self.next_attempt_at:
+            return
+        reason = browser_recycle_reason("extraction", self.browser.drivers.values(), self.started_at)
+        if reason:
+            self._start_warm_up(reason)
+
+    def _start_warm_up(self, reason):
+        logging.info(f"抽出用ブラウザの入れ替えを開始します（{reason}）")
+        self.reason = reason
+        self.warming = threading.Thread(target=self._warm_up, name="browser-standby", daemon=True)
+        self.warming.start()
+
+    def abort(self, reason):
+        """
+        取得が task_timeout を過ぎても終わらない場合に呼び出します。
+        今のブラウザ（ChromeDriverとChrome）を強制終了し、ドライバのロックを持ったまま止まっている取得を
+        例外で終わらせてから、予備のブラウザの準備を始めます（準備ができた周期の check で入れ替えます）。
+        それまでの取得は失敗として扱われ、前回の結果で表示を続けます。
+        """
+        if self.aborted is self.browser:
+            return
+        logging.error(f"抽出用ブラウザを強制終了します（{reason}）")
+        self.aborted = self.browser
+        kill_browser_processes(self.browser.drivers.values())
+        if self.standby is None and not (self.warming is not None and self.warming.is_alive()):
+            self.next_attempt_at = 0
+            self._start_warm_up(reason)
+
+    def _warm_up(self):
+        """
+        予備のブラウザを起動し、各サイトにログインしておきます（別スレッドで実行）。
+        """
+        browser = SharedHeadlessBrowser(self.chromedriver_path, profile_slot=1 - self.slot)
+        try:
+            for name, site in self.sites.items():
+                standby_site = SiteSession(name, browser.driver(name), site.login_func, site.check_url_func)
+                if not standby_site.ensure_login():
+                    raise RuntimeError(f"{name}へのログインに失敗しました")
+            self.standby = browser
+            logging.info("予備の抽出用ブラウザの準備完了")
+        except Exception as e:
+            logging.error(f"予備の抽出用ブラウザの準備に失敗しました: {e}")
+            self.next_attempt_at = time.monotonic() + CONFIG["relogin_backoff_max"]
+            browser.quit()
+
+    def hand_over(self):
+        """
+        予備のブラウザに切り替え、古いブラウザを終了します。
+        各サイトのドライバのロックを取るため、読み込み中のページがあれば完了を待ちます。
+        """
+        old, new = self.browser, self.standby
+        with apollo_driver_lock, tomato_driver_lock:
+            for name, site in self.sites.items():
+                with site.lock:
+                    site.client = new.drivers[name]
+                    site.generation += 1
+            self.browser = new
+        self.standby = None
+        self.slot = 1 - self.slot
+        self.started_at = time.monotonic()
+        old_drivers = list(old.drivers.values())
+        try:
+            old.quit()
+        except Exception as e:
+            logging.warning(f"古い抽出用ブラウザの終了時のエラー: {e}")
+        forget_browser_pages(old_drivers)
+        metrics.inc("weekgoal_browser_recycles_total", browser="extraction")
+        logging.info(f"抽出用ブラウザを入れ替えました（{self.reason}）")
+
+def managed_display_url(path, timestamp=None):
     """
-    表示用ブラウザのオプションを設定
+    表示用ブラウザが操作するタブで開く結果ページのURLを返します（ページ内のハッシュ確認を止める）。
+    timestamp を指定した場合はキャッシュ回避のパラメータも付けます。
     """
-    options = webdriver.ChromeOptions()
-    options.add_argument("--start-maximized")  # 最大化して起動
-    options.add_argument("--disable-infobars")  # 情報バーを非表示
-    options.add_argument("--disable-extensions")  # 拡張機能を無効化
-    options.add_argument("--disable-popup-blocking")  # ポップアップブロックを無効化
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    
-    # キャッシュを無効化
-    options.add_argument("--disable-application-cache")
-    options.add_argument("--disable-cache")
-    options.add_argument("--disable-offline-load-stale-cache")
-    options.add_argument("--disk-cache-size=0")
-    
-    # Chrome User Dataディレクトリの設定
-    user_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chrome_user_data_display")
-    options.add_argument(f"--user-data-dir={user_data_dir}")
-    
-    # プリファレンス設定
-    prefs = {
-        "profile.default_content_setting_values.notifications": 2,  # 通知を無効化
-        "profile.default_content_settings.popups": 0,  # ポップアップを許可
-        "download.default_directory": os.getcwd(),  # ダウンロードディレクトリを現在のディレクトリに設定
-        "browser.cache.disk.enable": False,  # ディスクキャッシュを無効化
-        "browser.cache.memory.enable": False,  # メモリキャッシュを無効化
-        "browser.cache.offline.enable": False,  # オフラインキャッシュを無効化
-        "network.http.use-cache": False  # HTTPキャッシュを無効化
-    }
-    options.add_experimental_option("prefs", prefs)
-    
-    return options
+    url = f"{path}?{DISPLAY_MANAGED_QUERY}"
+    return url if timestamp is None else f"{url}&t={timestamp}"
 
-def get_current_week_range():
+def open_display_tabs(driver, week_path, month_path, show_week=False):
     """
-    現在の日付から、その週の月曜日から日曜日の範囲を返します。
+    表示用ブラウザの1つ目のタブに週間目標、2つ目のタブに月間目標を表示します。
+    ドライバは show_week なら週間、それ以外は月間のタブを操作し、そのタブは変化したときにドライバが再読み込みします。
+    もう一方のタブはページ内のハッシュ確認で再読み込みします。
     """
-    current_date = datetime.now()
+    driver.get(managed_display_url(week_path) if show_week else week_path)
+    wait_for_page_ready(driver, label="display")
+    driver.execute_script("window.open('', '_blank');")
+    WebDriverWait(driver, 10).until(EC.number_of_windows_to_be(2))
+    driver.switch_to.window(driver.window_handles[-1])
+    driver.get(month_path if show_week else managed_display_url(month_path))
+    wait_for_page_ready(driver, label="display")
+    if show_week:
+        driver.switch_to.window(driver.window_handles[0])
+
+def recycle_display_browser(driver, chromedriver_path, week_path, month_path, slot):
+    """
+    新しい表示用ブラウザで週間・月間のタブを開き、古いブラウザと同じ側のタブを表示してから古いブラウザを終了します。
+    新しいブラウザの準備ができるまでは古いブラウザの表示が残ります。
+    戻り値は新しいドライバです。
+    """
+    try:
+        showing_week = "week_result.html" in driver.current_url
+    except Exception:
+        showing_week = True  # 応答しないドライバは週間目標の表示で作り直す
+    new_driver = webdriver.Chrome(service=Service(chromedriver_path), options=create_display_options(slot))
+    open_display_tabs(new_driver, week_path, month_path, show_week=showing_week)
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.warning(f"古い表示用ブラウザの終了時のエラー: {e}")
+    forget_browser_pages([driver])
+    metrics.inc("weekgoal_browser_recycles_total", browser="display")
+    return new_driver
+
+def get_current_week_range(current_date=None):
+    """
+    現在の日付（または current_date）から、その週の月曜日から日曜日の範囲を返します。
+    """
+    current_date = current_date or datetime.now()
     # 現在の曜日を取得（0=月曜日, 6=日曜日）
     current_weekday = current_date.weekday()
     # その週の月曜日を計算
@@ -499,284 +2626,1275 @@ def get_current_week_range():
     sunday = monday + timedelta(days=6)
     return monday, sunday
 
-def get_week_url():
+def get_week_url(current_date=None):
     """
-    現在の週のApolloカレンダーURLを生成します。
+    現在の週（または current_date を含む週）のApolloカレンダーURLを生成します。
     """
-    monday, _ = get_current_week_range()
-    return f"https://apollo-scedure77.net/CAL/week.php?w={monday.strftime('%Y-%m-%d')}"
+    monday, _ = get_current_week_range(current_date)
+    return f"{APOLLO_BASE_URL}/CAL/week.php?w={monday.strftime('%Y-%m-%d')}"
 
-def get_month_url():
+def get_month_url(current_date=None):
     """
-    現在の月の1日のApolloカレンダーURLを生成します。
+    現在の月（または current_date の月）の1日のApolloカレンダーURLを生成します。
     """
-    current_date = datetime.now()
+    current_date = current_date or datetime.now()
     first_day = current_date.replace(day=1)
-    return f"https://apollo-scedure77.net/CAL/week.php?w={first_day.strftime('%Y-%m-%d')}"
+    return f"{APOLLO_BASE_URL}/CAL/week.php?w={first_day.strftime('%Y-%m-%d')}"
+
+def get_tomato_month_url(clinic_id, year, month):
+    """
+    指定クリニック・年月のtomato月間カレンダーURLを生成します。
+    """
+    return f"{TOMATO_BASE_URL}/CAL/monthly.php?c={clinic_id}&y={year}&m={month:02d}#cal"
+
+def get_tomato_check_url():
+    """
+    tomatoのログイン状態の確認に使うページ（先頭クリニックの当月カレンダー）のURLを返します。
+    """
+    current_date = datetime.now()
+    return get_tomato_month_url(TOMATO_CLINICS[0], current_date.year, current_date.month)
+
+def plan_cycle_fetches(current_date=None):
+    """
+    1回の更新で必要なページを洗い出し、各URLを1回だけ取得するための計画を作成します。
+    週が月をまたぐ場合は、翌月（前月）のtomatoページも計画に含めます。
+    戻り値の辞書:
+      apollo_week / apollo_month: 週間・月間A残込に使うURL（同じURLになる場合あり）
+      tomato_week: {クリニックID: [(日付, URL), ...]}（週の各日を含む月のページ）
+      tomato_month: {クリニックID: URL}（当月のページ）
+      tomato_pages: {URL: (クリニックID, "YYYY-MM")}（各tomatoページの対象月）
+      apollo_urls / tomato_urls: 重複を除いた取得対象URLの一覧
+      monday / month: 週の月曜日と当月（"YYYY-MM"）
+    """
+    current_date = current_date or datetime.now()
+    monday, _ = get_current_week_range(current_date)
+    week_dates = [monday + timedelta(days=day) for day in range(7)]
+
+    plan = {
+        "apollo_week": get_week_url(current_date),
+        "apollo_month": get_month_url(current_date),
+        "tomato_week": {},
+        "tomato_month": {},
+        "tomato_pages": {},
+        "monday": monday,
+        "month": current_date.strftime('%Y-%m'),
+    }
+    for clinic_id in TOMATO_CLINICS:
+        plan["tomato_week"][clinic_id] = [
+            (day, get_tomato_month_url(clinic_id, day.year, day.month)) for day in week_dates
+        ]
+        plan["tomato_month"][clinic_id] = get_tomato_month_url(
+            clinic_id, current_date.year, current_date.month
+        )
+        for day in week_dates + [current_date]:
+            page_url = get_tomato_month_url(clinic_id, day.year, day.month)
+            plan["tomato_pages"][page_url] = (clinic_id, day.strftime('%Y-%m'))
+
+    # dict.fromkeys で順序を保ったまま重複を除く
+    plan["apollo_urls"] = list(dict.fromkeys([plan["apollo_week"], plan["apollo_month"]]))
+    plan["tomato_urls"] = list(dict.fromkeys(
+        [url for days in plan["tomato_week"].values() for _, url in days]
+        + list(plan["tomato_month"].values())
+    ))
+    return plan
+
+def get_app_dir():
+    """
+    アプリケーションの配置ディレクトリを返します（実行ファイルの場合はexeの場所）。
+    """
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+def get_installed_chrome_version():
+    """
+    インストールされているChromeのバージョン（例: "130.0.6723.91"）を返します。
+    ネットワークは使いません。取得できない場合は None を返します。
+    """
+    if sys.platform.startswith("win"):
+        import winreg
+        for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+            try:
+                with winreg.OpenKey(root, r"Software\Google\Chrome\BLBeacon") as key:
+                    return winreg.QueryValueEx(key, "version")[0]
+            except OSError:
+                continue
+        return None
+
+    for command in (
+        ["google-chrome", "--version"],
+        ["google-chrome-stable", "--version"],
+        ["chromium", "--version"],
+        ["chromium-browser", "--version"],
+        ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome", "--version"],
+    ):
+        version = get_binary_version(command)
+        if version:
+            return version
+    return None
+
+def get_binary_version(command):
+    """
+    command を実行し、出力に含まれるバージョン番号を返します。失敗した場合は None です。
+    """
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"(\d+)\.\d+\.\d+(\.\d+)?", output)
+    return match.group(0) if match else None
+
+def find_cached_chrome_driver(cache_dir, driver_name, major_version=None):
+    """
+    キャッシュ済みのChromeDriverを探します。
+    major_version を指定した場合はそのメジャーバージョンのみ、省略した場合は最新のものを返します。
+    """
+    if not os.path.isdir(cache_dir):
+        return None
+    versions = sorted((int(name) for name in os.listdir(cache_dir) if name.isdigit()), reverse=True)
+    for version in versions:
+        if major_version is not None and version != major_version:
+            continue
+        driver_path = os.path.join(cache_dir, str(version), driver_name)
+        if os.path.isfile(driver_path):
+            return driver_path
+    return None
 
 def get_chrome_driver_path():
     """
     実行環境に応じて適切なChromeDriverのパスを取得します。
+    インストール済みChromeのメジャーバージョンごとに固定のディレクトリへキャッシュし、
+    そのバージョン用のドライバがあればネットワークを使わずに起動します。
+    ダウンロードするのはChromeのメジャーバージョンが変わった場合だけです。
+    ダウンロードしたドライバのメジャーバージョンがChromeと一致しない場合はキャッシュせず、
+    次回の起動でもう一度ダウンロードします。
     """
     try:
-        # 一時ディレクトリを作成
-        temp_dir = tempfile.mkdtemp()
-        logging.info(f"一時ディレクトリを作成: {temp_dir}")
-        
+        cache_dir = os.path.join(get_app_dir(), CONFIG["driver_cache_dir"])
+        driver_name = "chromedriver.exe" if os.name == "nt" else "chromedriver"
+
+        chrome_version = get_installed_chrome_version()
+        logging.info(f"Chromeバージョン: {chrome_version}")
+        chrome_major = int(chrome_version.split(".")[0]) if chrome_version else None
+
+        # Chromeのバージョンが分からない場合は最新のキャッシュを使用
+        cached_path = find_cached_chrome_driver(cache_dir, driver_name, chrome_major)
+        if cached_path:
+            logging.info(f"キャッシュ済みChromeDriverを使用: {cached_path}")
+            return cached_path
+
         # ChromeDriverをダウンロード
         chromedriver_path = ChromeDriverManager().install()
         logging.info(f"ChromeDriverをダウンロード: {chromedriver_path}")
-        
-        if getattr(sys, 'frozen', False):
-            # 実行ファイルとして実行されている場合
-            # ダウンロードしたドライバーを一時ディレクトリにコピー
-            target_path = os.path.join(temp_dir, "chromedriver.exe")
-            shutil.copy2(chromedriver_path, target_path)
-            logging.info(f"ChromeDriverを一時ディレクトリにコピー: {target_path}")
-            return target_path
-        else:
-            # 通常のPythonスクリプトとして実行されている場合
+
+        # ドライバ自身のメジャーバージョンでキャッシュする
+        driver_version = get_binary_version([chromedriver_path, "--version"])
+        driver_major = int(driver_version.split(".")[0]) if driver_version else None
+        if driver_major is None or (chrome_major is not None and driver_major != chrome_major):
+            # 一致しないドライバをキャッシュすると、以後の起動で使われ続けて再ダウンロードされない
+            logging.warning(
+                f"ChromeDriver {driver_version or '（バージョン不明）'} はChrome {chrome_version} と一致しないためキャッシュしません"
+            )
             return chromedriver_path
+
+        target_dir = os.path.join(cache_dir, str(driver_major))
+        os.makedirs(target_dir, exist_ok=True)
+        target_path = os.path.join(target_dir, driver_name)
+        shutil.copy2(chromedriver_path, target_path)
+        logging.info(f"ChromeDriverをキャッシュ: {target_path}")
+        return target_path
     except Exception as e:
         logging.error(f"ChromeDriverの設定中にエラーが発生: {str(e)}")
         raise
 
+# 取得タスクを並列実行するスレッドプール
+fetch_executor = ThreadPoolExecutor(max_workers=CONFIG["fetch_workers"], thread_name_prefix="fetch")
+
+# 1つのドライバを複数スレッドから同時に操作しないためのロック
+# （Seleniumバックエンドでは tomato の全クリニックのページがこのロックで順番に読み込まれる）
+apollo_driver_lock = threading.Lock()
+tomato_driver_lock = threading.Lock()
+
+def run_tasks_concurrently(tasks, timeout=None, return_exceptions=False):
+    """
+    独立した取得タスクを並列に実行し、結果を {タスク名: 戻り値} で返します。
+    tasks: {タスク名: 引数なしの関数}
+    各タスクは開始から timeout 秒以内に終わらなければタイムアウトとみなします。
+    失敗・タイムアウトしたタスクがあれば、その例外を送出します。
+    return_exceptions が True の場合は送出せず、例外を戻り値の代わりに格納します。
+    """
+    timeout = CONFIG["task_timeout"] if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    futures = {name: fetch_executor.submit(cycle_profiler.wrap(task)) for name, task in tasks.items()}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            error = TimeoutError(f"取得タスク {name} が{timeout}秒以内に完了しませんでした")
+            if not return_exceptions:
+                raise error
+            results[name] = error
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[name] = e
+    return results
+
+def snapshot_current_page(driver):
+    """
+    表示中のページのスナップショットを取得します。
+    selenium_extraction が "element" の場合はページソースを解析して作成します。
+    """
+    if use_bulk_extraction():
+        return extract_page_snapshot(driver)
+    page_source = driver.page_source
+    return build_page_snapshot(parse_html(page_source), page_source)
+
+def load_page_selenium(driver, url, locator, label):
+    """
+    ページを読み込んで読み込み完了を待ち、スナップショットを返します。
+    ログイン画面に戻された場合は SessionExpiredError を、
+    page_ready_timeout 秒以内に読み込みが完了しない場合は TimeoutException を送出します。
+    """
+    # getは同一URLでも再読み込みするためrefreshは不要
+    with timed_stage("navigate", site=label):
+        driver.get(url)
+    try:
+        # 読み込み途中のページは集計に使わず、取得の失敗として前回の結果を残す
+        wait_for_page_ready(driver, locator, label, required=True)
+    except TimeoutException:
+        # ログイン画面に戻された場合は目的の要素が現れないため、先にセッション切れを確認する
+        if driver_on_login_page(driver):
+            raise SessionExpiredError(url)
+        raise
+    if driver_on_login_page(driver):
+        raise SessionExpiredError(url)
+    with timed_stage("extract", site=label):
+        snapshot = snapshot_current_page(driver)
+    resource_blocker.drain(driver, label)
+    count_browser_page(driver)
+    metrics.inc("weekgoal_pages_total", site=label)
+    metrics.set("weekgoal_last_success_timestamp_seconds", time.time(), source=label)
+    return snapshot
+
+# -------------------------------
+# 監視モード（ページを読み込み直さず、変化した部分だけを受け取る）
+# -------------------------------
+# サイトごとのタブに WATCH_SCRIPT を入れ、監視するページをタブ内で fetch + DOMParser で読み込んだ
+# 文書（描画しない）として保持します。文書はページごとに取得元の間隔（refresh_intervals）で、
+# 次の取得の watch_prefetch 秒前にタブ内で取り直し、内容が変わった td だけを差し替えます。MutationObserver が差し替えを合計行・クリニックのセル・
+# 日付のセル（予約の<a>）に分類し、Python には前回から変わった項目だけを返します。
+# テキストは textContent で読むため、HTTPバックエンド（build_page_snapshot）と同じ値になります。
+
+# 引数: URL, このページの取得間隔（秒）, 次の取得の何秒前に取り直すか, 全体を返させるかどうか,
+#       このタブで監視を続けるURLの一覧（今の取得計画）
+# 戻り値: 変わった項目だけのスナップショット（full が true の場合は全体）、
+#         または {expired: true}（ログイン画面）・{error: ...}・{foreign: true}（別のサイトのタブ）
+WATCH_SCRIPT = r"""
+var url = arguments[0], interval = arguments[1] * 1000, prefetch = arguments[2] * 1000;
+var reset = arguments[3], keep = arguments[4];
+var done = arguments[arguments.length - 1];
+var W = window.__weekgoalWatch;
+if (!W) {
+  W = window.__weekgoalWatch = {pages: {}};
+  var spanTexts = function (el) {
+    return Array.prototype.map.call(el.getElementsByTagName('span'), function (s) { return s.textContent; });
+  };
+  var isTotalsRow = function (tr) {
+    return Array.prototype.some.call(tr.children, function (td) {
+      return td.tagName === 'TD' && td.getAttribute('class') === 'total';
+    });
+  };
+  W.totalCells = function (doc) {
+    var row = Array.prototype.filter.call(doc.getElementsByTagName('tr'), isTotalsRow)[0];
+    if (!row) { return []; }
+    return Array.prototype.filter.call(row.getElementsByTagName('td'), function (td) {
+      return td.getAttribute('class') === 'total sticky';
+    }).map(spanTexts);
+  };
+  W.clinics = function (doc) {
+    var clinics = [];
+    Array.prototype.forEach.call(doc.getElementsByClassName('clinic'), function (cell) {
+      var link = cell.getElementsByTagName('a')[0];
+      if (link) { clinics.push([link.textContent.trim(), spanTexts(cell)]); }
+    });
+    return clinics;
+  };
+  W.days = function (doc) {
+    var days = {};
+    Array.prototype.forEach.call(doc.getElementsByTagName('td'), function (td) {
+      var dates = [];
+      td.querySelectorAll('a[href]').forEach(function (a) {
+        (a.getAttribute('href').match(/\d{4}-\d{2}-\d{2}/g) || []).forEach(function (d) {
+          if (!(d in days) && dates.indexOf(d) === -1) { dates.push(d); }
+        });
+      });
+      if (!dates.length) { return; }
+      var reservations = [];
+      td.querySelectorAll('p[class^="rest"] > a').forEach(function (a) {
+        reservations.push([a.textContent, a.outerHTML.indexOf('fa fa-wifi') !== -1]);
+      });
+      dates.forEach(function (d) { days[d] = reservations; });
+    });
+    return days;
+  };
+  W.anchors = function (doc) {
+    var anchors = [];
+    Array.prototype.forEach.call(doc.getElementsByTagName('a'), function (a) {
+      var outer = a.outerHTML;
+      var wifi = outer.indexOf('fa fa-wifi') !== -1;
+      var mikei = outer.indexOf('大[残未計]') !== -1;
+      if (wifi || mikei) { anchors.push([wifi, mikei]); }
+    });
+    return anchors;
+  };
+  W.bigCount = function (html) {
+    var big = html.match(/\[大\](\d+)/);
+    return big ? parseInt(big[1], 10) : 0;
+  };
+  // 変化を合計行・クリニックのセル・日付のセル（予約の<a>）に分類する
+  W.classify = function (page, records) {
+    records.forEach(function (record) {
+      var node = record.target.nodeType === 1 ? record.target : record.target.parentNode;
+      var td = node && node.closest ? node.closest('td') : null;
+      if (!td) { page.full = true; return; }
+      if (td.parentNode && isTotalsRow(td.parentNode)) { page.changed.totals = true; }
+      if (td.classList.contains('clinic') || td.getElementsByClassName('clinic').length) { page.changed.clinics = true; }
+      if (td.getElementsByTagName('a').length || record.removedNodes.length) {
+        page.changed.days = true;
+        page.changed.anchors = true;
+      }
+    });
+  };
+  W.observe = function (page) {
+    page.observer = new MutationObserver(function (records) { W.classify(page, records); });
+    page.observer.observe(page.doc, {subtree: true, childList: true, characterData: true, attributes: true});
+  };
+  // 内容が変わった td だけを差し替える。td の外や表の構成が変わった場合は文書ごと置き換える
+  W.patch = function (page, doc) {
+    var oldTds = page.doc.getElementsByTagName('td'), newTds = doc.getElementsByTagName('td');
+    if (oldTds.length === newTds.length) {
+      for (var i = 0; i < newTds.length; i++) {
+        if (oldTds[i].innerHTML !== newTds[i].innerHTML) { oldTds[i].innerHTML = newTds[i].innerHTML; }
+      }
+      if (page.doc.documentElement.outerHTML === doc.documentElement.outerHTML) { return; }
+    }
+    page.observer.disconnect();
+    page.doc = doc;
+    page.full = true;
+    W.observe(page);
+  };
+  W.refresh = function (page) {
+    if (!page.pending) {
+      page.pending = fetch(page.url, {credentials: 'same-origin', cache: 'no-store'}).then(function (response) {
+        return response.text().then(function (html) {
+          if (response.url.indexOf('/LOGIN/') !== -1 || html.indexOf('name="pass"') !== -1) {
+            page.expired = true;
+            return;
+          }
+          page.fetchedAt = Date.now();
+          if (html === page.html) { return; }
+          var big = W.bigCount(html);
+          if (big !== page.bigCount) { page.bigCount = big; page.changed.big = true; }
+          page.html = html;
+          var doc = new DOMParser().parseFromString(html, 'text/html');
+          if (!page.doc) {
+            page.doc = doc;
+            page.full = true;
+            W.observe(page);
+          } else {
+            W.patch(page, doc);
+          }
+        });
+      }).catch(function (e) {
+        page.error = String(e);
+      }).then(function () {
+        page.pending = null;
+      });
+    }
+    return page.pending;
+  };
+  W.drain = function (page) {
+    if (page.observer) { W.classify(page, page.observer.takeRecords()); }
+    if (page.expired) { page.expired = false; return {expired: true}; }
+    if (page.error) { var error = page.error; page.error = null; return {error: error}; }
+    var changed = page.changed, delta = {}, full = page.full;
+    page.changed = {};
+    page.full = false;
+    if (full) {
+      delta = {full: true, total_cells: W.totalCells(page.doc), clinics: W.clinics(page.doc),
+               days: W.days(page.doc), anchors: W.anchors(page.doc), big_count: page.bigCount};
+      page.lastDays = {};
+      Object.keys(delta.days).forEach(function (d) { page.lastDays[d] = JSON.stringify(delta.days[d]); });
+      return delta;
+    }
+    if (changed.totals) { delta.total_cells = W.totalCells(page.doc); }
+    if (changed.clinics) { delta.clinics = W.clinics(page.doc); }
+    if (changed.anchors) { delta.anchors = W.anchors(page.doc); }
+    if (changed.big) { delta.big_count = page.bigCount; }
+    if (changed.days) {
+      // 予約の内容が前回返したときから変わった日だけを返す
+      var days = W.days(page.doc), changedDays = {};
+      Object.keys(days).forEach(function (d) {
+        var text = JSON.stringify(days[d]);
+        if (page.lastDays[d] !== text) { changedDays[d] = days[d]; page.lastDays[d] = text; }
+      });
+      if (Object.keys(changedDays).length) { delta.days = changedDays; }
+    }
+    return delta;
+  };
+}
+if (new URL(url, location.href).origin !== location.origin) { done({foreign: true}); return; }
+// 今の取得計画にないページ（過ぎた週・月など）は監視をやめる
+Object.keys(W.pages).forEach(function (key) {
+  if (keep.indexOf(key) === -1) {
+    if (W.pages[key].observer) { W.pages[key].observer.disconnect(); }
+    clearTimeout(W.pages[key].timer);
+    delete W.pages[key];
+  }
+});
+var page = W.pages[url];
+if (!page) { page = W.pages[url] = {url: url, changed: {}, lastDays: {}, bigCount: 0}; }
+if (reset && page.doc) { page.full = true; }
+// 次の取得の少し前にこのページだけタブ内で取り直しておく（次の取得では変化の受け取りだけで済む）
+// ページごとに取得元の間隔で1回だけ取り直すため、サイトへのリクエスト数は読み込み直す場合と変わらない
+clearTimeout(page.timer);
+page.timer = setTimeout(function () { W.refresh(page); }, Math.max(interval - prefetch, interval / 2));
+var fresh = page.fetchedAt && Date.now() - page.fetchedAt < prefetch;
+(fresh ? Promise.resolve() : W.refresh(page)).then(function () { done(W.drain(page)); });
+"""
+
+def use_watch_mode():
+    """
+    Seleniumバックエンドで監視モード（ページを読み込み直さない取得）を使うかどうかを返します。
+    """
+    return CONFIG["selenium_watch"] and CONFIG["extraction_backend"] == "selenium"
+
+class PageWatcher:
+    """
+    監視モードで、WATCH_SCRIPT から受け取った変化を前回のスナップショットに反映して保持します。
+    タブが別のページに移動した（再ログインなど）場合やドライバが入れ替わった場合は、
+    スクリプトを入れ直して全体を受け取り直します。
+    """
+
+    def __init__(self):
+        self.snapshots = {}  # URL -> 変化を反映済みのスナップショット
+
+    def _drain(self, driver, url, keep_urls, interval):
+        return driver.execute_async_script(
+            WATCH_SCRIPT, url, interval, CONFIG["watch_prefetch"], url not in self.snapshots, list(keep_urls)
+        )
+
+    def snapshot(self, driver, url, label, keep_urls, interval):
+        """
+        url の最新のスナップショットを返します。
+        keep_urls は同じタブで監視を続けるURL（今の取得計画のこのサイトのページ）で、
+        それ以外のページはタブ内でも Python 側でも破棄します。
+        interval はこのページの取得元の取得間隔（秒）で、タブ内ではこの間隔でページを取り直します。
+        ログイン画面に戻された場合は SessionExpiredError を送出します。
+        """
+        for old_url in [old_url for old_url in self.snapshots if old_url not in keep_urls]:
+            del self.snapshots[old_url]
+        with timed_stage("extract", site=label):
+            delta = self._drain(driver, url, keep_urls, interval)
+            if delta.get("foreign"):
+                # タブが対象のサイトを開いていない場合は一度だけ移動する
+                with timed_stage("navigate", site=label):
+                    driver.get(url)
+                wait_for_page_ready(driver, label=label, required=True)
+                if driver_on_login_page(driver):
+                    raise SessionExpiredError(url)
+                delta = self._drain(driver, url, keep_urls, interval)
+        if delta.get("expired"):
+            raise SessionExpiredError(url)
+        if "error" in delta:
+            raise RuntimeError(f"監視中のページの取得に失敗しました: {url}: {delta['error']}")
+
+        previous = self.snapshots.get(url)
+        if delta.pop("full", False) or previous is None:
+            snapshot = delta
+        else:
+            snapshot = dict(previous, **{key: value for key, value in delta.items() if key != "days"})
+            if "days" in delta:
+                snapshot["days"] = dict(previous["days"], **delta["days"])
+        self.snapshots[url] = snapshot
+        metrics.inc("weekgoal_watch_drains_total", site=label, changed="yes" if delta else "no")
+        metrics.inc("weekgoal_pages_total", site=label)
+        metrics.set("weekgoal_last_success_timestamp_seconds", time.time(), source=label)
+        return snapshot
+
+page_watcher = PageWatcher()
+
+# -------------------------------
+# 更新スケジュール（取得元ごとの間隔・時計合わせ・失敗時の待機）
+# -------------------------------
+
+def plan_sources(plan):
+    """
+    取得計画を取得元ごとに分け、{取得元: (サイト, [URL, ...])} で返します。
+    取得元は apollo_week、apollo_month と tomato の各クリニック（"tomato:ID"）です。
+    """
+    sources = {
+        "apollo_week": ("apollo", [plan["apollo_week"]]),
+        "apollo_month": ("apollo", [plan["apollo_month"]]),
+    }
+    for clinic_id, url in plan["tomato_month"].items():
+        urls = [url] + [day_url for _, day_url in plan["tomato_week"][clinic_id]]
+        sources[f"tomato:{clinic_id}"] = ("tomato", list(dict.fromkeys(urls)))
+    return sources
+
+class RefreshScheduler:
+    """
+    取得元ごとに次の取得時刻を管理します。
+    取得は refresh_intervals の間隔で時計の区切り（60秒なら毎分0秒）に合わせて行い、
+    取得が次の区切りを過ぎた場合は、その区切りを飛ばして次の区切りで取得します。
+    失敗した取得元だけ、間隔を倍々に延ばし（上限 refresh_backoff_max 秒）、ゆらぎを加えて再試行します。
+    """
+
+    def __init__(self):
+        self.next_run = {}  # 取得元 -> 次の取得時刻（UNIX時間）
+        self.failures = {}  # 取得元 -> 連続失敗回数
+
+    def interval(self, source):
+        kind = source.split(":")[0]
+        return CONFIG["refresh_intervals"].get(kind, DEFAULT_CONFIG["refresh_intervals"][kind])
+
+    def due_sources(self, sources, snapshots, now=None):
+        """
+        取得時刻になった取得元と、まだ取得していないページを含む取得元を返します。
+        失敗して再試行を待っている取得元は、未取得のページがあっても待機時間が過ぎるまで返しません。
+        """
+        now = time.time() if now is None else now
+        return [
+            source for source, (_, urls) in sources.items()
+            if self.next_run.get(source, 0) <= now
+            or (source not in self.failures and any(url not in snapshots for url in urls))
+        ]
+
+    def mark_success(self, source, started, finished=None):
+        finished = time.time() if finished is None else finished
+        interval = self.interval(source)
+        self.failures.pop(source, None)
+        next_run = (started // interval + 1) * interval
+        if finished > next_run:
+            logging.warning(f"{source}: 取得が間隔（{interval}秒）を超えたため次の区切りを飛ばします")
+            next_run = (finished // interval + 1) * interval
+        self.next_run[source] = next_run
+
+    def mark_failure(self, source, finished=None):
+        finished = time.time() if finished is None else finished
+        failures = self.failures[source] = self.failures.get(source, 0) + 1
+        delay = min(self.interval(source) * 2 ** (failures - 1), CONFIG["refresh_backoff_max"])
+        delay = random.uniform(delay / 2, delay)  # 同時に失敗した取得元の再試行をずらす
+        self.next_run[source] = finished + delay
+        logging.warning(f"{source}: 取得失敗（{failures}回連続）、{delay:.0f}秒後に再試行します")
+
+    def seconds_until_next(self, now=None, minimum=1.0):
+        now = time.time() if now is None else now
+        if not self.next_run:
+            return minimum
+        return max(minimum, min(self.next_run.values()) - now)
+
+
+class SourceFetchError(Exception):
+    """
+    まだ一度も取得できていない取得元があり、集計できないことを表します。
+    取得したページが集計できない形式の場合にも、取得タスクがこの例外で取得元の失敗にします。
+    """
+
+
+class SourceCache:
+    """
+    取得元ごとの最後に成功した結果を保持します（stale-while-revalidate）。
+    取得中・失敗中の取得元は前回のページのまま集計し、取得の完了を待たずに表示を更新します。
+    """
+
+    def __init__(self):
+        self.snapshots = {}  # URL -> 最後に取得できたスナップショット
+        self.fetched_at = {}  # 取得元 -> 最後に成功した時刻（UNIX時間）
+        self.errors = {}  # 取得元 -> 直近の失敗内容（成功すると消える）
+        self.inflight = {}  # 取得元 -> (開始時刻, {URL: Future})
+
+    def staleness(self, source_names, scheduler, now=None):
+        """
+        取得元のうち最も古い結果の経過秒数を返します。一度も取得できていない取得元があれば inf です。
+        すべて間隔の2倍以内に取得できていて失敗もなければ None（最新）です。
+        """
+        now = time.time() if now is None else now
+        oldest = None
+        for source in source_names:
+            age = now - self.fetched_at[source] if source in self.fetched_at else float("inf")
+            if source in self.errors or age > scheduler.interval(source) * 2:
+                oldest = age if oldest is None else max(oldest, age)
+        return oldest
+
+    def tile_staleness(self, scheduler, now=None):
+        """
+        表示の区画（週間・月間のA・K）ごとの経過秒数を返します（最新の区画は None）。
+        """
+        tomato_sources = [source for source in self.fetched_at if source.startswith("tomato:")]
+        tomato_sources += [source for source in self.errors if source.startswith("tomato:")]
+        k_staleness = self.staleness(set(tomato_sources), scheduler, now)
+        return {
+            "week": {"a": self.staleness(["apollo_week"], scheduler, now), "k": k_staleness},
+            "month": {"a": self.staleness(["apollo_month"], scheduler, now), "k": k_staleness},
+        }
+
+
+def format_staleness(seconds):
+    """
+    経過秒数を表示用の文字列（例: "3分前"）にします。最新の場合は空文字、一度も取得できていない場合は "未取得" です。
+    """
+    if seconds is None:
+        return ""
+    if seconds == float("inf"):
+        return "未取得"
+    return f"{max(1, int(seconds // 60))}分前"
+
+def check_week_snapshot(snapshot, week_dates):
+    """
+    週間のapolloページの合計行が week_dates と同じ7セル（月曜日から日曜日）であることを確認し、snapshot を返します。
+    そうでない場合は SourceFetchError を送出します。取得元の失敗として待機時間を延ばして再試行し、
+    それまでは前回取得できたページで集計を続けます（集計できないページを取得結果として保持しない）。
+    """
+    if len(snapshot["total_cells"]) != len(week_dates):
+        raise SourceFetchError(
+            f"週間ページの合計行のセルが{len(snapshot['total_cells'])}個です（月曜日から日曜日の{len(week_dates)}個を想定）"
+        )
+    return snapshot
+
+def plan_page_tasks(plan, urls, apollo_site, tomato_site, use_http):
+    """
+    urls {URL: 取得元の取得間隔（秒）} のページを取得するタスクを {URL: 引数なしの関数} で返します。
+    取得間隔は監視モードでタブ内のページを取り直す間隔に使います。
+    クリニックごとのページを並列に取得するのはHTTPバックエンドだけです（site_max_parallel まで）。
+    Seleniumバックエンドではサイトごとに1つのタブ（ドライバ）を使うため、同じサイトのページは
+    クリニックが増えても順番に読み込みます（並列になるのは apollo と tomato の間だけです）。
+    週間のapolloページは check_week_snapshot で合計行のセル数を確認してから取得結果にします。
+    """
+    tasks = {}
+    for url, interval in urls.items():
+        is_apollo = url in (plan["apollo_week"], plan["apollo_month"])
+        site = apollo_site if is_apollo else tomato_site
+        if use_http:
+            tasks[url] = lambda url=url, site=site: site.run(lambda: fetch_page_http(site.client, url))
+        else:
+            lock = apollo_driver_lock if is_apollo else tomato_driver_lock
+            label = "apollo" if is_apollo else "tomato"
+            keep_urls = plan["apollo_urls"] if is_apollo else plan["tomato_urls"]
+            if not is_apollo:
+                locator = TOMATO_DAY_LINKS
+            elif url == plan["apollo_week"]:
+                locator = APOLLO_TOTALS_ROW
+            else:
+                locator = APOLLO_CLINIC_CELLS
+
+            def task(url=url, site=site, lock=lock, locator=locator, label=label, keep_urls=keep_urls, interval=interval):
+                with lock:
+                    if use_watch_mode():
+                        return site.run(lambda: page_watcher.snapshot(site.client, url, label, keep_urls, interval))
+                    return site.run(lambda: load_page_selenium(site.client, url, locator, label))
+            tasks[url] = task
+        if url == plan["apollo_week"]:
+            tasks[url] = lambda task=tasks[url], week_dates=week_date_strs(plan): check_week_snapshot(task(), week_dates)
+    return tasks
+
+def collect_scheduled(scheduler, cache, apollo_site, tomato_site, use_http, wait=None, on_stuck=None):
+    """
+    取得時刻になった取得元の取得を開始し、wait 秒（省略時は cycle_wait）まで完了を待って集計します。
+    待ち切れなかった取得はバックグラウンドで続け、次回以降に結果を取り込みます。
+    失敗した取得元は待機時間を延ばして再試行し、それまでは前回のページで集計します。
+    task_timeout を過ぎても終わらない取得があった場合は on_stuck(理由) を呼び出します
+    （Seleniumバックエンドでは ExtractionBrowserRecycler.abort を渡し、止まったブラウザを入れ替えます）。
+    取り込んだ結果がない場合は None を返します。
+    一度も取得できていないページがあり集計できない場合は SourceFetchError を送出します。
+    戻り値は (week_a_total, month_a_total, week_k_total, month_k_total) です。
+    """
+    plan = plan_cycle_fetches()
+    sources = plan_sources(plan)
+    due = [
+        source for source in scheduler.due_sources(sources, cache.snapshots)
+        if source not in cache.inflight
+    ]
+
+    # ページごとの取得間隔（複数の取得元で使うページは短いほう）
+    intervals = {}
+    for source, (_, urls) in sources.items():
+        for url in urls:
+            intervals[url] = min(intervals.get(url, float("inf")), scheduler.interval(source))
+
+    # 取得中のページは同じ Future を使い、二重に取得しない
+    running = {url: future for _, futures in cache.inflight.values() for url, future in futures.items()}
+    needed = {url: intervals[url] for source in due for url in sources[source][1] if url not in running}
+    for url, task in plan_page_tasks(plan, needed, apollo_site, tomato_site, use_http).items():
+        running[url] = fetch_executor.submit(cycle_profiler.wrap(task))
+    for source in due:
+        cache.inflight[source] = (time.time(), {url: running[url] for url in sources[source][1]})
+
+    pending = [future for _, futures in cache.inflight.values() for future in futures.values()]
+    if pending:
+        wait_futures(pending, timeout=CONFIG["cycle_wait"] if wait is None else wait)
+
+    # 完了した取得元（または task_timeout を過ぎた取得元）の結果を取り込む
+    harvested = False
+    stuck = []
+    now = time.time()
+    for source, (started, futures) in list(cache.inflight.items()):
+        timed_out = now - started > CONFIG["task_timeout"]
+        if not timed_out and not all(future.done() for future in futures.values()):
+            continue
+        del cache.inflight[source]
+        harvested = True
+        errors = []
+        for url, future in futures.items():
+            if not future.done():
+                errors.append(TimeoutError(f"{url} が{CONFIG['task_timeout']}秒以内に完了しませんでした"))
+                stuck.append(url)
+            elif future.exception() is not None:
+                errors.append(future.exception())
+            else:
+                cache.snapshots[url] = future.result()
+        if errors:
+            scheduler.mark_failure(source, now)
+            cache.errors[source] = str(errors[0])
+        else:
+            scheduler.mark_success(source, started, now)
+            cache.fetched_at[source] = now
+            cache.errors.pop(source, None)
+    if stuck and on_stuck is not None:
+        # 止まった取得はドライバのロックを持ったままのため、次の取得やブラウザの入れ替えが待たされないよう止める
+        on_stuck(f"取得タスクのタイムアウト: {stuck[0]}")
+    if not harvested:
+        return None
+    for source in sources:
+        metrics.set("weekgoal_source_failing", int(source in cache.errors), source=source)
+
+    # 今の計画で使わなくなったページ・取得元（前の週・月、登録から外れたクリニック）は保持しない
+    plan_urls = set(plan["apollo_urls"]) | set(plan["tomato_urls"])
+    for url in [url for url in cache.snapshots if url not in plan_urls]:
+        del cache.snapshots[url]
+    for table in (cache.fetched_at, cache.errors):
+        for source in [source for source in table if source not in sources]:
+            del table[source]
+
+    missing = [url for url in plan_urls if url not in cache.snapshots]
+    if missing:
+        raise SourceFetchError(
+            f"未取得のページが{len(missing)}件あります: "
+            + ", ".join(f"{source}: {error}" for source, error in cache.errors.items())
+        )
+    if cache.errors:
+        logging.warning(f"前回の結果で表示している取得元: {', '.join(cache.errors)}")
+    with timed_stage("aggregate"):
+        return aggregate_cycle_incremental(plan, cache.snapshots, day_count_cache)
+
+class RefreshLoop:
+    """
+    更新ループの状態（取得時刻・取得済みページ・時系列の記録先・表示先）を持ち、1周期分の処理を実行します。
+    main.py の更新ループと load_simulator.py はどちらも run_cycle で周期を実行します。
+    dashboard_state を渡した場合はダッシュボードへ配信し、それ以外は結果HTMLを書き出して
+    display_driver（設定されている場合）の表示中のタブを再読み込みします。
+    """
+    week_filename = "week_result.html"
+    month_filename = "month_result.html"
+
+    def __init__(self, apollo_site, tomato_site, use_http, history_store=None, dashboard_state=None, on_stuck=None):
+        self.apollo_site = apollo_site
+        self.tomato_site = tomato_site
+        self.use_http = use_http
+        self.history_store = history_store
+        self.dashboard_state = dashboard_state
+        self.on_stuck = on_stuck
+        # 取得元ごとの取得時刻と、最後に取得できたページ（取得中・失敗中の取得元の集計に使用）
+        self.scheduler = RefreshScheduler()
+        self.cache = SourceCache()
+        self.display_driver = None
+        self.week_path = "file:///" + os.path.abspath(self.week_filename)
+        self.month_path = "file:///" + os.path.abspath(self.month_filename)
+
+    def run_cycle(self, wait=None):
+        """
+        取得時刻になった取得元を取得して集計し、時系列の記録・表示の更新・メトリクスの書き出しまでを行います。
+        wait は collect_scheduled に渡します。取り込んだ結果がない場合は None を返します。
+        戻り値は (week_a_total, month_a_total, week_k_total, month_k_total) です。
+        """
+        cycle_started = time.perf_counter()
+        with timed_stage("collect"):
+            totals = collect_scheduled(
+                self.scheduler, self.cache, self.apollo_site, self.tomato_site, self.use_http,
+                wait=wait, on_stuck=self.on_stuck
+            )
+        if totals is None:
+            return None
+        week_a_total, month_a_total, week_k_total, month_k_total = totals
+        staleness_now = time.time()
+        staleness = self.cache.tile_staleness(self.scheduler, staleness_now)
+        with timed_stage("history"):
+            record_cycle_history(self.history_store, totals)
+            trends = cycle_trends(self.history_store)
+
+        if self.dashboard_state is not None:
+            # 変化があった場合だけダッシュボードへ配信
+            with timed_stage("render"):
+                published = self.dashboard_state.publish(build_dashboard_payload(
+                    week_a_total, week_k_total, month_a_total, month_k_total, trends, staleness
+                ))
+            if published:
+                print(f"更新完了 [ダッシュボード]（{time.strftime('%Y-%m-%d %H:%M:%S')}）")
+            else:
+                print(f"変化なし [ダッシュボード]（{time.strftime('%Y-%m-%d %H:%M:%S')}）")
+        else:
+            # HTMLファイルを更新（週間と月間で異なるA残込とK残込を使用）
+            # 表示内容に変化がないファイルは書き出さない
+            with timed_stage("render"):
+                week_changed = write_result_html(
+                    self.week_filename, week_a_total, week_k_total, is_week=True, staleness=staleness["week"],
+                    now=staleness_now
+                )
+                month_changed = write_result_html(
+                    self.month_filename, month_a_total, month_k_total, is_week=False, staleness=staleness["month"],
+                    now=staleness_now
+                )
+            if self.display_driver is not None:
+                self.reload_display(totals, week_changed, month_changed)
+
+        usage = None
+        if not self.use_http and CONFIG["measure_blocked_resources"]:
+            # 抽出用ブラウザで遮断したリソースと実際の転送量（この周期の分）
+            usage = resource_blocker.take_cycle_summary()
+            metrics.set("weekgoal_cycle_page_bytes", usage["transferred_bytes"], kind="transferred")
+            metrics.set("weekgoal_cycle_page_bytes", usage["saved_bytes"], kind="blocked_estimated")
+        self.print_summary(totals, trends, usage)
+        metrics.observe("weekgoal_stage_seconds", time.perf_counter() - cycle_started, stage="cycle")
+        metrics.set("weekgoal_last_success_timestamp_seconds", time.time(), source="cycle")
+        write_metrics_file()
+        return totals
+
+    def reload_display(self, totals, week_changed, month_changed):
+        """
+        表示用ブラウザの現在のタブだけを再読み込みします（キャッシュを無効化するパラメータを追加）。
+        表示中のファイルが変わっていない場合は再読み込みしません
+        （このタブはページ内のハッシュ確認を止めてあるため、再読み込みはここでの1回だけ）。
+        """
+        week_a_total, month_a_total, week_k_total, month_k_total = totals
+        # タイムスタンプを追加してキャッシュを回避
+        timestamp = int(time.time())
+        current_url = self.display_driver.current_url
+
+        if "week_result.html" in current_url and not week_changed:
+            print(f"変化なし [週間]: 表示の再読み込みを省略（{time.strftime('%Y-%m-%d %H:%M:%S')}）")
+        elif "month_result.html" in current_url and not month_changed:
+            print(f"変化なし [月間]: 表示の再読み込みを省略（{time.strftime('%Y-%m-%d %H:%M:%S')}）")
+        elif "week_result.html" in current_url:
+            # 週間データを表示
+            ak_total = week_a_total + week_k_total
+            remainder = 890 - ak_total
+
+            # 週間HTMLをリロード（キャッシュ回避のためにタイムスタンプパラメータを追加）
+            with timed_stage("display"):
+                self.display_driver.get(managed_display_url(self.week_path, timestamp))
+                count_browser_page(self.display_driver)
+
+            print(f"更新完了 [週間]: A残込 = {week_a_total}, K残込 = {week_k_total}, AK残込 = {ak_total}, 890まで {remainder}件（{time.strftime('%Y-%m-%d %H:%M:%S')}）")
+        elif "month_result.html" in current_url:
+            # 月間データを表示
+            ak_total = month_a_total + month_k_total
+            remainder = 890 - ak_total
+
+            # 月間HTMLをリロード（キャッシュ回避のためにタイムスタンプパラメータを追加）
+            with timed_stage("display"):
+                self.display_driver.get(managed_display_url(self.month_path, timestamp))
+                count_browser_page(self.display_driver)
+
+            print(f"更新完了 [月間]: A残込 = {month_a_total}, K残込 = {month_k_total}, AK残込 = {ak_total}, 890まで {remainder}件（{time.strftime('%Y-%m-%d %H:%M:%S')}）")
+
+    def print_summary(self, totals, trends, usage=None):
+        """
+        週間・月間の集計値と目標までの残り件数、クリニック別の内訳などをコンソールに表示します。
+        usage は ResourceBlocker.take_cycle_summary の結果です（計測していない場合は None）。
+        """
+        week_a_total, month_a_total, week_k_total, month_k_total = totals
+        # 週間・月間両方のデータを常に表示
+        week_ak_total = week_a_total + week_k_total
+        month_ak_total = month_a_total + month_k_total
+
+        # 目標値を読み込み
+        week_a_target, week_k_target = read_target_values()
+        month_a_target, month_k_target = read_month_target_values()
+
+        # 目標までの残り件数
+        week_a_remainder = week_a_target - week_a_total
+        week_k_remainder = week_k_target - week_k_total
+        month_a_remainder = month_a_target - month_a_total
+        month_k_remainder = month_k_target - month_k_total
+
+        print(f"週間データ: A残込 = {week_a_total}, K残込 = {week_k_total}, AK残込 = {week_ak_total}")
+        print(f"週間目標: A目標 = {week_a_target}件まで残り{week_a_remainder}件, K目標 = {week_k_target}件まで残り{week_k_remainder}件")
+        print(f"月間データ: A残込 = {month_a_total}, K残込 = {month_k_total}, AK残込 = {month_ak_total}")
+        print(f"月間目標: A目標 = {month_a_target}件まで残り{month_a_remainder}件, K目標 = {month_k_target}件まで残り{month_k_remainder}件")
+        tomato_results = day_count_cache.last_clinic_results.get("tomato", {})
+        print("クリニック別K残込: " + ", ".join(
+            f"{CLINIC_REGISTRY['tomato'][clinic_id]['name']} 週{result['week']}/月{result['month']}"
+            for clinic_id, result in tomato_results.items()
+        ))
+        if trends:
+            print(f"週間推移: {format_trend(trends['week'])}")
+            print(f"月間推移: {format_trend(trends['month'])}")
+        if usage is not None:
+            print(
+                f"リソース遮断: {usage['blocked']}件（転送 {usage['transferred_bytes'] / 1024:.0f}KB、"
+                f"節約 推定{usage['saved_bytes'] / 1024:.0f}KB）"
+            )
+        if self.cache.errors:
+            # 取得に失敗している取得元は前回の結果で表示している
+            now = time.time()
+            print("前回の結果で表示中: " + ", ".join(
+                f"{source}（{format_staleness(now - self.cache.fetched_at.get(source, -float('inf')))}）"
+                for source in self.cache.errors
+            ))
+        print("-" * 80)
+
+
+# -------------------------------
+# 過去の期間の集計（バックフィル）
+# -------------------------------
+
+# 締まった期間の集計結果の保存先（一度集計した期間は再取得しない）
+HISTORY_CACHE_FILE = os.path.join(get_app_dir(), "history_cache.json")
+
+def load_history_cache():
+    try:
+        with open(HISTORY_CACHE_FILE, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"履歴キャッシュの読み込みエラー: {e}")
+        return {}
+
+def list_periods(kind, start_date, end_date):
+    """
+    start_date から end_date までに含まれる期間の開始日（週は月曜日、月は1日）を返します。
+    """
+    if kind == "week":
+        current, _ = get_current_week_range(start_date)
+    else:
+        current = start_date.replace(day=1)
+    periods = []
+    while current <= end_date:
+        periods.append(current)
+        if kind == "week":
+            current += timedelta(days=7)
+        else:
+            current = (current + timedelta(days=32)).replace(day=1)
+    return periods
+
+def period_end(kind, period_start):
+    """
+    期間の最終日を返します。
+    """
+    if kind == "week":
+        return period_start + timedelta(days=6)
+    return (period_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+def period_urls(kind, plan):
+    """
+    期間の集計に必要なURLを (サイト, URL) で返します。
+    週は週間のapolloページと各日を含むtomatoページ、月は月間のapolloページと当月のtomatoページです。
+    """
+    if kind == "week":
+        apollo_urls = [plan["apollo_week"]]
+        tomato_urls = [url for days in plan["tomato_week"].values() for _, url in days]
+    else:
+        apollo_urls = [plan["apollo_month"]]
+        tomato_urls = list(plan["tomato_month"].values())
+    return [("apollo", url) for url in apollo_urls] + [("tomato", url) for url in dict.fromkeys(tomato_urls)]
+
+def aggregate_period(kind, plan, snapshots):
+    """
+    取得済みスナップショットから期間の (A残込, K残込) を計算します。
+    更新ループ（aggregate_cycle_incremental）と同じ update_* 関数で、期間ごとの新しい DayCountCache に集計します。
+    週は週の7日だけを、月は月間の値だけを読みます。
+    """
+    cache = DayCountCache()
+    cache.begin()
+    if kind == "week":
+        totals = sum_by_group(
+            {"tomato": update_tomato_days(cache, plan, snapshots, set(week_date_strs(plan)))},
+            {"apollo": update_apollo_week(cache, plan, snapshots)},
+        )
+    else:
+        totals = sum_by_group({
+            "apollo": update_apollo_month(cache, plan, snapshots),
+            "tomato": update_tomato_month(cache, plan, snapshots),
+        })
+    return totals["A"], totals["K"]
+
+def backfill_periods(kind, start_date, end_date, sites):
+    """
+    期間ごとのA残込・K残込を計算し、([(期間の開始日, A残込, K残込)], {URL: 例外}) を返します。
+    必要なページはすべての期間でまとめて重複なく取得し、並列数はサイトごとに制限します。
+    取得に失敗したページがあっても残りの期間は集計し、そのページを使う期間は A残込・K残込を None にします。
+    締まった期間（最終日が今日より前）の結果は履歴キャッシュに保存し、次回からは取得しません。
+    sites: {"apollo": SiteSession, "tomato": SiteSession}（HTTPセッション）
+    """
+    history = load_history_cache()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    periods = list_periods(kind, start_date, end_date)
+
+    plans = {}
+    for period_start in periods:
+        if f"{kind}:{period_start:%Y-%m-%d}" not in history:
+            plans[period_start] = plan_cycle_fetches(period_start)
+
+    # 取得が必要なページを重複なく洗い出し、一定数ずつ並列に取得
+    needed = list(dict.fromkeys(pair for plan in plans.values() for pair in period_urls(kind, plan)))
+    snapshots = {}
+    failures = {}
+    batch_size = CONFIG["fetch_workers"] * 2
+    for offset in range(0, len(needed), batch_size):
+        tasks = {
+            url: (lambda site=site, url=url: sites[site].run(lambda: fetch_page_http(sites[site].client, url)))
+            for site, url in needed[offset:offset + batch_size]
+        }
+        for url, result in run_tasks_concurrently(tasks, return_exceptions=True).items():
+            if isinstance(result, Exception):
+                logging.error(f"バックフィル: {url} の取得に失敗しました: {result}")
+                failures[url] = result
+            else:
+                snapshots[url] = result
+        logging.info(f"バックフィル: {len(snapshots)}/{len(needed)}ページ取得（失敗 {len(failures)}ページ）")
+
+    results = []
+    for period_start in periods:
+        key = f"{kind}:{period_start:%Y-%m-%d}"
+        if key in history:
+            a_total, k_total = history[key]["a_total"], history[key]["k_total"]
+        elif any(url in failures for _, url in period_urls(kind, plans[period_start])):
+            a_total = k_total = None
+        else:
+            a_total, k_total = aggregate_period(kind, plans[period_start], snapshots)
+            if period_end(kind, period_start) < today:
+                history[key] = {"a_total": a_total, "k_total": k_total}
+        results.append((period_start, a_total, k_total))
+
+    write_text_atomic(HISTORY_CACHE_FILE, json.dumps(history, ensure_ascii=False, indent=1))
+    return results, failures
+
+def run_backfill(args):
+    """
+    backfill コマンドを実行し、結果を表示（--csv 指定時はCSVにも出力）します。
+    """
+    start_date = datetime.strptime(args.start, '%Y-%m-%d')
+    end_date = datetime.strptime(args.end, '%Y-%m-%d')
+
+    sites = {
+        "apollo": SiteSession("apollo", create_http_session(), auto_login_apollo_http, get_week_url),
+        "tomato": SiteSession("tomato", create_http_session(), auto_login_tomato_http, get_tomato_check_url),
+    }
+    for site in sites.values():
+        if not site.ensure_login():
+            print(f"{site.name}へのログインに失敗しました。")
+            return 1
+
+    results, failures = backfill_periods(args.period, start_date, end_date, sites)
+    rows = []
+    for period_start, a_total, k_total in results:
+        if args.period == "week":
+            label = f"{calculate_week_number(period_start)}w（{period_start:%Y-%m-%d}〜）"
+        else:
+            label = f"{period_start:%Y-%m}"
+        if a_total is None:
+            rows.append((label, "", "", ""))
+            print(f"{label}: 取得に失敗したページがあるため集計できませんでした")
+            continue
+        rows.append((label, a_total, k_total, a_total + k_total))
+        print(f"{label}: A残込 = {a_total}, K残込 = {k_total}, AK残込 = {a_total + k_total}")
+    for url, error in failures.items():
+        print(f"取得失敗: {url}（{error}）")
+
+    if args.csv:
+        with open(args.csv, "w", encoding="utf-8-sig", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["期間", "A残込", "K残込", "AK残込"])
+            writer.writerows(rows)
+    return 1 if failures else 0
+
+def parse_command_line(argv=None):
+    """
+    コマンドライン引数を解析します。引数なしの場合は通常の表示モードです。
+    """
+    parser = argparse.ArgumentParser(description="週間・月間目標の表示")
+    parser.add_argument("--profile", type=int, metavar="N", help="最初のN周期をプロファイルする")
+    parser.add_argument("--watch", action="store_true", help="監視モードで取得する（Seleniumバックエンドのみ）")
+    subparsers = parser.add_subparsers(dest="command")
+    backfill = subparsers.add_parser("backfill", help="過去の週・月のA残込/K残込を集計")
+    backfill.add_argument("period", choices=["week", "month"])
+    backfill.add_argument("start", help="開始日（YYYY-MM-DD）")
+    backfill.add_argument("end", help="終了日（YYYY-MM-DD）")
+    backfill.add_argument("--csv", help="結果を書き出すCSVファイル")
+    return parser.parse_args(argv)
+
+def requested_profile_cycles(args):
+    """
+    起動直後にプロファイルする周期数を返します（--profile があれば設定・環境変数 WEEKGOAL_PROFILE より優先）。
+    """
+    return args.profile if args.profile is not None else CONFIG["profile_cycles"]
+
 # -------------------------------
 # メイン処理開始
 # -------------------------------
 
 if __name__ == "__main__":
+    args = parse_command_line()
+    if args.command == "backfill":
+        sys.exit(run_backfill(args))
+
     try:
         logging.info("アプリケーション開始")
+        cycle_profiler.request(requested_profile_cycles(args))
+        install_profile_signal(cycle_profiler)
+        if args.watch:
+            CONFIG["selenium_watch"] = True
         
-        # ChromeDriverのパスを取得
-        chromedriver_path = get_chrome_driver_path()
-        logging.info(f"ChromeDriverパス: {chromedriver_path}")
-        
-        # apolloサイト用ドライバの起動＆ログイン
-        headless_options = create_headless_options()
-        
-        logging.info("ChromeDriverサービス作成開始")
-        extraction_service = ChromeService(chromedriver_path)
-        extraction_driver = webdriver.Chrome(service=extraction_service, options=headless_options)
-        logging.info("ChromeDriver初期化完了")
-
-        if not auto_login_apollo(extraction_driver):
-            logging.error("Apolloログイン失敗")
-            extraction_driver.quit()
-            exit(1)
-        logging.info("Apolloログイン成功")
-
-        # 現在の週のURLを取得
-        target_url = get_week_url()
-        extraction_driver.get(target_url)
-        logging.info(f"Apollo URL取得成功: {target_url}")
-
-        # tomatoサイト用ドライバの起動＆ログイン
-        tomato_service = Service(chromedriver_path)
-        tomato_driver = webdriver.Chrome(service=tomato_service, options=headless_options)
-        logging.info("Tomato ChromeDriver初期化完了")
-
-        if not auto_login_tomato(tomato_driver):
-            logging.error("Tomatoログイン失敗")
-            extraction_driver.quit()
-            tomato_driver.quit()
-            exit(1)
-        logging.info("Tomatoログイン成功")
+        use_http_backend = CONFIG["extraction_backend"] == "http"
+        use_dashboard_server = CONFIG["display_mode"] == "server"
+        logging.info(f"抽出バックエンド: {CONFIG['extraction_backend']}, 表示方式: {CONFIG['display_mode']}")
+
+        # ChromeDriverのパスを取得（ブラウザを使う場合のみ）
+        if not (use_http_backend and use_dashboard_server):
+            chromedriver_path = get_chrome_driver_path()
+            logging.info(f"ChromeDriverパス: {chromedriver_path}")
+
+        if use_http_backend:
+            # HTTPセッションでapollo・tomatoにログイン（ブラウザを起動しない）
+            apollo_site = SiteSession("apollo", create_http_session(), auto_login_apollo_http, get_week_url)
+            if not apollo_site.ensure_login():
+                logging.error("Apolloログイン失敗")
+                exit(1)
+            logging.info("Apolloログイン成功")
+
+            tomato_site = SiteSession("tomato", create_http_session(), auto_login_tomato_http, get_tomato_check_url)
+            if not tomato_site.ensure_login():
+                logging.error("Tomatoログイン失敗")
+                exit(1)
+            logging.info("Tomatoログイン成功")
+        else:
+            # apollo・tomatoで1つのヘッドレスブラウザを共有（タブを分ける）
+            logging.info("ChromeDriverサービス作成開始")
+            headless_browser = SharedHeadlessBrowser(chromedriver_path)
+
+            # apolloサイト用ドライバの起動＆ログイン
+            extraction_driver = headless_browser.driver("apollo")
+            logging.info("ChromeDriver初期化完了")
+
+            apollo_site = SiteSession("apollo", extraction_driver, auto_login_apollo, get_week_url)
+            if not apollo_site.ensure_login():
+                logging.error("Apolloログイン失敗")
+                headless_browser.quit()
+                exit(1)
+            logging.info("Apolloログイン成功")
+
+            # tomatoサイト用ドライバの起動＆ログイン
+            tomato_driver = headless_browser.driver("tomato")
+            logging.info("Tomato ChromeDriver初期化完了")
+
+            tomato_site = SiteSession("tomato", tomato_driver, auto_login_tomato, get_tomato_check_url)
+            if not tomato_site.ensure_login():
+                logging.error("Tomatoログイン失敗")
+                headless_browser.quit()
+                exit(1)
+            logging.info("Tomatoログイン成功")
+
+            # メモリ使用量・ページ数・起動時間が上限を超えたら予備のブラウザと入れ替える
+            browser_recycler = ExtractionBrowserRecycler(
+                chromedriver_path, headless_browser, {"apollo": apollo_site, "tomato": tomato_site}
+            )
 
         # ④ HTML表示用ドライバの設定（非ヘッドレスモード）
-        week_filename = "week_result.html"
-        month_filename = "month_result.html"
-        week_path = "file:///" + os.path.abspath(week_filename)
-        month_path = "file:///" + os.path.abspath(month_filename)
+        if use_dashboard_server:
+            # ライブ更新ダッシュボード（表示用ブラウザはWebDriverで操作しない）
+            dashboard_state = DashboardState()
+            start_dashboard_server(dashboard_state)
+            dashboard_url = f"http://127.0.0.1:{CONFIG['dashboard_port']}/"
+        else:
+            dashboard_state = None
+            display_service = Service(chromedriver_path)
+            display_options = create_display_options()
+            display_driver = webdriver.Chrome(service=display_service, options=display_options)
+            logging.info("表示用ChromeDriver初期化完了")
+
+        # 集計値の時系列記録（推移・ペースの表示に使用）
+        history_store = TimeSeriesStore() if CONFIG["history_db"] else None
 
-        display_service = Service(chromedriver_path)
-        display_options = create_display_options()
-        display_driver = webdriver.Chrome(service=display_service, options=display_options)
-        logging.info("表示用ChromeDriver初期化完了")
+        # 取得・集計・表示の更新を1周期ずつ実行する
+        refresh_loop = RefreshLoop(
+            apollo_site, tomato_site, use_http_backend, history_store, dashboard_state,
+            on_stuck=None if use_http_backend else browser_recycler.abort
+        )
+        week_path, month_path = refresh_loop.week_path, refresh_loop.month_path
 
-        # 初期データの取得
+        # 初期データの取得（集計できるまで task_timeout 秒まで待つ）
+        # 表示用ブラウザはまだ結果HTMLを開いていないため、ここではHTMLの作成まで
         try:
-            # 週間データ取得用URL
-            target_url = get_week_url()
-            extraction_driver.get(target_url)
-            time.sleep(3)
-            week_a_total = recalc_total_week()
-            time.sleep(2)
-
-            # 月間データ取得用URL
-            month_url = get_month_url()
-            extraction_driver.get(month_url)
-            time.sleep(3)
-            month_a_total = recalc_total_month()
-            time.sleep(2)
-
-            # tomatoサイトからデータ取得（週間用）
-            current_date = datetime.now()
-            url_ueno = f"https://tomato-systemprograms1455.com/CAL/monthly.php?c=13&y={current_date.year}&m={current_date.month:02d}#cal"
-            url_kyoto = f"https://tomato-systemprograms1455.com/CAL/monthly.php?c=10&y={current_date.year}&m={current_date.month:02d}#cal"
-            
-            # 週間表示用のK残込を取得
-            _, _, UenoNet = get_oguchi_value(tomato_driver, url_ueno)
-            time.sleep(2)
-            _, _, KyotoNet = get_oguchi_value(tomato_driver, url_kyoto)
-            time.sleep(2)
-            week_k_total = UenoNet + KyotoNet
-
-            # 月間表示用のK残込を取得
-            _, _, UenoNetMonth = get_oguchi_value_month(tomato_driver, url_ueno)
-            time.sleep(2)
-            _, _, KyotoNetMonth = get_oguchi_value_month(tomato_driver, url_kyoto)
-            time.sleep(2)
-            month_k_total = UenoNetMonth + KyotoNetMonth
-
-            # 両方のHTMLファイルを作成（週間用と月間用で異なる形式）
-            with open(week_filename, "w", encoding="utf-8") as file:
-                html_content = create_html_content(week_a_total, week_k_total, is_week=True)
-                file.write(html_content)
-            with open(month_filename, "w", encoding="utf-8") as file:
-                html_content = create_html_content(month_a_total, month_k_total, is_week=False)
-                file.write(html_content)
-            
+            if refresh_loop.run_cycle(wait=CONFIG["task_timeout"]) is None:
+                raise SourceFetchError("初期データの取得が完了しませんでした")
             logging.info("初期データ取得・HTML作成完了")
         except Exception as e:
             logging.error(f"初期データ取得でエラー発生: {str(e)}")
-            # エラー時は初期表示用HTMLを作成
-            initial_html = "<html><body><h1>データ取得中にエラーが発生しました...</h1></body></html>"
-            for filename in [week_filename, month_filename]:
-                with open(filename, "w", encoding="utf-8") as file:
-                    file.write(initial_html)
-
-        # 最初のタブで週間目標を表示
-        display_driver.get(week_path)
-        time.sleep(2)
+            # 前回起動時の結果HTMLがあればそのまま表示し、ない場合だけ取得中の表示を作成
+            # （ダッシュボードは「データ取得中」のまま）
+            if not use_dashboard_server:
+                initial_html = "<html><head><meta charset=\"UTF-8\"><meta http-equiv=\"refresh\" content=\"60\"></head><body><h1>データ取得中...</h1></body></html>"
+                for filename in [refresh_loop.week_filename, refresh_loop.month_filename]:
+                    if not os.path.exists(filename):
+                        write_text_atomic(filename, initial_html)
+                    last_rendered_state.pop(filename, None)
 
-        # 新しいタブを開く
-        display_driver.execute_script("window.open('', '_blank');")
-        time.sleep(2)
-
-        # 新しいタブに切り替えて月間目標を表示
-        display_driver.switch_to.window(display_driver.window_handles[-1])
-        display_driver.get(month_path)
-        time.sleep(2)
+        if use_dashboard_server:
+            # 既定のブラウザでダッシュボードを開く（以降の更新はサーバーから配信）
+            webbrowser.open(dashboard_url)
+            logging.info(f"ダッシュボード表示: {dashboard_url}")
+        else:
+            # 最初のタブで週間目標、新しいタブで月間目標を表示
+            open_display_tabs(display_driver, week_path, month_path)
+            refresh_loop.display_driver = display_driver
+            display_started_at = time.monotonic()
+            display_slot = 0
 
-        logging.info("初期HTML表示完了")
-        logging.info(f"タブの数: {len(display_driver.window_handles)}")
+            logging.info("初期HTML表示完了")
+            logging.info(f"タブの数: {len(display_driver.window_handles)}")
 
-        # ⑤ 定期更新ループ（1分毎）
+        # ⑤ 定期更新ループ（取得元ごとの間隔）
         while True:
+            # 次に取得時刻になる取得元まで待機（取得時刻は毎分0秒などの区切りに合わせてある）
+            time.sleep(refresh_loop.scheduler.seconds_until_next())
+            # 長時間の稼働でメモリが増えたブラウザを入れ替える（取得に失敗し続けている場合も確認する）
+            try:
+                if not use_http_backend:
+                    browser_recycler.check()
+                if not use_dashboard_server:
+                    reason = browser_recycle_reason("display", [refresh_loop.display_driver], display_started_at)
+                    if reason:
+                        logging.info(f"表示用ブラウザを入れ替えます（{reason}）")
+                        refresh_loop.display_driver = recycle_display_browser(
+                            refresh_loop.display_driver, chromedriver_path, week_path, month_path, 1 - display_slot
+                        )
+                        display_slot = 1 - display_slot
+                        display_started_at = time.monotonic()
+            except Exception as e:
+                logging.error(f"ブラウザの入れ替えでエラー発生: {str(e)}")
             try:
-                # 週間データ取得用URL
-                target_url = get_week_url()
-                extraction_driver.get(target_url)
-                time.sleep(3)
-                extraction_driver.refresh()
-                time.sleep(3)
-                
-                # 週間表示用のデータ取得
-                week_a_total = recalc_total_week()
-                time.sleep(2)
-
-                # 月間データ取得用URL
-                month_url = get_month_url()
-                extraction_driver.get(month_url)
-                time.sleep(3)
-                extraction_driver.refresh()
-                time.sleep(3)
-                
-                # 月間表示用のデータ取得
-                month_a_total = recalc_total_month()
-                time.sleep(2)
-
-                # 現在の年月を更新
-                current_date = datetime.now()
-                target_year = current_date.year
-                target_month = current_date.month
-
-                # tomatoサイトのURLを更新
-                url_ueno = f"https://tomato-systemprograms1455.com/CAL/monthly.php?c=13&y={target_year}&m={target_month:02d}#cal"
-                url_kyoto = f"https://tomato-systemprograms1455.com/CAL/monthly.php?c=10&y={target_year}&m={target_month:02d}#cal"
-
-                # 週間表示用のK残込を取得
-                _, _, UenoNet = get_oguchi_value(tomato_driver, url_ueno)
-                time.sleep(2)
-                _, _, KyotoNet = get_oguchi_value(tomato_driver, url_kyoto)
-                time.sleep(2)
-                week_k_total = UenoNet + KyotoNet
-
-                # 月間表示用のK残込を取得
-                _, _, UenoNetMonth = get_oguchi_value_month(tomato_driver, url_ueno)
-                time.sleep(2)
-                _, _, KyotoNetMonth = get_oguchi_value_month(tomato_driver, url_kyoto)
-                time.sleep(2)
-                month_k_total = UenoNetMonth + KyotoNetMonth
-
-                # HTML更新前の待機
-                time.sleep(1)
-                
-                # タイムスタンプを追加してキャッシュを回避
-                timestamp = int(time.time())
-                
-                # HTMLファイルを更新（週間と月間で異なるA残込とK残込を使用）
-                with open(week_filename, "w", encoding="utf-8") as file:
-                    html_content = create_html_content(week_a_total, week_k_total, is_week=True)
-                    file.write(html_content)
-                with open(month_filename, "w", encoding="utf-8") as file:
-                    html_content = create_html_content(month_a_total, month_k_total, is_week=False)
-                    file.write(html_content)
-                time.sleep(2)
-                
-                # 現在のタブのURLとハンドルを記録
-                current_handle = display_driver.current_window_handle
-                current_url = display_driver.current_url
-                
-                # 現在のタブだけを更新（キャッシュを無効化するパラメータを追加）
-                if "week_result.html" in current_url:
-                    # 週間データを表示
-                    ak_total = week_a_total + week_k_total
-                    remainder = 890 - ak_total
-                    
-                    # 週間HTMLをリロード（キャッシュ回避のためにタイムスタンプパラメータを追加）
-                    display_driver.get(f"{week_path}?t={timestamp}")
-                    
-                    print(f"更新完了 [週間]: A残込 = {week_a_total}, K残込 = {week_k_total}, AK残込 = {ak_total}, 890まで {remainder}件（{time.strftime('%Y-%m-%d %H:%M:%S')}）")
-                elif "month_result.html" in current_url:
-                    # 月間データを表示
-                    ak_total = month_a_total + month_k_total
-                    remainder = 890 - ak_total
-                    
-                    # 月間HTMLをリロード（キャッシュ回避のためにタイムスタンプパラメータを追加）
-                    display_driver.get(f"{month_path}?t={timestamp}")
-                    
-                    print(f"更新完了 [月間]: A残込 = {month_a_total}, K残込 = {month_k_total}, AK残込 = {ak_total}, 890まで {remainder}件（{time.strftime('%Y-%m-%d %H:%M:%S')}）")
-                
-                # 週間・月間両方のデータを常に表示
-                week_ak_total = week_a_total + week_k_total
-                week_remainder = 890 - week_ak_total
-                month_ak_total = month_a_total + month_k_total
-                month_remainder = 890 - month_ak_total
-                
-                # 目標値を読み込み
-                week_a_target, week_k_target = read_target_values()
-                month_a_target, month_k_target = read_month_target_values()
-                
-                # 目標までの残り件数
-                week_a_remainder = week_a_target - week_a_total
-                week_k_remainder = week_k_target - week_k_total
-                month_a_remainder = month_a_target - month_a_total
-                month_k_remainder = month_k_target - month_k_total
-                
-                print(f"週間データ: A残込 = {week_a_total}, K残込 = {week_k_total}, AK残込 = {week_ak_total}")
-                print(f"週間目標: A目標 = {week_a_target}件まで残り{week_a_remainder}件, K目標 = {week_k_target}件まで残り{week_k_remainder}件")
-                print(f"月間データ: A残込 = {month_a_total}, K残込 = {month_k_total}, AK残込 = {month_ak_total}")
-                print(f"月間目標: A目標 = {month_a_target}件まで残り{month_a_remainder}件, K目標 = {month_k_target}件まで残り{month_k_remainder}件")
-                print("-" * 80)
-                
-                # 次の更新までの待機（55秒に短縮し、処理時間の余裕を持たせる）
-                time.sleep(55)
+                with cycle_profiler.cycle():
+                    refresh_loop.run_cycle()
             except Exception as e:
+                # 失敗した取得元は RefreshScheduler が待機時間を延ばして再試行する
+                # 表示は前回の内容のまま残す（空白や取得エラーの表示にはしない）
                 logging.error(f"メインループでエラー発生: {str(e)}")
-                time.sleep(60)  # エラー時も1分待機してから再試行
+                metrics.inc("weekgoal_cycle_errors_total", error=type(e).__name__)
+                write_metrics_file()
     except Exception as e:
         logging.error(f"重大なエラーが発生: {str(e)}")
         messagebox.showerror("エラー", f"アプリケーションの起動に失敗しました。\nエラー内容: {str(e)}\n\nログファイル {log_file} を確認してください。")
\ No newline at end of file
@@ -0,0 +1,312 @@
+"""
+apollo・tomato の代替サーバー（負荷試験・動作確認用）
+
+本番サイトと同じURL構成でログインフォームとカレンダーを返します。
+1つのポートで apollo を /apollo、tomato を /tomato 以下に配置します。
+
+    python standin_server.py --port 8900 --per-day 40 --latency 300 --jitter 200 --fail-rate 0.05
+
+main.py を接続する場合:
+    WEEKGOAL_APOLLO_URL=http://127.0.0.1:8900/apollo
+    WEEKGOAL_TOMATO_URL=http://127.0.0.1:8900/tomato
+    WEEKGOAL_BACKEND=http（Seleniumバックエンドでも可）
+
+予約データは (クリニック, 日付) ごとに乱数の種を固定して作成するため、同じページは同じ内容になります。
+--churn を指定すると、その秒数ごとに各日の予約が少しずつ入れ替わります。
+"""
+import argparse
+import html
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import main
+
+# 予約テキストの区分（実ページの予約と同じキーワード構成）
+RESERVATION_WORDS = ["包", "大", "長", "非長", "陰大", "術検", "ED", "一般", "再診", "カウンセリング"]
+
+LOGIN_BUTTONS = {
+    "apollo": '<input type="submit" name="Submit" value="ログイン">',
+    "tomato": '<input type="image" name="login" src="login.png" alt="ログイン">',
+}
+
+
+def standin_clinics(apollo_count=None, tomato_count=None):
+    """
+    代替サーバーで扱うクリニック一覧を main.py の "clinics" 設定と同じ形式で返します。
+    件数を指定しない場合は main.py の既定のクリニックを使います。
+    """
+    clinics = [dict(clinic) for clinic in main.DEFAULT_CLINICS]
+    if tomato_count is not None:
+        clinics = [c for c in clinics if c["site"] != "tomato"] + [
+            {"id": 100 + i, "name": f"K{i:03d}", "site": "tomato", "group": "K"} for i in range(tomato_count)
+        ]
+    if apollo_count is not None:
+        clinics = [c for c in clinics if c["site"] != "apollo"] + [
+            {"id": f"A院{i:03d}", "name": f"A院{i:03d}", "site": "apollo", "group": "A"} for i in range(apollo_count)
+        ]
+    return clinics
+
+
+class StandinSite:
+    """
+    代替サーバーの設定・セッション・ページ生成をまとめたものです。
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.clinics = standin_clinics(options.apollo_clinics, options.tomato_clinics)
+        self.apollo_names = [c["id"] for c in self.clinics if c["site"] == "apollo"]
+        self.apollo_names += [f"対象外{i:02d}" for i in range(options.apollo_extra)]
+        self.sessions = {}  # トークン -> (サイト, 発行時刻)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "pages": 0, "logins": 0, "redirects": 0, "failures": 0, "hangs": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    # ---- セッション ----
+
+    def login(self, site):
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[token] = (site, time.time())
+        self.count("logins")
+        return token
+
+    def is_logged_in(self, site, token):
+        with self.lock:
+            session = self.sessions.get(token)
+        if session is None or session[0] != site:
+            return False
+        return not self.options.session_ttl or time.time() - session[1] < self.options.session_ttl
+
+    # ---- 予約データ ----
+
+    def _rng(self, *key):
+        epoch = int(time.time() // self.options.churn) if self.options.churn else 0
+        return random.Random("|".join(map(str, (self.options.seed, epoch) + key)))
+
+    def _jitsu(self, *key):
+        rng = self._rng(*key)
+        planned = rng.randint(0, 60)
+        return planned, rng.randint(0, planned)
+
+    def day_reservations(self, clinic_id, day):
+        """
+        (予約テキスト, wifiフラグ, 大[残未計]フラグ) の一覧を返します。
+        """
+        rng = self._rng("tomato", clinic_id, day.strftime('%Y-%m-%d'))
+        per_day = self.options.per_day
+        reservations = []
+        for serial in range(rng.randint(per_day // 2, per_day * 3 // 2)):
+            word = rng.choice(RESERVATION_WORDS)
+            is_mikei = word in ("大", "陰大") and rng.random() < 0.1
+            text = f"{9 + serial % 10}:{serial % 2 * 30:02d} {word} 患者{serial:04d}"
+            reservations.append((text + (" 大[残未計]" if is_mikei else ""), rng.random() < 0.15, is_mikei))
+        return reservations
+
+    # ---- ページ ----
+
+    def login_page(self, site):
+        return page(
+            f'<form method="post" action="/{site}/LOGIN/">'
+            '<input type="text" name="account"><input type="password" name="pass">'
+            '<input type="hidden" name="mode" value="login">'
+            f'<p class="login">{LOGIN_BUTTONS[site]}</p></form>'
+        )
+
+    def apollo_week(self, query):
+        monday = datetime.strptime(query.get("w", [datetime.now().strftime('%Y-%m-%d')])[0], '%Y-%m-%d')
+        dates = [monday + timedelta(days=day) for day in range(7)]
+        head = "".join(f'<th class="sticky">{d.month}/{d.day}</th>' for d in dates)
+        rows = []
+        for name in self.apollo_names:
+            planned, actual = self._jitsu("apollo_month", name, monday.strftime('%Y-%m'))
+            cells = "".join(
+                "<td><span>[予]{}</span><span>[実]{}</span></td>".format(*self._jitsu("apollo_day", name, d.date()))
+                for d in dates
+            )
+            rows.append(
+                f'<tr><td class="clinic"><a href="clinic.php?n={html.escape(name)}">{html.escape(name)}</a>'
+                f'<span>[予]{planned}</span><span>[実]{actual}</span></td>{cells}</tr>'
+            )
+        totals = "".join(
+            "<td class=\"total sticky\"><span>[予]{}</span><span>[実]{}</span></td>".format(
+                *(v * 5 for v in self._jitsu("apollo_total", d.date()))
+            )
+            for d in dates
+        )
+        rows.append(f'<tr><td class="total">合計</td>{totals}<td class="total">-</td></tr>')
+        return page(f'<table><thead><tr><th>院</th>{head}</tr></thead><tbody>{"".join(rows)}</tbody></table>')
+
+    def tomato_month(self, query):
+        clinic_id = query.get("c", ["0"])[0]
+        year, month = int(query.get("y", ["2025"])[0]), int(query.get("m", ["1"])[0])
+        first = datetime(year, month, 1)
+        day = first - timedelta(days=first.weekday())
+        big_count = 0
+        rows = []
+        while day.month == month or day < first or day.weekday() != 0:
+            cells = []
+            for _ in range(7):
+                links = []
+                for serial, (text, is_wifi, _) in enumerate(self.day_reservations(clinic_id, day)):
+                    if day.month == month and any(k in text for k in main.OGUCHI_KEYWORDS):
+                        big_count += 1
+                    icon = '<i class="fa fa-wifi"></i>' if is_wifi else ""
+                    links.append(f'<p class="rest{serial % 3}"><a href="reserve.php?id={serial}">{icon}{text}</a></p>')
+                cells.append(
+                    f'<td><a href="monthly.php?c={clinic_id}&amp;date={day:%Y-%m-%d}">{day.day}</a>{"".join(links)}</td>'
+                )
+                day += timedelta(days=1)
+            rows.append("<tr>" + "".join(cells) + "</tr>")
+        return page(
+            f'<div class="summary"><span>[大]{big_count}</span></div>'
+            f'<table id="cal">{"".join(rows)}</table>'
+        )
+
+
+def page(body):
+    return f'<html><head><meta charset="UTF-8"><title>CAL</title></head><body>{body}</body></html>'
+
+
+class StandinRequestHandler(BaseHTTPRequestHandler):
+    """
+    /{apollo|tomato}/LOGIN/、/{apollo|tomato}/CAL/... と統計（/__stats）を返します。
+    """
+    site = None  # create_standin_server で設定
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        standin = self.site
+        options = standin.options
+        standin.count("requests")
+        # 接続を再利用するため、本文は応答の内容にかかわらず先に読み切る
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)) if method == "POST" else b""
+        url = urlsplit(self.path)
+        if url.path == "/__stats":
+            self._send(200, json.dumps(standin.stats).encode("utf-8"), "application/json")
+            return
+
+        # 応答遅延と障害の注入
+        delay = max(0.0, options.latency + random.uniform(-options.jitter, options.jitter)) / 1000
+        time.sleep(delay)
+        if random.random() < options.hang_rate:
+            standin.count("hangs")
+            time.sleep(options.hang_seconds)
+        if random.random() < options.fail_rate:
+            standin.count("failures")
+            self._send(503, b"Service Unavailable", "text/plain")
+            return
+
+        parts = url.path.strip("/").split("/")
+        site = parts[0] if parts else ""
+        if site not in LOGIN_BUTTONS:
+            self._send(404, b"not found", "text/plain")
+            return
+        token = self._cookie(f"{site}_sid")
+
+        if len(parts) > 1 and parts[1] == "LOGIN":
+            if method == "POST":
+                form = parse_qs(body.decode("utf-8"))
+                if form.get("account", [""])[0] and form.get("pass", [""])[0]:
+                    token = standin.login(site)
+                    self._redirect(f"/{site}/CAL/menu.php", f"{site}_sid={token}; Path=/{site}")
+                    return
+            self._send(200, standin.login_page(site).encode("utf-8"))
+            return
+
+        if not standin.is_logged_in(site, token):
+            standin.count("redirects")
+            self._redirect(f"/{site}/LOGIN/")
+            return
+
+        query = parse_qs(url.query)
+        page_name = parts[-1]
+        if site == "apollo" and page_name == "week.php":
+            content = standin.apollo_week(query)
+        elif site == "tomato" and page_name == "monthly.php":
+            content = standin.tomato_month(query)
+        else:
+            content = page(f"<p>{site} menu</p>")
+        standin.count("pages")
+        self._send(200, content.encode("utf-8"))
+
+    def _cookie(self, name):
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            key, _, value = part.strip().partition("=")
+            if key == name:
+                return value
+        return None
+
+    def _redirect(self, location, cookie=None):
+        self.send_response(302)
+        self.send_header("Location", location)
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_standin_server(options):
+    """
+    代替サーバーを作成します（serve_forever は呼び出し側で実行）。
+    """
+    handler = type("BoundStandinRequestHandler", (StandinRequestHandler,), {"site": StandinSite(options)})
+    server = ThreadingHTTPServer(("127.0.0.1", options.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def add_standin_arguments(parser):
+    """
+    代替サーバーの設定項目を引数に追加します（load_simulator.py と共通）。
+    """
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--apollo-clinics", type=int, help="apolloの対象クリニック数（省略時は既定のクリニック）")
+    parser.add_argument("--apollo-extra", type=int, default=5, help="apolloの対象外クリニック数")
+    parser.add_argument("--tomato-clinics", type=int, help="tomatoのクリニック数（省略時は既定のクリニック）")
+    parser.add_argument("--per-day", type=int, default=30, help="tomato 1日あたりの平均予約件数")
+    parser.add_argument("--latency", type=float, default=0, help="応答遅延（ミリ秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="応答遅延のばらつき（±ミリ秒）")
+    parser.add_argument("--fail-rate", type=float, default=0, help="503を返す割合")
+    parser.add_argument("--hang-rate", type=float, default=0, help="応答を hang-seconds 秒止める割合")
+    parser.add_argument("--hang-seconds", type=float, default=30)
+    parser.add_argument("--session-ttl", type=float, default=0, help="セッションの有効期間（秒、0は無期限）")
+    parser.add_argument("--churn", type=float, default=0, help="予約を入れ替える間隔（秒、0は固定）")
+    parser.add_argument("--seed", default="weekgoal")
+    return parser
+
+
+if __name__ == "__main__":
+    options = add_standin_arguments(argparse.ArgumentParser(description="apollo・tomato の代替サーバー")).parse_args()
+    server = create_standin_server(options)
+    print(f"代替サーバー起動: http://127.0.0.1:{options.port}/apollo, http://127.0.0.1:{options.port}/tomato")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,39 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+class FakeSite:
+    """
+    SiteSession の代わりに、ログインせずにそのまま関数を実行します。
+    """
+    client = None
+
+    def run(self, action):
+        return action()
+
+
+def test_failed_page_skips_only_its_periods(tmp_path, monkeypatch):
+    history_file = tmp_path / "history_cache.json"
+    monkeypatch.setattr(main, "HISTORY_CACHE_FILE", str(history_file))
+    monkeypatch.setattr(main, "aggregate_period", lambda kind, plan, snapshots: (1, 2))
+    failing = main.plan_cycle_fetches(datetime(2025, 3, 10))["apollo_week"]
+
+    def fetch_page_http(client, url):
+        if url == failing:
+            raise ConnectionError("接続が切れました")
+        return {}
+
+    monkeypatch.setattr(main, "fetch_page_http", fetch_page_http)
+    sites = {"apollo": FakeSite(), "tomato": FakeSite()}
+    results, failures = main.backfill_periods("week", datetime(2025, 3, 3), datetime(2025, 3, 16), sites)
+
+    assert results == [(datetime(2025, 3, 3), 1, 2), (datetime(2025, 3, 10), None, None)]
+    assert list(failures) == [failing]
+    # 集計できなかった期間は履歴キャッシュに保存しない
+    assert list(json.loads(history_file.read_text(encoding="utf-8"))) == ["week:2025-03-03"]
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+DRIVER_NAME = "chromedriver.exe" if os.name == "nt" else "chromedriver"
+
+
+class FakeDriverManager:
+    """
+    ChromeDriverManager の代わりに、ダウンロード済みとしてファイルを作成して返します。
+    """
+    installs = []
+
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+
+    def install(self):
+        path = os.path.join(self.download_dir, DRIVER_NAME)
+        with open(path, "w") as file:
+            file.write("driver")
+        FakeDriverManager.installs.append(path)
+        return path
+
+
+@pytest.fixture
+def driver_env(tmp_path, monkeypatch):
+    download_dir = tmp_path / "download"
+    download_dir.mkdir()
+    FakeDriverManager.installs = []
+    monkeypatch.setattr(main, "get_app_dir", lambda: str(tmp_path))
+    monkeypatch.setitem(main.CONFIG, "driver_cache_dir", "drivers")
+    monkeypatch.setattr(main, "ChromeDriverManager", lambda: FakeDriverManager(str(download_dir)))
+    versions = {"chrome": "130.0.6723.91", "driver": "130.0.6723.69"}
+    monkeypatch.setattr(main, "get_installed_chrome_version", lambda: versions["chrome"])
+    monkeypatch.setattr(main, "get_binary_version", lambda command: versions["driver"])
+    return tmp_path / "drivers", versions
+
+
+def test_matching_driver_is_cached_and_reused_offline(driver_env):
+    cache_dir, _ = driver_env
+    path = main.get_chrome_driver_path()
+    assert path == str(cache_dir / "130" / DRIVER_NAME)
+    assert len(FakeDriverManager.installs) == 1
+
+    assert main.get_chrome_driver_path() == path
+    assert len(FakeDriverManager.installs) == 1
+
+
+def test_mismatched_driver_is_not_cached(driver_env):
+    cache_dir, versions = driver_env
+    versions["driver"] = "129.0.6668.100"
+
+    path = main.get_chrome_driver_path()
+    assert path == FakeDriverManager.installs[0]
+    assert not cache_dir.exists() or not os.listdir(cache_dir)
+
+    # 次の起動でもう一度ダウンロードする
+    main.get_chrome_driver_path()
+    assert len(FakeDriverManager.installs) == 2
+
+
+def test_cached_driver_for_another_major_is_not_used(driver_env):
+    cache_dir, _ = driver_env
+    (cache_dir / "129").mkdir(parents=True)
+    (cache_dir / "129" / DRIVER_NAME).write_text("old driver")
+
+    path = main.get_chrome_driver_path()
+    assert path == str(cache_dir / "130" / DRIVER_NAME)
+    assert len(FakeDriverManager.installs) == 1
@@ -0,0 +1,50 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from test_day_count_cache import cycle_snapshots
+
+MONDAY = datetime(2025, 3, 3)
+
+
+@pytest.fixture
+def regrouped(monkeypatch):
+    """
+    最初のtomatoクリニックと最初のapolloクリニックの集計区分を入れ替えた登録簿を使います。
+    """
+    clinics = [dict(clinic) for clinic in main.DEFAULT_CLINICS]
+    tomato = next(c for c in clinics if c["site"] == "tomato")
+    apollo = next(c for c in clinics if c["site"] == "apollo")
+    tomato["group"], apollo["group"] = "A", "K"
+    monkeypatch.setattr(main, "CLINIC_REGISTRY", main.build_clinic_registry(clinics))
+    return tomato["id"], apollo["id"]
+
+
+def test_default_groups_follow_the_site():
+    registry = main.build_clinic_registry([{"id": 1, "name": "x", "site": "tomato"}])
+    assert registry["tomato"][1]["group"] == "K"
+
+
+def test_unknown_group_is_rejected():
+    with pytest.raises(ValueError):
+        main.build_clinic_registry([{"id": 1, "name": "x", "site": "tomato", "group": "B"}])
+
+
+def test_clinic_results_are_summed_by_group(regrouped):
+    tomato_id, apollo_name = regrouped
+    plan = main.plan_cycle_fetches(MONDAY)
+    snapshots = cycle_snapshots(
+        plan, week_jitsu=2, clinics={apollo_name: 5}, reservations={"2025-03-04": [("10:00 包", False)]}
+    )
+    # tomatoの各クリニックは週間1件・月間0件、apollo月間は apollo_name だけ5
+    week_a, month_a, week_k, month_k = main.aggregate_cycle_incremental(plan, snapshots, main.DayCountCache())
+    assert (week_a, week_k) == (14 + 1, len(main.TOMATO_CLINICS) - 1)
+    assert (month_a, month_k) == (0, 5)
+
+    assert main.aggregate_period("week", plan, snapshots) == (week_a, week_k)
+    assert main.aggregate_period("month", plan, snapshots) == (month_a, month_k)
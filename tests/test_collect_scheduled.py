@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from test_day_count_cache import MONDAY, cycle_snapshots
+
+
+class FakeSite:
+    client = None
+
+    def run(self, func):
+        return func()
+
+
+def test_malformed_week_page_fails_the_source_and_keeps_last_snapshot(monkeypatch):
+    plan = main.plan_cycle_fetches(MONDAY)
+    pages = cycle_snapshots(plan, week_jitsu=2)
+    monkeypatch.setattr(main, "plan_cycle_fetches", lambda: plan)
+    monkeypatch.setattr(main, "fetch_page_http", lambda session, url: pages[url])
+    monkeypatch.setattr(main, "day_count_cache", main.DayCountCache())
+    scheduler, cache, site = main.RefreshScheduler(), main.SourceCache(), FakeSite()
+
+    first = main.collect_scheduled(scheduler, cache, site, site, True, wait=5)
+    good_week = cache.snapshots[plan["apollo_week"]]
+    assert first[0] == 14
+
+    # 合計行が6セルしかないページは取得元の失敗にし、前回のページで集計を続ける
+    pages[plan["apollo_week"]] = dict(good_week, total_cells=good_week["total_cells"][:6])
+    scheduler.next_run.clear()
+    second = main.collect_scheduled(scheduler, cache, site, site, True, wait=5)
+
+    assert second == first
+    assert cache.snapshots[plan["apollo_week"]] is good_week
+    assert "合計行のセルが6個" in cache.errors["apollo_week"]
+    assert scheduler.failures["apollo_week"] == 1
+    assert cache.tile_staleness(scheduler)["week"]["a"] is not None
+    assert "apollo_month" not in cache.errors
+
+
+def test_watch_mode_refetches_each_page_at_its_source_interval(monkeypatch):
+    plan = main.plan_cycle_fetches(MONDAY)
+    pages = cycle_snapshots(plan)
+    monkeypatch.setitem(main.CONFIG, "extraction_backend", "selenium")
+    monkeypatch.setitem(main.CONFIG, "selenium_watch", True)
+    monkeypatch.setitem(main.CONFIG, "refresh_intervals", {"apollo_week": 60, "apollo_month": 300, "tomato": 120})
+    monkeypatch.setattr(main, "plan_cycle_fetches", lambda: plan)
+    monkeypatch.setattr(main, "day_count_cache", main.DayCountCache())
+    intervals = {}
+
+    class FakeWatcher:
+        def snapshot(self, driver, url, label, keep_urls, interval):
+            intervals[url] = interval
+            return pages[url]
+
+    monkeypatch.setattr(main, "page_watcher", FakeWatcher())
+    site = FakeSite()
+    main.collect_scheduled(main.RefreshScheduler(), main.SourceCache(), site, site, False, wait=5)
+
+    assert intervals[plan["apollo_week"]] == 60
+    assert intervals[plan["apollo_month"]] == 300
+    assert {intervals[url] for url in plan["tomato_urls"]} == {120}
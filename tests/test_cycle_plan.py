@@ -0,0 +1,41 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+CLINIC = main.TOMATO_CLINICS[0]
+MARCH = main.get_tomato_month_url(CLINIC, 2025, 3)
+APRIL = main.get_tomato_month_url(CLINIC, 2025, 4)
+
+
+def test_week_within_one_month_fetches_one_tomato_page_per_clinic():
+    plan = main.plan_cycle_fetches(datetime(2025, 3, 12))
+    assert plan["monday"] == datetime(2025, 3, 10)
+    assert [url for _, url in plan["tomato_week"][CLINIC]] == [MARCH] * 7
+    assert plan["tomato_pages"][MARCH] == (CLINIC, "2025-03")
+    assert len(plan["tomato_urls"]) == len(main.TOMATO_CLINICS)
+
+
+def test_week_crossing_into_next_month_includes_next_month_pages():
+    # 2025-03-31（月）〜 2025-04-06（日）
+    plan = main.plan_cycle_fetches(datetime(2025, 3, 31))
+    assert plan["month"] == "2025-03"
+    assert plan["tomato_month"][CLINIC] == MARCH
+    assert [url for _, url in plan["tomato_week"][CLINIC]] == [MARCH] + [APRIL] * 6
+    assert plan["tomato_pages"][MARCH] == (CLINIC, "2025-03")
+    assert plan["tomato_pages"][APRIL] == (CLINIC, "2025-04")
+    assert len(plan["tomato_urls"]) == 2 * len(main.TOMATO_CLINICS)
+    assert len(set(plan["tomato_urls"])) == len(plan["tomato_urls"])
+
+
+def test_week_crossing_from_previous_month_keeps_previous_month_pages():
+    plan = main.plan_cycle_fetches(datetime(2025, 4, 2))
+    assert plan["monday"] == datetime(2025, 3, 31)
+    assert plan["month"] == "2025-04"
+    assert plan["tomato_month"][CLINIC] == APRIL
+    assert plan["tomato_week"][CLINIC][0] == (datetime(2025, 3, 31), MARCH)
+    assert plan["tomato_pages"][MARCH] == (CLINIC, "2025-03")
+    assert {MARCH, APRIL} <= set(plan["tomato_urls"])
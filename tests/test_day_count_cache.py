@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MONDAY = datetime(2025, 3, 3)
+
+
+def empty_snapshot():
+    return {"total_cells": [], "clinics": [], "days": {}, "anchors": [], "big_count": 0}
+
+
+def cycle_snapshots(plan, week_jitsu=1, clinics=None, reservations=None):
+    """
+    plan の全URLに、週間は毎日 [実]week_jitsu、月間は clinics {院名: [実]}、
+    tomatoは reservations {日付: [(テキスト, wifi)]} のスナップショットを割り当てます。
+    """
+    snapshots = {url: empty_snapshot() for url in plan["apollo_urls"] + plan["tomato_urls"]}
+    snapshots[plan["apollo_week"]] = dict(
+        empty_snapshot(), total_cells=[[f"[実]{week_jitsu}"] for _ in range(7)]
+    )
+    snapshots[plan["apollo_month"]] = dict(
+        snapshots[plan["apollo_week"]] if plan["apollo_month"] == plan["apollo_week"] else empty_snapshot(),
+        clinics=[[name, [f"[実]{value}"]] for name, value in (clinics or {}).items()],
+    )
+    for url in plan["tomato_urls"]:
+        snapshots[url] = dict(empty_snapshot(), days={
+            date_str: [list(r) for r in rows] for date_str, rows in (reservations or {}).items()
+        })
+    return snapshots
+
+
+def test_update_recomputes_only_changed_content():
+    cache = main.DayCountCache()
+    calls = []
+    compute = lambda content: calls.append(content) or (len(content),)
+
+    cache.begin()
+    assert cache.update("tomato", 13, "2025-03-03", ("包",), compute)
+    assert not cache.update("tomato", 13, "2025-03-03", ("包",), compute)
+    assert cache.update("tomato", 13, "2025-03-03", ("包", "大"), compute)
+    assert calls == [("包",), ("包", "大")]
+    assert cache.get("tomato", 13, "2025-03-03") == (2,)
+
+
+def test_content_digest_is_stable_across_processes(tmp_path):
+    # hash() は PYTHONHASHSEED でプロセスごとに変わるため、キャッシュのハッシュには使えない
+    script = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import main\n"
+        "cache = main.DayCountCache(); cache.begin()\n"
+        "cache.update('tomato', 13, '2025-03-03', (('10:00 包', False),), main.count_day_reservations)\n"
+        "print(cache.entries[('tomato', 13, '2025-03-03')][0].hex())\n"
+    )
+    digests = set()
+    for seed in ("1", "2"):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        output = subprocess.run(
+            [sys.executable, "-c", script, ROOT], cwd=tmp_path, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        digests.add(output.strip())
+    assert len(digests) == 1
+
+
+def test_aggregate_drops_values_missing_from_snapshot():
+    plan = main.plan_cycle_fetches(MONDAY)
+    clinic = next(iter(main.TARGET_CLINICS))
+    cache = main.DayCountCache()
+
+    first = main.aggregate_cycle_incremental(plan, cycle_snapshots(
+        plan, clinics={clinic: 5}, reservations={"2025-03-04": [("10:00 包", False)]}
+    ), cache)
+    assert first[1] == 5
+    assert first[2] == len(main.TOMATO_CLINICS)
+
+    # クリニックのセルと予約のあった日がページから消えた
+    second = main.aggregate_cycle_incremental(plan, cycle_snapshots(plan), cache)
+    assert second == (7, 0, 0, 0)
+    removed = {key for key, _, new in cache.last_changes if new is None}
+    assert ("apollo_month", clinic, "2025-03") in removed
+    assert ("tomato", main.TOMATO_CLINICS[0], "2025-03-04") in removed
+
+
+@pytest.mark.parametrize("cells", [6, 8])
+def test_aggregate_rejects_unexpected_total_cell_count(cells):
+    plan = main.plan_cycle_fetches(MONDAY)
+    snapshots = cycle_snapshots(plan)
+    snapshots[plan["apollo_week"]]["total_cells"] = [["[実]1"]] * cells
+    with pytest.raises(ValueError):
+        main.aggregate_cycle_incremental(plan, snapshots, main.DayCountCache())
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def snapshot_of(page_source):
+    return main.build_page_snapshot(main.parse_html(page_source), page_source)
+
+
+def test_omitted_row_end_tags_do_not_nest_rows():
+    # </td></tr> を省略した表（ブラウザでは各 <tr> が別の行になる）
+    page_source = (
+        "<table><tbody>"
+        "<tr><td class=\"total\">合計<td class=\"total sticky\"><span>[実]3</span>"
+        "<tr><td class=\"clinic\"><a href=\"c.php\">上野</a><span>[実]1</span>"
+        "<td class=\"total sticky\"><span>[実]5</span>"
+        "</tbody></table>"
+    )
+    snapshot = snapshot_of(page_source)
+    assert snapshot["total_cells"] == [["[実]3"]]
+    assert snapshot["clinics"] == [["上野", ["[実]1"]]]
+
+    rows = list(main.parse_html(page_source).iter("tr"))
+    assert [row.parent.tag for row in rows] == ["tbody", "tbody"]
+    assert [len(row.element_children()) for row in rows] == [2, 2]
+
+
+def test_omitted_cell_end_tags_close_only_the_open_cell():
+    doc = main.parse_html("<table><tr><td>1<td>2<th>3</tr><tr><td><table><tr><td>4</table><td>5</table>")
+    rows = doc.find("table").element_children()
+    assert [[cell.text_content() for cell in row.element_children()] for row in rows] == [
+        ["1", "2", "3"], ["4", "5"]
+    ]
+
+
+def test_omitted_paragraph_end_tags_close_the_open_paragraph():
+    doc = main.parse_html("<div><p>a<p>b<span>c</span></div>")
+    assert [p.text_content() for p in doc.iter("p")] == ["a", "bc"]
@@ -0,0 +1,86 @@
+import os
+import pstats
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def fetch_task():
+    return sum(range(1000))
+
+
+@pytest.mark.parametrize("per_thread", [
+    pytest.param(True, marks=pytest.mark.skipif(
+        sys.version_info >= (3, 12), reason="スレッドごとのプロファイラは3.11以前のみ")),
+    False,
+    None,
+])
+def test_profiled_cycle_with_thread_pool_task(tmp_path, monkeypatch, per_thread):
+    monkeypatch.setitem(main.CONFIG, "profile_dir", str(tmp_path))
+    profiler = main.CycleProfiler(per_thread=per_thread)
+    profiler.request(1)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with profiler.cycle():
+            result = executor.submit(profiler.wrap(fetch_task)).result()
+
+    assert result == sum(range(1000))
+    assert profiler.remaining == 0
+    files = os.listdir(tmp_path)
+    assert len(files) == 1
+    stats = pstats.Stats(str(tmp_path / files[0]))
+    profiled = {name for _, _, name in stats.stats}
+    # 3.12以降は周期のプロファイラが、3.11以前はスレッドごとのプロファイラが取得タスクを計測する
+    if profiler.per_thread or sys.version_info >= (3, 12):
+        assert "fetch_task" in profiled
+
+
+def test_wrap_is_pass_through_without_per_thread_profiles():
+    profiler = main.CycleProfiler(per_thread=False)
+    profiler.request(1)
+    with profiler.cycle():
+        assert profiler.wrap(fetch_task) is fetch_task
+
+
+def test_profile_flag_overrides_config(monkeypatch):
+    monkeypatch.setitem(main.CONFIG, "profile_cycles", 5)
+    assert main.requested_profile_cycles(main.parse_command_line([])) == 5
+    assert main.requested_profile_cycles(main.parse_command_line(["--profile", "2"])) == 2
+    # --profile 0 で設定・環境変数による計測を止められる
+    assert main.requested_profile_cycles(main.parse_command_line(["--profile", "0"])) == 0
+
+
+def test_profile_env_var_requests_cycles(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "CONFIG_FILE", str(tmp_path / "missing.json"))
+    monkeypatch.setenv("WEEKGOAL_PROFILE", "3")
+    config = main.load_config()
+    monkeypatch.setattr(main, "CONFIG", config)
+
+    profiler = main.CycleProfiler(per_thread=False)
+    profiler.request(main.requested_profile_cycles(main.parse_command_line([])))
+    assert profiler.remaining == 3
+
+
+def test_profile_retention_keeps_newest(tmp_path, monkeypatch):
+    monkeypatch.setitem(main.CONFIG, "profile_dir", str(tmp_path))
+    monkeypatch.setitem(main.CONFIG, "profile_keep", 2)
+    (tmp_path / "notes.txt").write_text("保存数の制限の対象外")
+    profiler = main.CycleProfiler(per_thread=False)
+    profiler.request(4)
+    written = []
+    for _ in range(4):
+        with profiler.cycle():
+            fetch_task()
+        written.append(max(f for f in os.listdir(tmp_path) if f.endswith(".pstats")))
+
+    assert profiler.remaining == 0
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith(".pstats")) == written[-2:]
+    assert (tmp_path / "notes.txt").exists()
+    # 要求した周期数を過ぎた後は書き出さない
+    with profiler.cycle():
+        fetch_task()
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith(".pstats")) == written[-2:]
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+SOURCES = {"tomato:13": ("tomato", ["https://tomato.example/CAL/monthly.php?c=13&y=2025&m=03#cal"])}
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setitem(main.CONFIG, "refresh_intervals", {"apollo_week": 60, "apollo_month": 300, "tomato": 60})
+    monkeypatch.setitem(main.CONFIG, "refresh_backoff_max", 900)
+    return main.RefreshScheduler()
+
+
+def test_never_fetched_source_is_due_immediately(scheduler):
+    assert scheduler.due_sources(SOURCES, {}, now=1000.0) == ["tomato:13"]
+
+
+def test_failing_never_fetched_source_waits_for_backoff(scheduler):
+    scheduler.mark_failure("tomato:13", 1000.0)
+    retry_at = scheduler.next_run["tomato:13"]
+    assert 1030.0 <= retry_at <= 1060.0
+
+    # ページがまだ一度も取得できていなくても、待機時間が過ぎるまでは取得しない
+    assert scheduler.due_sources(SOURCES, {}, now=1001.0) == []
+    assert scheduler.due_sources(SOURCES, {}, now=retry_at) == ["tomato:13"]
+
+
+def test_backoff_doubles_up_to_the_limit(scheduler):
+    delays = []
+    for _ in range(6):
+        scheduler.mark_failure("tomato:13", 0.0)
+        delays.append(scheduler.next_run["tomato:13"])
+    limits = [min(60 * 2 ** n, 900) for n in range(6)]
+    for delay, limit in zip(delays, limits):
+        assert limit / 2 <= delay <= limit
+
+
+def test_success_aligns_to_the_next_boundary_and_clears_failures(scheduler):
+    scheduler.mark_failure("tomato:13", 1000.0)
+    scheduler.mark_success("tomato:13", started=1000.0, finished=1005.0)
+    assert "tomato:13" not in scheduler.failures
+    assert scheduler.next_run["tomato:13"] == 1020.0
+
+    # 取得が次の区切りを過ぎた場合は、その区切りを飛ばす
+    scheduler.mark_success("tomato:13", started=1010.0, finished=1025.0)
+    assert scheduler.next_run["tomato:13"] == 1080.0
+
+
+def test_watch_mode_keeps_per_source_intervals(scheduler, monkeypatch):
+    monkeypatch.setitem(main.CONFIG, "extraction_backend", "selenium")
+    monkeypatch.setitem(main.CONFIG, "selenium_watch", True)
+    assert scheduler.interval("tomato:13") == 60
+    assert scheduler.interval("apollo_month") == 300
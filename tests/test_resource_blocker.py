@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+class FakeDriver:
+    current_window_handle = "TAB"
+
+    def __init__(self, events):
+        self.events = events
+
+    def get_log(self, kind):
+        assert kind == "performance"
+        entries = [{"message": json.dumps({"message": {"method": method, "params": params}})} for method, params in self.events]
+        self.events = []
+        return entries
+
+
+def test_drain_estimates_bytes_saved_per_cycle(monkeypatch):
+    monkeypatch.setitem(main.CONFIG, "measure_blocked_resources", True)
+    monkeypatch.setitem(main.CONFIG, "blocked_resource_estimated_bytes", {"image": 1000, "font": 5000, "other": 300})
+    blocker = main.ResourceBlocker()
+    driver = FakeDriver([
+        ("Network.requestWillBeSent", {"frameId": "TAB", "requestId": "1"}),
+        ("Network.requestWillBeSent", {"frameId": "TAB", "requestId": "2"}),
+        ("Network.requestWillBeSent", {"frameId": "TAB", "requestId": "3"}),
+        ("Network.requestWillBeSent", {"frameId": "TAB", "requestId": "4"}),
+        # 別のタブの要求は数えない
+        ("Network.requestWillBeSent", {"frameId": "OTHER", "requestId": "5"}),
+        ("Network.loadingFinished", {"requestId": "1", "encodedDataLength": 2048}),
+        ("Network.loadingFailed", {"requestId": "2", "type": "Image", "blockedReason": "inspector"}),
+        ("Network.loadingFailed", {"requestId": "3", "type": "Font", "blockedReason": "inspector"}),
+        ("Network.loadingFailed", {"requestId": "4", "type": "Script", "blockedReason": "inspector"}),
+        ("Network.loadingFailed", {"requestId": "5", "type": "Image", "blockedReason": "inspector"}),
+    ])
+
+    blocker.drain(driver, "apollo")
+    assert blocker.take_cycle_summary() == {"blocked": 3, "transferred_bytes": 2048, "saved_bytes": 6300}
+    # 周期ごとにリセットされる
+    blocker.drain(driver, "apollo")
+    assert blocker.take_cycle_summary() == {"blocked": 0, "transferred_bytes": 0, "saved_bytes": 0}
@@ -0,0 +1,33 @@
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+NOW = 1_750_000_000
+
+
+def render(monkeypatch, staleness):
+    monkeypatch.setattr(main, "read_target_values", lambda: (100, 50))
+    return main.create_html_content(10, 20, is_week=True, staleness=staleness, now=NOW)
+
+
+def badges(page):
+    return re.findall(r'<div class="stale-badge"([^>]*)>([^<]*)</div>', page)
+
+
+def test_never_fetched_tile_has_no_since_time(monkeypatch):
+    page = render(monkeypatch, {"a": float("inf"), "k": None})
+    rendered = [(attrs, label) for attrs, label in badges(page) if label]
+    # A・AK・目標までの残りが未取得（Kは最新）
+    assert rendered == [("", "未取得")] * 3
+    assert 'data-since=""' not in page
+    # ページ内の経過時間の更新は data-since が空・数値でない注記を書き換えない
+    assert "isFinite(Number(since))" in page
+
+
+def test_stale_tile_carries_its_fetch_time(monkeypatch):
+    page = render(monkeypatch, {"a": 180, "k": None})
+    assert (f' data-since="{NOW - 180}"', "3分前の値") in badges(page)
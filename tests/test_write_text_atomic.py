@@ -0,0 +1,63 @@
+import os
+import stat
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+posix_only = pytest.mark.skipif(os.name == "nt", reason="Windowsではパーミッションのビットを確認できない")
+
+
+def file_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_replaces_content_without_leaving_temp_files(tmp_path):
+    target = tmp_path / "weekgoal.txt"
+    target.write_text("old", encoding="utf-8")
+    main.write_text_atomic(str(target), "新しい内容")
+    assert target.read_text(encoding="utf-8") == "新しい内容"
+    assert os.listdir(tmp_path) == ["weekgoal.txt"]
+
+
+@posix_only
+def test_existing_file_keeps_its_mode(tmp_path):
+    target = tmp_path / "weekgoal.txt"
+    target.write_text("old", encoding="utf-8")
+    os.chmod(target, 0o640)
+    main.write_text_atomic(str(target), "new")
+    assert file_mode(target) == 0o640
+
+
+@posix_only
+def test_new_file_is_readable_by_others(tmp_path):
+    target = tmp_path / "weekgoal.txt"
+    main.write_text_atomic(str(target), "new")
+    assert file_mode(target) == 0o644
+
+
+@posix_only
+def test_explicit_mode_overrides_the_existing_mode(tmp_path):
+    target = tmp_path / "weekgoal.txt"
+    target.write_text("old", encoding="utf-8")
+    os.chmod(target, 0o644)
+    main.write_text_atomic(str(target), "new", mode=0o600)
+    assert file_mode(target) == 0o600
+
+
+@posix_only
+def test_saved_session_cookies_are_private(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "get_app_dir", lambda: str(tmp_path))
+    session = main.create_http_session()
+    session.cookies.set("sid", "secret", domain="apollo.example", path="/")
+    site = main.SiteSession("apollo", session, lambda client: True, lambda: "https://apollo.example/")
+    site.save_cookies()
+    assert file_mode(site.cookie_file) == 0o600
+
+    # 以前の版で 0o644 のまま保存されたファイルも、次の保存で本人だけが読めるようにする
+    os.chmod(site.cookie_file, 0o644)
+    site.save_cookies()
+    assert file_mode(site.cookie_file) == 0o600